@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+import json
+
+from app import db
+
+class IdempotencyKey(db.Model):
+    """Result of one uploaded operation, replayed when its key is sent again."""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_id_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    @classmethod
+    def lookup(cls, user_id, keys):
+        """Stored results of ``keys``, by key."""
+        if not keys:
+            return {}
+        rows = cls.query.filter(cls.user_id == user_id, cls.key.in_(keys))
+        return {row.key: json.loads(row.response) for row in rows}
+    
+    @classmethod
+    def purge(cls, ttl_hours):
+        """Delete keys older than ``ttl_hours``; returns how many were deleted."""
+        cutoff = datetime.utcnow() - timedelta(hours=ttl_hours)
+        deleted = cls.query.filter(cls.created_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.user_id}:{self.key}>'
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app import db
+from app.models.user import User, bump_ledger_version
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+class LedgerChange(db.Model):
+    """One write to a user's transactions, logged for delta sync.
+
+    ``version`` is the owner's ledger version after the write. Versions are
+    bumped under the user's row lock before the change is logged, so a
+    client that has seen every change up to ``(version, id)`` can resume
+    from there without missing a concurrent write.
+    """
+    __tablename__ = 'ledger_changes'
+    __table_args__ = (
+        # Sync reads and the compaction's "latest change per row" lookup.
+        db.Index('ix_ledger_changes_user_id_version', 'user_id', 'version', 'id'),
+        db.Index('ix_ledger_changes_user_id_transaction_id', 'user_id', 'transaction_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    transaction_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LedgerChange {self.user_id}@{self.version}: {self.operation} {self.transaction_id}>'
+
+def record_changes(connection, changes):
+    """Log ``(user_id, transaction_id, operation)`` changes in the current transaction.
+
+    The owners' ledger versions are bumped first, and every change is
+    logged at its owner's new version.
+    """
+    latest = {(user_id, transaction_id): operation
+              for user_id, transaction_id, operation in changes if user_id is not None}
+    if not latest:
+        return
+    user_ids = {user_id for user_id, _ in latest}
+    bump_ledger_version(connection, user_ids)
+    users = User.__table__
+    versions = dict(connection.execute(
+        select(users.c.id, users.c.ledger_version).where(users.c.id.in_(user_ids))
+    ).all())
+    now = datetime.utcnow()
+    connection.execute(insert(LedgerChange.__table__), [
+        {'user_id': user_id, 'transaction_id': transaction_id, 'operation': operation,
+         'version': versions[user_id], 'changed_at': now}
+        for (user_id, transaction_id), operation in latest.items()
+    ])
+
+def compact_changes(retention_days, batch_size=1000):
+    """Shrink the change log; returns the number of superseded and expired entries.
+
+    Only the latest change of each transaction is needed to bring a client
+    up to date, so earlier ones are dropped. Tombstones older than
+    ``retention_days`` are dropped too, and their owners' floor version
+    raised, so that clients syncing from before it start over.
+    """
+    changes = LedgerChange.__table__
+    users = User.__table__
+    # Selected a batch at a time and deleted by id, committing in between:
+    # MySQL cannot delete from a table while a subquery of the same
+    # statement reads it, and small transactions keep syncs unblocked.
+    later = changes.alias('later')
+    superseded, last_id = 0, 0
+    while True:
+        ids = db.session.execute(
+            select(changes.c.id)
+            .where(changes.c.id > last_id,
+                   select(later.c.id)
+                   .where(later.c.user_id == changes.c.user_id,
+                          later.c.transaction_id == changes.c.transaction_id,
+                          later.c.id > changes.c.id)
+                   .exists())
+            .order_by(changes.c.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        superseded += db.session.execute(delete(changes).where(changes.c.id.in_(ids))).rowcount
+        db.session.commit()
+        last_id = ids[-1]
+        if len(ids) < batch_size:
+            break
+
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    expired = (changes.c.operation == DELETE) & (changes.c.changed_at < cutoff)
+    floors = db.session.execute(
+        select(changes.c.user_id, func.max(changes.c.version))
+        .where(expired)
+        .group_by(changes.c.user_id)
+    ).all()
+    for user_id, version in floors:
+        db.session.execute(
+            update(users)
+            .where(users.c.id == user_id, users.c.ledger_floor_version < version)
+            .values(ledger_floor_version=version)
+        )
+    expired_count = db.session.execute(delete(changes).where(expired)).rowcount
+    db.session.commit()
+    return superseded, expired_count
@@ -0,0 +1,177 @@
+import calendar
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from app import db
+from app.models.ledger_change import UPSERT, record_changes
+from app.models.transaction import AGGREGATE_FIELDS, Transaction, apply_aggregates
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+
+def _add_months(start, months):
+    """``start`` moved by ``months``, clamped to the end of shorter months."""
+    month = start.month - 1 + months
+    year, month = start.year + month // 12, month % 12 + 1
+    return start.replace(year=year, month=month,
+                         day=min(start.day, calendar.monthrange(year, month)[1]))
+
+class RecurringTransaction(db.Model):
+    """A schedule of transactions posted on the user's behalf.
+
+    Occurrence ``n`` falls ``n * repeat_every`` days, weeks, months or
+    years after ``start_date``; monthly and yearly occurrences on a day the
+    month lacks fall on its last day. ``next_occurrence`` is the index of
+    the first occurrence not yet posted and ``next_run`` its date.
+    """
+    __tablename__ = 'recurring_transactions'
+    __table_args__ = (
+        # The nightly job's scan for due schedules.
+        db.Index('ix_recurring_transactions_is_active_next_run', 'is_active', 'next_run'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    amount = db.Column(db.Float, nullable=False)
+    description = db.Column(db.String(200))
+    category = db.Column(db.String(50), nullable=False)
+    frequency = db.Column(db.String(10), nullable=False, default='monthly')
+    repeat_every = db.Column(db.Integer, nullable=False, default=1)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date)
+    next_occurrence = db.Column(db.Integer, nullable=False, default=0)
+    next_run = db.Column(db.Date)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    SERIALIZED_FIELDS = ('id', 'amount', 'description', 'category', 'frequency',
+                         'repeat_every', 'start_date', 'end_date', 'next_run', 'is_active')
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('frequency', 'monthly')
+        kwargs.setdefault('repeat_every', 1)
+        super().__init__(**kwargs)
+
+    def occurrence(self, n):
+        """Date of occurrence ``n``, or None past ``end_date``."""
+        step = n * self.repeat_every
+        if self.frequency == 'daily':
+            day = self.start_date + timedelta(days=step)
+        elif self.frequency == 'weekly':
+            day = self.start_date + timedelta(weeks=step)
+        else:
+            day = _add_months(self.start_date, step * (12 if self.frequency == 'yearly' else 1))
+        if self.end_date is not None and day > self.end_date:
+            return None
+        return day
+
+    def schedule(self):
+        """Start the schedule over from ``start_date``; call after changing it."""
+        self.next_occurrence = 0
+        self.next_run = self.occurrence(0)
+
+    def to_dict(self):
+        data = {}
+        for name in self.SERIALIZED_FIELDS:
+            value = getattr(self, name)
+            data[name] = value.isoformat() if isinstance(value, date) else value
+        return data
+
+    def __repr__(self):
+        return f'<RecurringTransaction {self.id}: {self.category} - ${self.amount} {self.frequency}>'
+
+class DueSchedules:
+    """Schedules with occurrences waiting for the next ``materialize_due`` run.
+
+    Reported with the background queues, so a nightly job that stopped
+    running shows up as a growing backlog.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @property
+    def depth(self):
+        schedules = RecurringTransaction.__table__
+        with self.app.app_context():
+            return db.session.execute(
+                select(func.count()).select_from(schedules)
+                .where(schedules.c.is_active.is_(True),
+                       schedules.c.next_run <= datetime.utcnow().date())
+            ).scalar()
+
+def materialize_due(today=None, batch_size=500, max_catch_up=366):
+    """Post every occurrence due by ``today``; returns ``(schedules, postings)``.
+
+    Due schedules are taken ``batch_size`` at a time, each batch in its own
+    database transaction: the occurrences of the whole batch go out in one
+    multi-row insert, are logged for sync in bulk and advance their
+    schedules with one executemany update. Missed days are caught up, at
+    most ``max_catch_up`` occurrences per schedule and run. Rows locked by a
+    concurrent run are skipped where the database supports it, and the
+    unique ``(recurring_id, date)`` index keeps an occurrence from being
+    posted twice.
+    """
+    today = today or datetime.utcnow().date()
+    schedules = RecurringTransaction.__table__
+    transactions = Transaction.__table__
+    totals = [0, 0]
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(RecurringTransaction)
+            .where(schedules.c.is_active.is_(True), schedules.c.next_run <= today,
+                   schedules.c.id > last_id)
+            .order_by(schedules.c.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        # Whole seconds, so the inserted rows can be found again on every backend.
+        now = datetime.utcnow().replace(microsecond=0)
+        rows, advanced = [], []
+        for schedule in batch:
+            n, day = schedule.next_occurrence, schedule.next_run
+            while day is not None and day <= today and n - schedule.next_occurrence < max_catch_up:
+                rows.append({
+                    'user_id': schedule.user_id, 'amount': schedule.amount,
+                    'description': schedule.description, 'category': schedule.category,
+                    'date': datetime.combine(day, datetime.min.time()),
+                    'recurring_id': schedule.id, 'created_at': now, 'updated_at': now,
+                    'version': 1,
+                })
+                n += 1
+                day = schedule.occurrence(n)
+            advanced.append({'b_id': schedule.id, 'b_next_occurrence': n,
+                             'b_next_run': day, 'b_is_active': day is not None})
+
+        connection = db.session.connection()
+        if rows:
+            connection.execute(insert(transactions), rows)
+            inserted = connection.execute(
+                select(transactions.c.user_id, transactions.c.id)
+                .where(transactions.c.recurring_id.in_([schedule.id for schedule in batch]),
+                       transactions.c.created_at == now)
+            ).all()
+            # Core inserts skip the session's flush hooks.
+            record_changes(connection, [(user_id, id_, UPSERT) for user_id, id_ in inserted])
+            apply_aggregates(connection, [tuple(row[name] for name in AGGREGATE_FIELDS)
+                                          for row in rows])
+        connection.execute(
+            update(schedules)
+            .where(schedules.c.id == bindparam('b_id'))
+            .values(next_occurrence=bindparam('b_next_occurrence'),
+                    next_run=bindparam('b_next_run'), is_active=bindparam('b_is_active')),
+            advanced,
+        )
+        db.session.commit()
+        # The batch's objects are stale after the Core update.
+        db.session.expunge_all()
+        totals[0] += len(batch)
+        totals[1] += len(rows)
+        if len(batch) < batch_size:
+            break
+    return tuple(totals)
@@ -1,7 +1,49 @@
-from flask import Blueprint
+from functools import wraps
+
+from flask import Blueprint, abort, render_template
+from flask_login import current_user, login_required
+
+from app.utils import performance
+from app.utils.instrumentation import query_log
+from app.utils.metrics import get_metrics
 
 admin_bp = Blueprint('admin', __name__)
 
+def admin_required(view):
+    """Restrict a view to logged-in users with ``is_admin`` set."""
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if not current_user.is_admin:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
 @admin_bp.route('/')
+@admin_required
 def admin_dashboard():
-    return "Admin Dashboard"
+    summary = get_metrics().render_json()
+    endpoints = sorted(
+        ({'endpoint': name, **figures} for name, figures in summary['endpoints'].items()),
+        key=lambda row: row['mean_seconds'], reverse=True
+    )
+    return render_template(
+        'admin/performance.html',
+        endpoints=endpoints[:20],
+        queries=query_log.slowest(20),
+        cache=summary['cache'],
+        cache_backend=performance.cache_backend_stats(),
+        workers=summary['workers'],
+        tables=performance.table_stats(),
+        indexes=performance.index_stats(),
+        jobs=performance.background_jobs(),
+        houses=performance.top_houses()
+    )
+
+@admin_bp.route('/queries/<query_id>')
+@admin_required
+def explain_query(query_id):
+    entry = performance.explain_query(query_id)
+    if entry is None:
+        abort(404)
+    return render_template('admin/query_plan.html', query=entry)
@@ -0,0 +1,89 @@
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from .context_processors import get_locale, get_user_currency, get_user_timezone
+
+
+def today():
+    """Vary on the date, for pages with monthly totals or relative times."""
+    return datetime.utcnow().date()
+
+
+def _csrf_window():
+    # Pages embedding a CSRF token must not be revalidated for longer than
+    # the token lives; half its lifetime leaves room to submit the form.
+    config = current_app.config
+    limit = config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if not config.get('WTF_CSRF_ENABLED', True) or not limit:
+        return ''
+    return int(time.time() // (limit / 2))
+
+
+def ledger_etag(user, *vary_on):
+    """ETag of a read of ``user``'s ledger at its current version.
+
+    Besides the version, the tag covers the URL, the request locale,
+    timezone and currency and any ``vary_on`` values. Responses built only
+    from those share a tag only when their bodies are the same; pages that
+    also embed session state (a CSRF token) are merely equivalent, so
+    ``conditional`` sends their tag as weak.
+    """
+    parts = [
+        current_app.config.get('ETAG_SALT', ''), request.full_path, user.id,
+        str(get_locale()), str(get_user_timezone()), get_user_currency(),
+    ]
+    parts.extend(vary_on)
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+    return f'{user.id}.{user.ledger_version or 0}.{digest}'
+
+
+def _not_modified(etag):
+    # If-None-Match uses the weak comparison, so tags sent as weak match too.
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+
+def conditional(*vary_on, html=False):
+    """Answer conditional GETs of the current user's ledger with 304.
+
+    The view's response gets an ETag from the user's ledger version, which
+    is loaded with the user itself, so a matching ``If-None-Match`` is
+    answered before the view runs a single query. ``vary_on`` callables add
+    request-specific parts to the tag; ``html`` pages also vary on the CSRF
+    token window, get a weak tag and are never answered with 304 while
+    flashed messages are pending.
+
+    There is no ``Last-Modified``: a date cannot tell a copy rendered for
+    another locale, currency or ``vary_on`` value from a current one.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if (not current_app.config.get('CONDITIONAL_GET', True)
+                    or request.method not in ('GET', 'HEAD')
+                    or not current_user.is_authenticated
+                    or (html and session.get('_flashes'))):
+                return current_app.ensure_sync(view)(*args, **kwargs)
+
+            values = [value() for value in vary_on]
+            if html:
+                values.append(_csrf_window())
+            etag = ledger_etag(current_user, *values)
+
+            if _not_modified(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(current_app.ensure_sync(view)(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=html)
+            # Cached by the browser only, and revalidated on every use.
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapped
+    return decorator
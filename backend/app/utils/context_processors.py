@@ -1,9 +1,52 @@
+import hashlib
 from datetime import datetime
-from flask import current_app, g, request, session
+from functools import lru_cache
+from flask import current_app, g, request, session, url_for
 from flask_login import current_user
-from babel.dates import format_date, format_datetime, format_time
-from babel.numbers import format_currency, format_decimal, format_percent
-import pytz
+
+# Babel and pytz are imported inside the functions that use them, so that
+# importing this module (and booting a worker) does not load their data.
+
+# Parsed locales, time zones and patterns are immutable, so one copy per
+# process serves every request.
+
+@lru_cache(maxsize=64)
+def _get_locale_object(identifier):
+    from babel import Locale
+    return Locale.parse(identifier)
+
+@lru_cache(maxsize=128)
+def _get_timezone(name):
+    import pytz
+    return pytz.timezone(name)
+
+@lru_cache(maxsize=256)
+def _number_pattern(pattern):
+    from babel.numbers import parse_pattern
+    return parse_pattern(pattern) if pattern is not None else None
+
+@lru_cache(maxsize=256)
+def _date_pattern(pattern):
+    # Named widths ('short', 'medium', ...) are resolved per locale by Babel.
+    if pattern in ('full', 'long', 'medium', 'short'):
+        return pattern
+    from babel.dates import parse_pattern
+    return parse_pattern(pattern)
+
+def _locale(locale):
+    """Resolve a locale argument to a cached ``babel.Locale``."""
+    if locale is None:
+        locale = get_locale()
+    if not isinstance(locale, str):
+        return locale
+    return _get_locale_object(locale)
+
+def _timezone(timezone):
+    if timezone is None:
+        return get_user_timezone()
+    if isinstance(timezone, str):
+        return _get_timezone(timezone)
+    return timezone
 
 def inject_now():
     """Inject current datetime into all templates."""
@@ -29,69 +72,52 @@ def format_currency(amount, currency=None, format=None, locale=None):
         locale: Locale to use for formatting (defaults to user's preferred locale)
     
     """
-
-    
-    
-    
     if amount is None:
         return ''
         
     if currency is None:
-        currency = getattr(g, 'currency', 'USD')
-        
-    if locale is None:
-        locale = get_locale()
+        currency = get_user_currency()
     
+    from babel.numbers import format_currency as babel_format_currency
     try:
-        return format_currency(amount, currency, format=format, locale=locale)
+        return babel_format_currency(amount, currency, format=_number_pattern(format),
+                                     locale=_locale(locale))
     except Exception as e:
         current_app.logger.error(f"Error formatting currency: {e}")
         return f"{currency} {amount:.2f}"  # Fallback format
 
 def format_date_filter(date, format='medium', locale=None):
     """Format a date using Babel."""
-    
-    
     if date is None:
         return ''
-    if locale is None:
-        locale = get_locale()
-    return format_date(date, format=format, locale=locale)
+    from babel.dates import format_date
+    return format_date(date, format=_date_pattern(format), locale=_locale(locale))
 
 def format_datetime_filter(datetime_obj, format='medium', timezone=None, locale=None):
-
     """Format a datetime using Babel."""
-
-
-
     if datetime_obj is None:
         return ''
-        
-    if timezone is None:
-        timezone = get_user_timezone()
     
-    if locale is None:
-        locale = get_locale()
+    import pytz
+    from babel.dates import format_datetime
     
     # Convert naive datetime to timezone-aware if needed
     if datetime_obj.tzinfo is None:
         datetime_obj = pytz.utc.localize(datetime_obj)
     
     # Convert to user's timezone
-    datetime_obj = datetime_obj.astimezone(timezone)
+    datetime_obj = datetime_obj.astimezone(_timezone(timezone))
     
-    return format_datetime(datetime_obj, format=format, locale=locale)
+    return format_datetime(datetime_obj, format=_date_pattern(format), locale=_locale(locale))
 
 def format_time_filter(time_obj, format='short', timezone=None, locale=None):
     """Format a time using Babel."""
     if time_obj is None:
         return ''
         
-    if timezone is None:
-        timezone = get_user_timezone()
-    
-    if locale is None:
-        locale = get_locale()
+    import pytz
+    from babel.dates import format_time
+    timezone = _timezone(timezone)
     
     # Handle both time and datetime objects
     if hasattr(time_obj, 'tzinfo') and time_obj.tzinfo is not None:
@@ -102,26 +128,42 @@ def format_time_filter(time_obj, format='short', timezone=None, locale=None):
         time_obj = pytz.utc.localize(datetime.combine(datetime.utcnow().date(), time_obj))
         time_obj = time_obj.astimezone(timezone)
     
-    return format_time(time_obj, format=format, locale=locale)
+    return format_time(time_obj, format=_date_pattern(format), locale=_locale(locale))
 
 def format_number_filter(number, format=None, locale=None):
     """Format a number using Babel."""
     if number is None:
         return ''
-    if locale is None:
-        locale = get_locale()
-    return format_decimal(number, format=format, locale=locale)
+    from babel.numbers import format_decimal
+    return format_decimal(number, format=_number_pattern(format), locale=_locale(locale))
 
 def format_percent_filter(number, format=None, locale=None):
     """Format a number as a percentage using Babel."""
     if number is None:
         return ''
-    if locale is None:
-        locale = get_locale()
-    return format_percent(number, format=format, locale=locale)
+    from babel.numbers import format_percent
+    return format_percent(number, format=_number_pattern(format), locale=_locale(locale))
+
+def format_timesince_filter(datetime_obj, locale=None):
+    """Format the time elapsed since a naive UTC datetime, e.g. '3 days'."""
+    if datetime_obj is None:
+        return ''
+    import pytz
+    from babel.dates import format_timedelta
+    if datetime_obj.tzinfo is not None:
+        datetime_obj = datetime_obj.astimezone(pytz.utc).replace(tzinfo=None)
+    return format_timedelta(datetime.utcnow() - datetime_obj, locale=_locale(locale))
 
 def get_locale():
-    """Get the current locale from the session or user preferences."""
+    """Get the current locale from the session or user preferences.
+
+    Resolved once per request and kept on ``g``.
+    """
+    if '_locale' not in g:
+        g._locale = _resolve_locale()
+    return g._locale
+
+def _resolve_locale():
     # First check if locale is set in the session
     if 'language' in session:
         return session['language']
@@ -134,26 +176,40 @@ def get_locale():
     return current_app.config.get('BABEL_DEFAULT_LOCALE', 'en')
 
 def get_user_timezone():
-    """Get the current user's timezone."""
+    """Get the current user's timezone.
+
+    Resolved once per request and kept on ``g``.
+    """
+    if '_timezone' not in g:
+        g._timezone = _resolve_timezone()
+    return g._timezone
+
+def _resolve_timezone():
+    import pytz
     # First check if timezone is set in the session
     if 'timezone' in session:
         try:
-            return pytz.timezone(session['timezone'])
+            return _get_timezone(session['timezone'])
         except pytz.UnknownTimeZoneError:
             pass
     
     # Then check if user is logged in and has a preferred timezone
     if current_user.is_authenticated and hasattr(current_user, 'timezone') and current_user.timezone:
         try:
-            return pytz.timezone(current_user.timezone)
+            return _get_timezone(current_user.timezone)
         except pytz.UnknownTimeZoneError:
             pass
     
     # Fall back to the application's default timezone
-    return pytz.timezone(current_app.config.get('BABEL_DEFAULT_TIMEZONE', 'UTC'))
+    return _get_timezone(current_app.config.get('BABEL_DEFAULT_TIMEZONE', 'UTC'))
 
 def get_user_currency():
-    """Get the current user's preferred currency."""
+    """Get the current user's preferred currency, once per request."""
+    if '_currency' not in g:
+        g._currency = _resolve_currency()
+    return g._currency
+
+def _resolve_currency():
     # First check if currency is set in the session
     if 'currency' in session:
         return session['currency']
@@ -189,3 +245,4 @@ def register_template_filters(app):
     app.jinja_env.filters['number'] = format_number_filter
     app.jinja_env.filters['percent'] = format_percent_filter
     app.jinja_env.filters['currency'] = format_currency
+    app.jinja_env.filters['timesince'] = format_timesince_filter
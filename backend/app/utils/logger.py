@@ -1,37 +1,214 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import re
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import (
+    QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+)
+
+from flask import g, has_request_context, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# Attributes every LogRecord has; anything else was passed through ``extra``.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+
+def get_request_id():
+    """Return the correlation id of the current request, or None outside one."""
+    if has_request_context():
+        return getattr(g, 'request_id', None)
+    return None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the request id while still on the request thread."""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = get_request_id() or '-'
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records at noisy levels.
+
+    ``rates`` maps level names to the fraction kept, e.g. ``{'DEBUG': 0.1}``.
+    Levels not listed, and anything at WARNING or above, are always kept.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = {
+            logging.getLevelName(name.upper()): float(rate)
+            for name, rate in (rates or {}).items()
+        }
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    """Render a record as one JSON object per line."""
+
+    def format(self, record):
+        payload = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+            'location': f'{record.pathname}:{record.lineno}',
+        }
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exception'] = record.exc_text
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                payload[key] = value
+        return json.dumps(payload, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue records for the listener thread; drop them rather than block when full."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback here: the listener runs without
+        # the caller's arguments or request context.
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def _file_handler(app, logs_dir):
+    """Size- or time-rotated file handler chosen by ``LOG_ROTATION``."""
+    path = os.path.join(logs_dir, app.config.get('LOG_FILENAME', 'app.log'))
+    if app.config.get('LOG_ROTATION', 'size') == 'time':
+        return TimedRotatingFileHandler(
+            path,
+            when=app.config.get('LOG_ROTATE_WHEN', 'midnight'),
+            backupCount=app.config.get('LOG_BACKUP_COUNT', 10),
+            utc=True,
+            delay=True
+        )
+    return RotatingFileHandler(
+        path,
+        maxBytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backupCount=app.config.get('LOG_BACKUP_COUNT', 10),
+        delay=True
+    )
+
+
+def _assign_request_id():
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+
+
+def _echo_request_id(response):
+    request_id = get_request_id()
+    if request_id:
+        response.headers.setdefault(REQUEST_ID_HEADER, request_id)
+    return response
+
+
+def _stop_listener(app):
+    """Flush and stop the app's listener thread; safe to call more than once."""
+    listener = app.extensions.pop('log_listener', None)
+    if listener is not None:
+        listener.stop()
+
+
+def restart_listener(app):
+    """Give a forked worker its own queue and listener thread.
+
+    Threads do not survive ``fork()``, and the parent's queue may have been
+    locked at that moment, so both are replaced.
+    """
+    listener = app.extensions.get('log_listener')
+    if listener is None:
+        return
+    log_queue = queue.Queue(maxsize=listener.queue.maxsize)
+    for handler in app.logger.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            handler.queue = log_queue
+    listener.queue = log_queue
+    listener._thread = None
+    listener.start()
+
 
 def init_app(app):
-    """Initialize logging for the application."""
+    """Initialize logging for the application.
+
+    Request threads only put records on a bounded queue; a listener thread
+    formats them and does the file and console I/O.
+    """
     # Clear existing handlers to avoid duplicates
     for handler in app.logger.handlers[:]:
         app.logger.removeHandler(handler)
+    _stop_listener(app)
+
+    level = logging.DEBUG if app.debug else logging.INFO
+    json_formatter = JSONFormatter()
+    handlers = []
 
     if not app.debug and not app.testing:
-        logs_dir = os.path.join(app.root_path, '../logs')
+        logs_dir = app.config.get('LOG_DIR') or os.path.join(app.root_path, '../logs')
         os.makedirs(logs_dir, exist_ok=True)
-        file_handler = RotatingFileHandler(
-            os.path.join(logs_dir, 'app.log'),
-            maxBytes=10240,
-            backupCount=10
-        )
-        formatter = logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        )
-        file_handler.setFormatter(formatter)
+        file_handler = _file_handler(app, logs_dir)
+        file_handler.setFormatter(json_formatter)
         file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
+        handlers.append(file_handler)
 
     console_handler = logging.StreamHandler()
-    console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    console_handler.setFormatter(console_formatter)
-    app.logger.addHandler(console_handler)
-    
-    app.logger.setLevel(logging.DEBUG if app.debug else logging.INFO)
+    if app.debug:
+        console_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s'))
+    else:
+        console_handler.setFormatter(json_formatter)
+    handlers.append(console_handler)
+
+    log_queue = queue.Queue(maxsize=app.config.get('LOG_QUEUE_SIZE', 10000))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(app.config.get('LOG_SAMPLE_RATES')))
+    queue_handler.addFilter(RequestIdFilter())
+    app.logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    app.extensions['log_listener'] = listener
+    atexit.register(_stop_listener, app)
+
+    if _assign_request_id not in app.before_request_funcs.get(None, []):
+        app.before_request(_assign_request_id)
+        app.after_request(_echo_request_id)
+
+    app.logger.setLevel(level)
     app.logger.info('Logger initialized')
 
 def log_error(message, exc_info=False):
     """Logs an error message."""
     from flask import current_app
-    current_app.logger.error(message, exc_info=exc_info)
\ No newline at end of file
+    current_app.logger.error(message, exc_info=exc_info)
@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from math import floor
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    touched_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rate_limits_touched ON rate_limits(touched_at);
+'''
+
+INCR_SQL = '''
+INSERT INTO rate_limits (key, count, expires_at, touched_at)
+VALUES (:key, :amount, :now + :expiry, :now)
+ON CONFLICT(key) DO UPDATE SET
+    count = CASE WHEN expires_at <= :now THEN :amount ELSE count + :amount END,
+    expires_at = CASE WHEN expires_at <= :now THEN :now + :expiry ELSE expires_at END,
+    touched_at = :now
+'''
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Rate limit counters in a SQLite WAL database shared by every worker on a host.
+
+    Use with ``RATELIMIT_STORAGE_URI = 'sqlite:////abs/path/ratelimit.db'``.
+    Every check is a primary-key lookup plus an upsert, in one short write
+    transaction. The table is pruned every ``prune_every`` writes. Expired
+    counters are dropped first; after that, the least recently used keys go
+    until at most ``max_keys`` remain.
+
+    Supports the fixed-window and sliding-window-counter strategies.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri=None, wrap_exceptions=False, max_keys=100000, prune_every=1000,
+                 busy_timeout=5.0, **options):
+        path = uri.split('://', 1)[1] if uri else ''
+        # sqlite:////abs/path.db and sqlite:///relative/path.db, as in SQLAlchemy URLs.
+        self.path = path[1:] if path.startswith('/') else path
+        if not self.path:
+            raise ValueError('The sqlite rate limit storage needs a file path.')
+        self.max_keys = int(max_keys)
+        self.prune_every = int(prune_every)
+        self.busy_timeout = float(busy_timeout)
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(SCHEMA)
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                     isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @property
+    def _db(self):
+        # One connection per thread, reopened in forked workers.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _write(self, callback):
+        """Run ``callback(db, now)`` in an immediate transaction and prune now and then."""
+        db = self._db
+        now = time.time()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = callback(db, now)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+        return result
+
+    def _count(self, db, key, now):
+        row = db.execute(
+            'SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def prune(self):
+        """Drop expired keys, then the least recently used beyond ``max_keys``."""
+        db = self._db
+        now = time.time()
+        db.execute('DELETE FROM rate_limits WHERE expires_at <= ?', (now,))
+        excess = db.execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0] - self.max_keys
+        if excess > 0:
+            db.execute(
+                '''DELETE FROM rate_limits WHERE key IN (
+                       SELECT key FROM rate_limits ORDER BY touched_at LIMIT ?)''',
+                (excess,)
+            )
+
+    def incr(self, key, expiry, amount=1):
+        def apply(db, now):
+            db.execute(INCR_SQL, {'key': key, 'amount': amount, 'expiry': expiry, 'now': now})
+            return self._count(db, key, now)
+        return self._write(apply)
+
+    def get(self, key):
+        return self._count(self._db, key, time.time())
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._db.execute(
+            'SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def clear(self, key):
+        self._db.execute('DELETE FROM rate_limits WHERE key = ?', (key,))
+
+    def check(self):
+        try:
+            self._db.execute('SELECT 1').fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self):
+        return self._db.execute('DELETE FROM rate_limits').rowcount
+
+    def _sliding_window(self, db, key, expiry, now):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._count(db, previous_key, now)
+        current_count = self._count(db, current_key, now)
+        previous_ttl = 0.0 if previous_count == 0 else (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+
+        def apply(db, now):
+            previous_count, previous_ttl, current_count, _ = self._sliding_window(
+                db, key, expiry, now)
+            weighted_count = previous_count * previous_ttl / expiry + current_count
+            if floor(weighted_count) + amount > limit:
+                return False
+            # The write lock is held, so no other worker can take the slot first.
+            _, current_key = self.sliding_window_keys(key, expiry, now)
+            db.execute(INCR_SQL, {'key': current_key, 'amount': amount,
+                                  'expiry': 2 * expiry, 'now': now})
+            return True
+        return self._write(apply)
+
+    def get_sliding_window(self, key, expiry):
+        return self._sliding_window(self._db, key, expiry, time.time())
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self.clear(previous_key)
+        self.clear(current_key)
@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from app.extensions import db
+
+
+class ReadPool:
+    """Run read-only queries side by side on a dedicated engine.
+
+    Each call gets its own connection from a read-only engine and runs on a
+    small thread pool, so ``await pool.gather(...)`` takes as long as the
+    slowest query rather than the sum of all of them. Calls keep the
+    request's context, so their queries still count towards the request's
+    Server-Timing figures.
+
+    The engine and the threads are created on first use in each process.
+    """
+
+    def __init__(self, app):
+        self.max_workers = app.config.get('READ_POOL_WORKERS', 4)
+        self.uri = app.config.get('SQLALCHEMY_READ_DATABASE_URI')
+        self._lock = threading.Lock()
+        self._pid = None
+        self._engine = None
+        self._executor = None
+        self.concurrent = True
+
+    def _create_engine(self):
+        if self.uri:
+            return create_engine(self.uri, pool_size=self.max_workers, max_overflow=0)
+        url = db.engine.url
+        if url.get_backend_name() == 'sqlite':
+            if not url.database or url.database == ':memory:':
+                # An in-memory database only exists on the app's own connection.
+                self.concurrent = False
+                return db.engine
+            path = f'file:{os.path.abspath(url.database)}?mode=ro'
+            return create_engine(
+                'sqlite://', poolclass=QueuePool, pool_size=self.max_workers, max_overflow=0,
+                creator=lambda: sqlite3.connect(path, uri=True, check_same_thread=False))
+        options = {'postgresql_readonly': True} if url.get_backend_name() == 'postgresql' else {}
+        return create_engine(url, pool_size=self.max_workers, max_overflow=0,
+                             execution_options=options)
+
+    def _setup(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._engine = self._create_engine()
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='read-pool')
+                self._pid = os.getpid()
+
+    def reset(self):
+        """Forget the engine and threads; a forked worker builds its own."""
+        if self._engine is not None and self.concurrent:
+            self._engine.dispose(close=False)
+        self._pid = self._engine = self._executor = None
+
+    def _call(self, func, args):
+        with self._engine.connect() as connection:
+            return func(connection, *args)
+
+    async def run(self, func, *args):
+        """Await ``func(connection, *args)`` run on a read connection."""
+        self._setup()
+        if not self.concurrent:
+            return self._call(func, args)
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, context.run, self._call, func, args)
+
+    async def gather(self, calls):
+        """Run ``{name: (func, *args)}`` together and return ``{name: result}``."""
+        names = list(calls)
+        results = await asyncio.gather(*(self.run(*calls[name]) for name in names))
+        return dict(zip(names, results))
+
+
+def get_read_pool(app=None):
+    app = app or current_app
+    return app.extensions['read_pool']
+
+
+def init_app(app):
+    app.extensions['read_pool'] = ReadPool(app)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+
+from flask import has_request_context
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from .context_processors import get_locale
+
+
+def fragment_key(name, obj, *vary_on, version=''):
+    """Cache key of a fragment rendered for one model row.
+
+    The key holds the row's table, id and ``updated_at`` and the request
+    locale. Editing a row changes its key, so a stale fragment is never
+    served; the old entry just ages out of the cache.
+    """
+    updated_at = getattr(obj, 'updated_at', None)
+    parts = [
+        'fragment', version, name,
+        getattr(obj, '__tablename__', type(obj).__name__), str(getattr(obj, 'id', '')),
+        updated_at.isoformat() if updated_at is not None else '',
+        str(get_locale()) if has_request_context() else '',
+    ]
+    parts.extend(str(value) for value in vary_on)
+    return '/'.join(parts)
+
+
+class FragmentCacheExtension(Extension):
+    """Cache the HTML of one row in the app cache.
+
+    Usage::
+
+        {% fragment 'transaction_row', transaction[, vary_on ...] %}
+            ...
+        {% endfragment %}
+
+    The key comes from :func:`fragment_key`, plus a digest of the template
+    source, so a deploy that changes the markup does not reuse old
+    fragments. Never put per-session output such as CSRF tokens inside
+    the block.
+    """
+
+    tags = {'fragment'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None, fragment_cache_timeout=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        parser.stream.expect('comma')
+        obj = parser.parse_expression()
+        vary_on = []
+        while parser.stream.skip_if('comma'):
+            vary_on.append(parser.parse_expression())
+
+        # Computed at compile time and stored in the bytecode, which Jinja
+        # already keys on the source checksum.
+        version = ''
+        if parser.filename and os.path.exists(parser.filename):
+            with open(parser.filename, 'rb') as source:
+                version = hashlib.sha1(source.read()).hexdigest()[:12]
+
+        body = parser.parse_statements(['name:endfragment'], drop_needle=True)
+        args = [name, obj, nodes.List(vary_on), nodes.Const(f'{version}:{lineno}')]
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, name, obj, vary_on, version, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = fragment_key(name, obj, *vary_on, version=version)
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.set(key, str(html), timeout=self.environment.fragment_cache_timeout)
+        return Markup(html)
+
+
+def init_app(app):
+    """Install the shared bytecode cache and the ``{% fragment %}`` tag."""
+    if app.config.get('JINJA_BYTECODE_CACHE', True):
+        directory = app.config.get('JINJA_BYTECODE_CACHE_DIR') or \
+            os.path.join(app.instance_path, 'jinja_cache')
+        os.makedirs(directory, exist_ok=True)
+        # Jinja writes each entry to a temporary file and renames it into
+        # place, so workers can share the directory.
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    if app.config.get('FRAGMENT_CACHE', True):
+        from app.extensions import cache
+        app.jinja_env.fragment_cache = cache
+        app.jinja_env.fragment_cache_timeout = app.config.get('FRAGMENT_CACHE_TIMEOUT', 3600)
@@ -0,0 +1,546 @@
+"""
+GCD audit logging.
+
+Audit events are handed to an in-process queue and written to ``audit_log``
+by a background thread in batches, so request handlers do not wait on audit
+I/O. The durability mode is chosen with ``GCD_AUDIT_DURABILITY``:
+
+- ``async`` (default): enqueue and return; a hard crash can lose the events
+  still queued.
+- ``group``: enqueue and wait until the batch holding the event commits.
+  Concurrent callers share one commit; a caller already inside a write
+  transaction writes through it instead.
+- ``sync``: write on the caller's connection, joining its open transaction
+  if there is one.
+
+Closed months are moved out of the live table into per-month archive
+databases (``audit-YYYY-MM.db``) with zlib-compressed value columns;
+``iter_audit_log`` reads across the archives and the live table as one log.
+"""
+
+import atexit
+import base64
+import binascii
+import glob
+import heapq
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from flask import current_app
+
+from gcd_database import begin_immediate, get_db
+
+
+AUDIT_COLUMNS = (
+    'event_type', 'user_id', 'house_id', 'target_type', 'target_id',
+    'old_values', 'new_values', 'ip_address', 'user_agent', 'session_id', 'created_at'
+)
+
+INSERT_AUDIT_SQL = (
+    f"INSERT INTO audit_log ({', '.join(AUDIT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in AUDIT_COLUMNS)})"
+)
+
+DURABILITY_MODES = ('async', 'group', 'sync')
+
+_STOP = object()
+
+
+def _encode(value):
+    """Store dicts and lists as JSON text, as the audit_log columns expect."""
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def make_audit_row(event_type, user_id=None, house_id=None, target_type=None, target_id=None,
+                   old_values=None, new_values=None, ip_address=None, user_agent=None,
+                   session_id=None, created_at=None):
+    """Build an audit_log row tuple, stamped with the time the event happened."""
+    if created_at is None:
+        created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    return (event_type, user_id, house_id, target_type, target_id,
+            _encode(old_values), _encode(new_values), ip_address, user_agent,
+            session_id, created_at)
+
+
+class _Batch:
+    """Rows handed to the writer together, with a flag set once they are committed."""
+
+    __slots__ = ('rows', 'done')
+
+    def __init__(self, rows, wait=False):
+        self.rows = rows
+        self.done = threading.Event() if wait else None
+
+
+class AuditWriter:
+    """Background writer that drains queued audit rows with ``executemany``.
+
+    A batch is flushed when ``batch_size`` rows are waiting or
+    ``flush_interval`` seconds have passed since the first of them arrived.
+    The thread starts on first use in each process, so it is safe to create
+    the writer before a pre-forking server forks.
+    """
+
+    def __init__(self, database, batch_size=200, flush_interval=1.0, max_queue=10000,
+                 retries=3, logger=None):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.logger = logger
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def depth(self):
+        """Number of queued submissions not yet picked up by the writer."""
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Anything queued in the parent belongs to the parent.
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._thread = threading.Thread(target=self._run, name='gcd-audit-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, rows, wait=False, timeout=None):
+        """Queue audit rows; with ``wait``, block until they are committed.
+
+        Returns False if ``wait`` timed out before the rows were written.
+        """
+        rows = list(rows)
+        if not rows:
+            return True
+        self._ensure_started()
+        batch = _Batch(rows, wait=wait)
+        self._queue.put(batch)
+        if wait:
+            return batch.done.wait(timeout)
+        return True
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written."""
+        return self.submit([None], wait=True, timeout=timeout)
+
+    def close(self, timeout=5.0):
+        """Flush pending events and stop the writer thread."""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        connection = sqlite3.connect(self.database, timeout=30)
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                pending = [item]
+                count = len(item.rows)
+                # Waiting callers are committed with whatever has already queued
+                # up behind them rather than held for the full interval.
+                urgent = item.done is not None
+                deadline = time.monotonic() + self.flush_interval
+                while count < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        if urgent:
+                            item = self._queue.get_nowait()
+                        else:
+                            item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    pending.append(item)
+                    count += len(item.rows)
+                    urgent = urgent or item.done is not None
+                self._write(connection, pending)
+            # Drain whatever arrived before the stop marker.
+            leftovers = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    leftovers.append(item)
+            if leftovers:
+                self._write(connection, leftovers)
+        finally:
+            connection.close()
+
+    def _write(self, connection, batches):
+        rows = [row for batch in batches for row in batch.rows if row is not None]
+        for attempt in range(1, self.retries + 1):
+            try:
+                if rows:
+                    with connection:
+                        connection.executemany(INSERT_AUDIT_SQL, rows)
+                self.written += len(rows)
+                break
+            except sqlite3.Error:
+                if attempt == self.retries:
+                    self.dropped += len(rows)
+                    if self.logger is not None:
+                        self.logger.exception(
+                            f'Dropped {len(rows)} audit events after {attempt} attempts: '
+                            f'{json.dumps(rows, default=str)}')
+                else:
+                    time.sleep(0.1 * attempt)
+        for batch in batches:
+            if batch.done is not None:
+                batch.done.set()
+
+
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer(app=None):
+    """Return the application's audit writer, creating it on first use."""
+    app = app or current_app._get_current_object()
+    writer = app.extensions.get('gcd_audit')
+    if writer is None:
+        with _writer_lock:
+            writer = app.extensions.get('gcd_audit')
+            if writer is None:
+                writer = AuditWriter(
+                    app.config['DATABASE'],
+                    batch_size=app.config.get('GCD_AUDIT_BATCH_SIZE', 200),
+                    flush_interval=app.config.get('GCD_AUDIT_FLUSH_INTERVAL', 1.0),
+                    max_queue=app.config.get('GCD_AUDIT_QUEUE_SIZE', 10000),
+                    logger=app.logger,
+                )
+                app.extensions['gcd_audit'] = writer
+                atexit.register(writer.close)
+    return writer
+
+
+def log_events(events):
+    """Record audit events, each a dict of ``make_audit_row`` keyword arguments."""
+    rows = [make_audit_row(**event) for event in events]
+    if not rows:
+        return
+    durability = current_app.config.get('GCD_AUDIT_DURABILITY', 'async')
+    if durability not in DURABILITY_MODES:
+        raise ValueError(f'Unknown audit durability mode: {durability}')
+
+    db = get_db()
+    # A caller holding a write transaction writes through it: waiting on the
+    # background writer would block on the caller's own lock.
+    if durability == 'sync' or (durability == 'group' and db.in_transaction):
+        owns_transaction = not db.in_transaction
+        db.executemany(INSERT_AUDIT_SQL, rows)
+        if owns_transaction:
+            db.commit()
+        return
+
+    get_audit_writer().submit(rows, wait=durability == 'group')
+
+
+def log_event(event_type, **fields):
+    """Record a single audit event."""
+    log_events([dict(event_type=event_type, **fields)])
+
+
+def flush_audit_log(timeout=None):
+    """Wait until every queued audit event has been written."""
+    writer = current_app.extensions.get('gcd_audit')
+    if writer is not None:
+        writer.flush(timeout)
+
+
+# Archived months live in their own databases, with the value columns compressed.
+ARCHIVE_SCHEMA = 'audit_archive'
+
+ARCHIVE_DDL = [
+    f'''CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.audit_log (
+        id INTEGER PRIMARY KEY,
+        event_type TEXT NOT NULL,
+        user_id INTEGER,
+        house_id INTEGER,
+        target_type TEXT,
+        target_id INTEGER,
+        old_values BLOB, -- zlib-compressed JSON
+        new_values BLOB, -- zlib-compressed JSON
+        ip_address TEXT,
+        user_agent TEXT,
+        session_id TEXT,
+        created_at TIMESTAMP
+    )''',
+    f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_audit_log_created ON audit_log(created_at)',
+    f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_audit_log_house ON audit_log(house_id, created_at)',
+    f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_audit_log_user ON audit_log(user_id, created_at)',
+    f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_audit_log_event ON audit_log(event_type, created_at)',
+    f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_audit_log_target '
+    'ON audit_log(target_type, target_id, created_at)',
+]
+
+READ_COLUMNS = ('id',) + AUDIT_COLUMNS
+
+# Equality filters accepted by the read API; each has a (column, created_at) index.
+FILTER_COLUMNS = ('house_id', 'user_id', 'event_type', 'target_type', 'target_id')
+
+MAX_PAGE_SIZE = 1000
+
+
+def _deflate(value):
+    if value is None:
+        return None
+    return zlib.compress(str(value).encode('utf-8'))
+
+
+def _inflate(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def _month_start(year, month):
+    return f'{year:04d}-{month:02d}-01 00:00:00'
+
+
+def _month_range(month):
+    """Return the [start, end) timestamps of a 'YYYY-MM' month."""
+    year, number = (int(part) for part in month.split('-'))
+    following = (year + number // 12, number % 12 + 1)
+    return _month_start(year, number), _month_start(*following)
+
+
+def get_archive_dir(app=None):
+    """Directory holding the per-month audit archives."""
+    app = app or current_app
+    return app.config.get('GCD_AUDIT_ARCHIVE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(app.config['DATABASE'])), 'audit_archive')
+
+
+def list_archived_months():
+    """Months with an archive database, oldest first."""
+    paths = glob.glob(os.path.join(get_archive_dir(), 'audit-????-??.db'))
+    return sorted(os.path.basename(path)[len('audit-'):-len('.db')] for path in paths)
+
+
+def archive_audit_log(retention_months=None, vacuum=False):
+    """Move every closed month older than the retention window into its archive.
+
+    ``retention_months`` (default ``GCD_AUDIT_RETENTION_MONTHS``, 3) counts
+    the current month. Each month is copied and deleted in one transaction
+    spanning the live and archive databases, and re-running after a failure
+    is safe. Pass ``vacuum`` to reclaim the freed pages afterwards. Returns
+    the number of rows archived per month.
+    """
+    if retention_months is None:
+        retention_months = current_app.config.get('GCD_AUDIT_RETENTION_MONTHS', 3)
+    now = datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - (max(int(retention_months), 1) - 1)
+    cutoff = _month_start(index // 12, index % 12 + 1)
+
+    db = get_db()
+    db.create_function('audit_deflate', 1, _deflate, deterministic=True)
+    months = [row[0] for row in db.execute(
+        'SELECT DISTINCT substr(created_at, 1, 7) FROM audit_log WHERE created_at < ? ORDER BY 1',
+        (cutoff,)
+    )]
+
+    archive_dir = get_archive_dir()
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = {}
+    for month in months:
+        start, end = _month_range(month)
+        db.commit()
+        db.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}',
+                   (os.path.join(archive_dir, f'audit-{month}.db'),))
+        try:
+            with db:
+                begin_immediate(db)
+                for statement in ARCHIVE_DDL:
+                    db.execute(statement)
+                db.execute(
+                    f'''INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.audit_log
+                       SELECT id, event_type, user_id, house_id, target_type, target_id,
+                              audit_deflate(old_values), audit_deflate(new_values),
+                              ip_address, user_agent, session_id, created_at
+                       FROM main.audit_log WHERE created_at >= ? AND created_at < ?''',
+                    (start, end)
+                )
+                cursor = db.execute(
+                    'DELETE FROM main.audit_log WHERE created_at >= ? AND created_at < ?',
+                    (start, end)
+                )
+                archived[month] = cursor.rowcount
+        finally:
+            db.execute(f'DETACH DATABASE {ARCHIVE_SCHEMA}')
+
+    if vacuum and archived:
+        db.execute('VACUUM')
+    return archived
+
+
+def encode_cursor(event):
+    """Opaque keyset cursor pointing just past ``event``."""
+    raw = json.dumps([event['created_at'], event['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return the ``(created_at, id)`` key held by a cursor; ValueError if malformed."""
+    try:
+        created_at, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError(f'Invalid audit cursor: {cursor!r}')
+    return str(created_at), int(event_id)
+
+
+def _build_filters(filters, since, until, after, descending):
+    where, params = [], []
+    for column in FILTER_COLUMNS:
+        if filters.get(column) is not None:
+            where.append(f'{column} = ?')
+            params.append(filters[column])
+    if since is not None:
+        where.append('created_at >= ?')
+        params.append(str(since))
+    if until is not None:
+        where.append('created_at < ?')
+        params.append(str(until))
+    if after is not None:
+        # Row-value comparison so the composite indexes serve it as a range.
+        where.append('(created_at, id) < (?, ?)' if descending else '(created_at, id) > (?, ?)')
+        params.extend(after)
+    return where, params
+
+
+def _query_source(connection, where, params, descending=False):
+    """Stream matching rows of one audit_log table in (created_at, id) order."""
+    direction = 'DESC' if descending else 'ASC'
+    sql = f"SELECT {', '.join(READ_COLUMNS)} FROM audit_log"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f' ORDER BY created_at {direction}, id {direction}'
+    for row in connection.execute(sql, params):
+        event = dict(zip(READ_COLUMNS, row))
+        event['old_values'] = _inflate(event['old_values'])
+        event['new_values'] = _inflate(event['new_values'])
+        yield event
+
+
+def _archive_source(path, where, params, descending=False):
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        yield from _query_source(connection, where, params, descending)
+    finally:
+        connection.close()
+
+
+def _open_sources(filters, since, until, after, descending):
+    """One ordered row stream per overlapping archive, plus the live table."""
+    where, params = _build_filters(filters, since, until, after, descending)
+    low, high = since, until
+    if after is not None:
+        if descending:
+            # Keep the cursor's own month: a month starting at the cursor is still in range.
+            high = min(high, after[0] + '~') if high is not None else after[0] + '~'
+        else:
+            low = max(low, after[0]) if low is not None else after[0]
+
+    sources = []
+    archive_dir = get_archive_dir()
+    for month in list_archived_months():
+        start, end = _month_range(month)
+        if (low is None or end > str(low)) and (high is None or start < str(high)):
+            path = os.path.join(archive_dir, f'audit-{month}.db')
+            sources.append(_archive_source(path, where, params, descending))
+    sources.append(_query_source(get_db(), where, params, descending))
+    return sources
+
+
+def _merge_sources(sources, descending):
+    # A month interrupted mid-archive can briefly exist in both places.
+    last_id = None
+    for event in heapq.merge(*sources, key=lambda event: (event['created_at'], event['id']),
+                             reverse=descending):
+        if event['id'] != last_id:
+            last_id = event['id']
+            yield event
+
+
+def iter_audit_log(since=None, until=None, house_id=None, user_id=None, event_type=None,
+                   target_type=None, target_id=None, descending=False):
+    """Stream audit events in [since, until) from the archives and the live table.
+
+    Only archives whose month overlaps the range are opened. Rows arrive in
+    (created_at, id) order without being collected in memory.
+    """
+    filters = {'house_id': house_id, 'user_id': user_id, 'event_type': event_type,
+               'target_type': target_type, 'target_id': target_id}
+    sources = _open_sources(filters, since, until, None, descending)
+    try:
+        yield from _merge_sources(sources, descending)
+    finally:
+        for source in sources:
+            source.close()
+
+
+def query_audit_log(since=None, until=None, house_id=None, user_id=None, event_type=None,
+                    target_type=None, target_id=None, cursor=None, limit=100, descending=False):
+    """Return one page of audit events and the cursor for the next page.
+
+    Pages are keyed on ``(created_at, id)`` rather than an offset, so each
+    page starts with an index seek however deep into the log it is. Pass the
+    returned ``next_cursor`` back with the same filters to continue; it is
+    None on the last page.
+    """
+    filters = {'house_id': house_id, 'user_id': user_id, 'event_type': event_type,
+               'target_type': target_type, 'target_id': target_id}
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    sources = _open_sources(filters, since, until, after, descending)
+    try:
+        events = list(itertools.islice(_merge_sources(sources, descending), limit + 1))
+    finally:
+        for source in sources:
+            source.close()
+
+    next_cursor = encode_cursor(events[limit - 1]) if len(events) > limit else None
+    return {'events': events[:limit], 'next_cursor': next_cursor}
+
+
+def export_audit_log(stream, **filters):
+    """Write every matching event to ``stream`` as JSON lines; returns the count."""
+    count = 0
+    for event in iter_audit_log(**filters):
+        stream.write(json.dumps(event, default=str) + '\n')
+        count += 1
+    return count
+
+
+__all__ = [
+    'AuditWriter', 'get_audit_writer', 'log_event', 'log_events',
+    'flush_audit_log', 'make_audit_row', 'archive_audit_log',
+    'list_archived_months', 'iter_audit_log', 'query_audit_log',
+    'export_audit_log', 'encode_cursor', 'decode_cursor'
+]
@@ -0,0 +1,134 @@
+"""
+GCD house budgets.
+
+A budget caps the net debits to one of a house's expense accounts per
+week, month or year. The ``account_spend`` counters they are checked
+against are kept by triggers on ``transaction_entries``, so posting an
+entry, by hand, through a merge or by the recurring job, updates them in
+the same statement, and reading a budget's status is one indexed lookup
+per budget rather than a scan of the period's entries.
+"""
+
+from datetime import date
+
+from gcd_audit import log_event
+from gcd_database import begin_immediate, get_db
+
+
+PERIODS = ('weekly', 'monthly', 'yearly')
+
+# First day of the period containing ``{day}``; weeks start on Monday.
+PERIOD_START = '''CASE {period}
+    WHEN 'weekly' THEN date({day}, '-6 days', 'weekday 1')
+    WHEN 'monthly' THEN date({day}, 'start of month')
+    ELSE date({day}, 'start of year')
+END'''
+
+
+def _state(spent, amount, alert_threshold):
+    if spent > amount:
+        return 'over'
+    if spent >= amount * alert_threshold:
+        return 'warning'
+    return 'ok'
+
+
+def set_budget(house_id, account_id, amount, period='monthly', alert_threshold=0.8,
+               created_by=None):
+    """Create or change the budget of an expense account; returns the budget id.
+
+    Raises ValueError if the account is not an expense account of the house.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Period must be one of {', '.join(PERIODS)}.")
+    if amount <= 0 or not 0 < alert_threshold <= 1:
+        raise ValueError('The amount must be positive and the alert threshold in (0, 1].')
+    db = get_db()
+    account = db.execute(
+        'SELECT house_id, account_type FROM accounts WHERE id = ?', (account_id,)
+    ).fetchone()
+    if account is None or account['house_id'] != house_id or account['account_type'] != 'expense':
+        raise ValueError(f'Account {account_id} is not an expense account of house {house_id}.')
+
+    with db:
+        db.execute(
+            '''INSERT INTO house_budgets (house_id, account_id, period, amount, alert_threshold,
+                                          created_by)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (account_id, period) DO UPDATE SET
+                   amount = excluded.amount,
+                   alert_threshold = excluded.alert_threshold''',
+            (house_id, account_id, period, amount, alert_threshold, created_by)
+        )
+        budget_id = db.execute(
+            'SELECT id FROM house_budgets WHERE account_id = ? AND period = ?', (account_id, period)
+        ).fetchone()['id']
+        log_event(
+            'budget_set', user_id=created_by, house_id=house_id,
+            target_type='house_budget', target_id=budget_id,
+            new_values={'account_id': account_id, 'period': period, 'amount': amount,
+                        'alert_threshold': alert_threshold}
+        )
+    return budget_id
+
+
+def get_budget_status(house_id, today=None):
+    """A house's budgets with the spend of the period containing ``today``.
+
+    Each budget comes with ``spent``, ``remaining`` and a ``state`` of
+    ``ok``, ``warning`` (past its alert threshold) or ``over``.
+    """
+    db = get_db()
+    current_start = PERIOD_START.format(period='b.period', day=':today')
+    rows = db.execute(
+        f'''SELECT b.id, b.account_id, a.name AS account_name, b.period, b.amount,
+                   b.alert_threshold, {current_start} AS period_start,
+                   COALESCE(s.spent, 0) AS spent
+            FROM house_budgets AS b
+            JOIN accounts AS a ON a.id = b.account_id
+            LEFT JOIN account_spend AS s
+              ON s.account_id = b.account_id AND s.period = b.period
+             AND s.period_start = {current_start}
+            WHERE b.house_id = :house_id
+            ORDER BY a.name, b.period''',
+        {'house_id': house_id, 'today': (today or date.today()).isoformat()}
+    ).fetchall()
+    return [
+        {**dict(row), 'remaining': row['amount'] - row['spent'],
+         'state': _state(row['spent'], row['amount'], row['alert_threshold'])}
+        for row in rows
+    ]
+
+
+def get_budget_alerts(house_id, today=None):
+    """The house's budgets past their alert threshold, over budget first."""
+    alerts = [budget for budget in get_budget_status(house_id, today) if budget['state'] != 'ok']
+    return sorted(alerts, key=lambda budget: budget['state'] != 'over')
+
+
+def rebuild_account_spend():
+    """Recompute every spend counter from the posted entries; returns the counter count.
+
+    Repairs the counters after entries were changed with the triggers dropped.
+    """
+    db = get_db()
+    with db:
+        begin_immediate(db)
+        db.execute('DELETE FROM account_spend')
+        db.execute(
+            f'''INSERT INTO account_spend (account_id, period, period_start, spent)
+                SELECT e.account_id, p.period,
+                       {PERIOD_START.format(period='p.period', day='t.transaction_date')},
+                       SUM(CASE WHEN e.entry_type = 'debit' THEN e.amount ELSE -e.amount END)
+                FROM transaction_entries AS e
+                JOIN accounts AS a ON a.id = e.account_id AND a.account_type = 'expense'
+                JOIN transactions AS t ON t.id = e.transaction_id
+                JOIN (SELECT 'weekly' AS period UNION ALL SELECT 'monthly'
+                      UNION ALL SELECT 'yearly') AS p
+                GROUP BY 1, 2, 3'''
+        )
+        return db.execute('SELECT COUNT(*) FROM account_spend').fetchone()[0]
+
+
+__all__ = ['PERIODS', 'get_budget_alerts', 'get_budget_status', 'rebuild_account_spend',
+           'set_budget']
@@ -16,8 +16,10 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from gcd_database import (
     get_db, init_db, seed_gcd_data, get_house_net_worth,
     get_member_contribution_score, get_pending_veto_proposals,
-    get_house_members_by_role, calculate_net_time_value
+    get_pending_merge_proposals, get_house_members_by_role,
+    calculate_net_time_value
 )
+from gcd_governance import resolve_pending_proposals
 
 
 def create_app():
@@ -68,6 +70,13 @@ def display_house_summary(house_id):
     print(f"Net Worth: ${net_worth:,.2f}")
     print(f"Net Time Value: {net_time_days:.1f} days of sustainability")
     
+    # Budget alerts
+    from gcd_budgets import get_budget_alerts
+    for budget in get_budget_alerts(house_id):
+        label = 'Over budget' if budget['state'] == 'over' else 'Budget nearly used'
+        print(f"⚠️  {label}: {budget['account_name']} ({budget['period']}) "
+              f"${budget['spent']:,.2f} of ${budget['amount']:,.2f}")
+    
     # Assets summary
     assets = db.execute(
         '''SELECT asset_type, SUM(current_value) as total_value, COUNT(*) as count
@@ -116,15 +125,36 @@ def display_pending_proposals(house_id):
             print(f"Proposed by: {proposal['proposed_by_name']}")
             print(f"Reason: {proposal['reason']}")
             print(f"Votes Required: {proposal['votes_required']}")
-            print(f"Votes Received: {proposal['votes_received']}")
+            print(f"Votes Received: {proposal['votes_received']:g} "
+                  f"(for {proposal['votes_for']:g}, against {proposal['votes_against']:g})")
             print(f"Founder Approval Required: {'Yes' if proposal['founder_approval_required'] else 'No'}")
+            print(f"Founder Approved: {'Yes' if proposal['founder_approved'] else 'No'}")
             print(f"Created: {proposal['created_at']}")
             print()
     else:
         print("\n⚖️  VETO PROPOSALS: None pending")
     
-    # Merge proposals would be displayed here if we implement the function
-    print("\n🤝 MERGE PROPOSALS: Use dedicated function to view")
+    # Merge proposals
+    merge_proposals = get_pending_merge_proposals(house_id)
+    if merge_proposals:
+        print("\n🤝 MERGE PROPOSALS:")
+        print(f"{'─'*60}")
+        for proposal in merge_proposals:
+            print(f"Proposal ID: {proposal['id']}")
+            print(f"Merge: {proposal['source_house_name']} → {proposal['target_house_name']}")
+            print(f"Proposed by: {proposal['proposed_by_name']}")
+            print(f"Source Votes: {proposal['votes_for_source']:g} for of "
+                  f"{proposal['votes_received_source']:g} received "
+                  f"({proposal['votes_required_source']} required)")
+            print(f"Target Votes: {proposal['votes_for_target']:g} for of "
+                  f"{proposal['votes_received_target']:g} received "
+                  f"({proposal['votes_required_target']} required)")
+            print(f"Founder Approvals: source {'Yes' if proposal['founder_approval_source'] else 'No'}, "
+                  f"target {'Yes' if proposal['founder_approval_target'] else 'No'}")
+            print(f"Created: {proposal['created_at']}")
+            print()
+    else:
+        print("\n🤝 MERGE PROPOSALS: None pending")
 
 
 def list_all_houses():
@@ -251,10 +281,11 @@ def main_menu():
         print("5. System Statistics")
         print("6. Initialize Database")
         print("7. Seed Example Data")
-        print("8. Exit")
+        print("8. Resolve Decided Proposals")
+        print("9. Exit")
         print()
         
-        choice = input("Enter your choice (1-8): ").strip()
+        choice = input("Enter your choice (1-9): ").strip()
         
         if choice == '1':
             list_all_houses()
@@ -291,6 +322,11 @@ def main_menu():
             print("Database seeded successfully!")
         
         elif choice == '8':
+            summary = resolve_pending_proposals()
+            for status, count in summary.items():
+                print(f"{status.replace('_', ' ').title()}: {count}")
+        
+        elif choice == '9':
             print("Goodbye! 👋")
             break
         
@@ -22,6 +22,12 @@ def close_db(e=None):
         db.close()
 
 
+def begin_immediate(db):
+    """Take the write lock up front so concurrent writers are serialised."""
+    if not db.in_transaction:
+        db.execute('BEGIN IMMEDIATE')
+
+
 def init_db():
     """Initialize GCD database with schema."""
     db = get_db()
@@ -34,6 +40,13 @@ def init_app(app):
     """Register database functions with the Flask app."""
     app.teardown_appcontext(close_db)
 
+    if app.config.get('GCD_PROPOSAL_SWEEP_INTERVAL'):
+        from gcd_governance import start_proposal_sweeper
+
+        @app.before_request
+        def ensure_proposal_sweeper():
+            start_proposal_sweeper(app)
+
     @app.cli.command('init-db')
     def init_db_command():
         """Clear existing data and create new tables."""
@@ -53,6 +66,132 @@ def init_app(app):
         seed_gcd_data()
         click.echo('Reset and reseeded GCD database.')
 
+    @app.cli.command('resolve-proposals')
+    @click.option('--house-id', type=int, default=None, help='Only resolve proposals for this house.')
+    def resolve_proposals_command(house_id):
+        """Resolve pending proposals that have reached a decision."""
+        from gcd_governance import resolve_pending_proposals
+        summary = resolve_pending_proposals(house_id)
+        click.echo('Resolved proposals: ' + ', '.join(
+            f'{status.replace("_", " ")}: {count}' for status, count in summary.items()))
+
+    @app.cli.command('merge-houses')
+    @click.argument('merge_proposal_id', type=int)
+    @click.option('--dry-run', is_flag=True, help='Preview the merged balance sheet without writing.')
+    def merge_houses_command(merge_proposal_id, dry_run):
+        """Execute an approved house merge proposal."""
+        from gcd_merge import execute_merge
+
+        def report(step, rows):
+            click.echo(f'  {step.replace("_", " ")}: {rows} rows')
+
+        try:
+            sheet = execute_merge(merge_proposal_id, dry_run=dry_run, progress=report)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo('Post-merge balance sheet' + (' (dry run)' if dry_run else '') + ':')
+        for key, value in sheet.items():
+            if key not in ('house_id', 'dry_run'):
+                click.echo(f'  {key.replace("_", " ").title()}: {value:,.2f}')
+
+    @app.cli.command('archive-audit-log')
+    @click.option('--retention-months', type=int, default=None,
+                  help='Months to keep live, including the current one.')
+    @click.option('--vacuum', is_flag=True, help='Reclaim freed space afterwards.')
+    def archive_audit_log_command(retention_months, vacuum):
+        """Move closed months of the audit log into compressed archives."""
+        from gcd_audit import archive_audit_log
+        from gcd_governance import acquire_job_lock
+        if not acquire_job_lock('archive_audit_log', 600):
+            click.echo('Skipped: another worker is archiving the audit log.')
+            return
+        archived = archive_audit_log(retention_months, vacuum=vacuum)
+        for month, count in archived.items():
+            click.echo(f'  {month}: {count} events archived')
+        click.echo(f'Archived {sum(archived.values())} audit events.')
+
+    @app.cli.command('audit-query')
+    @click.option('--house-id', type=int, default=None)
+    @click.option('--user-id', type=int, default=None)
+    @click.option('--event-type', default=None)
+    @click.option('--target-type', default=None)
+    @click.option('--target-id', type=int, default=None)
+    @click.option('--since', default=None, help='Inclusive start, e.g. 2025-01-01.')
+    @click.option('--until', default=None, help='Exclusive end, e.g. 2025-04-01.')
+    @click.option('--cursor', default=None, help='Cursor printed by the previous page.')
+    @click.option('--limit', type=int, default=50, show_default=True)
+    @click.option('--desc', 'descending', is_flag=True, help='Newest events first.')
+    @click.option('--export', 'export_path', default=None,
+                  help="Stream every matching event as JSON lines to this file ('-' for stdout).")
+    def audit_query_command(cursor, limit, descending, export_path, **filters):
+        """Page through or export audit events."""
+        import json
+        from gcd_audit import export_audit_log, query_audit_log
+        if export_path:
+            with click.open_file(export_path, 'w') as stream:
+                count = export_audit_log(stream, descending=descending, **filters)
+            if export_path != '-':
+                click.echo(f'Exported {count} audit events to {export_path}.')
+            return
+        try:
+            page = query_audit_log(cursor=cursor, limit=limit, descending=descending, **filters)
+        except ValueError as exc:
+            raise click.ClickException(str(exc))
+        for event in page['events']:
+            click.echo(json.dumps(event, default=str))
+        if page['next_cursor']:
+            click.echo(f"Next page: --cursor {page['next_cursor']}", err=True)
+
+    @app.cli.command('materialize-recurring-templates')
+    @click.option('--date', 'today', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Post occurrences due by this date (default today).')
+    @click.option('--max-catch-up', type=int, default=366, show_default=True,
+                  help='Most occurrences posted per template in one run.')
+    @click.option('--force', is_flag=True, help='Run even if another worker ran recently.')
+    def materialize_recurring_templates_command(today, max_catch_up, force):
+        """Post every due occurrence of the houses' recurring transactions; run nightly."""
+        from gcd_governance import acquire_job_lock
+        from gcd_recurring import materialize_recurring
+        if not force and not acquire_job_lock('materialize_recurring', 3600):
+            click.echo('Skipped: another worker posted recurring transactions recently.')
+            return
+
+        def report(step, rows):
+            click.echo(f'  {step.replace("_", " ")}: {rows} rows')
+
+        posted = materialize_recurring(today.date() if today else None,
+                                       max_catch_up=max_catch_up, progress=report)
+        click.echo(f'Posted {sum(posted.values())} recurring transactions '
+                   f'for {len(posted)} houses.')
+
+    @app.cli.command('budget-status')
+    @click.argument('house_id', type=int)
+    def budget_status_command(house_id):
+        """Show a house's budgets against the current period's spend."""
+        from gcd_budgets import get_budget_status
+        for budget in get_budget_status(house_id):
+            marker = {'over': ' OVER BUDGET', 'warning': ' nearly used'}.get(budget['state'], '')
+            click.echo(f"  {budget['account_name']} ({budget['period']}): "
+                       f"{budget['spent']:,.2f} of {budget['amount']:,.2f}{marker}")
+
+    @app.cli.command('rebuild-budget-spend')
+    def rebuild_budget_spend_command():
+        """Recompute the expense account spend counters behind house budgets."""
+        from gcd_budgets import rebuild_account_spend
+        click.echo(f'Rebuilt {rebuild_account_spend()} account spend counters.')
+
+    @app.cli.command('expire-proposals')
+    @click.option('--force', is_flag=True, help='Run even if another worker swept recently.')
+    def expire_proposals_command(force):
+        """Expire pending proposals that have outlived their house policy."""
+        from gcd_governance import expire_overdue_proposals, sweep_expired_proposals
+        summary = expire_overdue_proposals() if force else sweep_expired_proposals()
+        if summary is None:
+            click.echo('Skipped: another worker ran the sweep recently.')
+            return
+        click.echo('Expired proposals: ' + ', '.join(
+            f'{status.replace("_", " ")}: {count}' for status, count in summary.items()))
+
 
 def seed_gcd_data():
     """Seed GCD database with comprehensive example data."""
@@ -271,6 +410,21 @@ def seed_gcd_data():
                 (transaction_id, entry['account_id'], entry['amount'], entry['entry_type'], entry['description'])
             )
     
+    # Salary and mortgage recur monthly from next month on
+    from gcd_recurring import create_template
+    first_of_next_month = (datetime.now().replace(day=1) + timedelta(days=32)).replace(day=1).date()
+    for transaction in transactions[0], transactions[2]:
+        create_template(
+            transaction['house_id'], transaction['created_by'], transaction['description'],
+            transaction['amount'], transaction['entries'], start_date=first_of_next_month,
+            approved_by=transaction['approved_by']
+        )
+    
+    # Monthly budgets on the house's expense accounts
+    from gcd_budgets import set_budget
+    set_budget(house_id, account_ids['Living Expenses'], 6000, created_by=user_ids['john_founder'])
+    set_budget(house_id, account_ids['Business Expenses'], 10000, created_by=user_ids['mary_president'])
+    
     # Create veto proposal for James (the problematic member)
     cursor = db.execute(
         '''INSERT INTO veto_proposals (house_id, proposed_by, target_member_id, reason, votes_required, founder_approval_required) 
@@ -282,18 +436,12 @@ def seed_gcd_data():
     )
     veto_proposal_id = cursor.lastrowid
     
-    # Add votes for veto proposal
-    db.execute(
-        '''INSERT INTO veto_votes (proposal_id, voter_id, vote, comments) 
-           VALUES (?, ?, ?, ?)''',
-        (veto_proposal_id, user_ids['john_founder'], True, 'I agree with the veto proposal. James has violated house rules.')
-    )
-    
-    db.execute(
-        '''INSERT INTO veto_votes (proposal_id, voter_id, vote, comments) 
-           VALUES (?, ?, ?, ?)''',
-        (veto_proposal_id, user_ids['robert_member'], True, 'James has been problematic. Support the veto.')
-    )
+    # Add votes for veto proposal (through the governance API so tallies stay current)
+    from gcd_governance import cast_veto_vote, cast_merge_vote
+    cast_veto_vote(veto_proposal_id, user_ids['john_founder'], True,
+                   'I agree with the veto proposal. James has violated house rules.')
+    cast_veto_vote(veto_proposal_id, user_ids['robert_member'], True,
+                   'James has been problematic. Support the veto.')
     
     # Create merge proposal between Anderson Dynasty and Smith Heritage
     cursor = db.execute(
@@ -307,17 +455,10 @@ def seed_gcd_data():
     merge_proposal_id = cursor.lastrowid
     
     # Add merge votes
-    db.execute(
-        '''INSERT INTO merge_votes (merge_proposal_id, voter_id, vote, comments) 
-           VALUES (?, ?, ?, ?)''',
-        (merge_proposal_id, user_ids['john_founder'], True, 'Merge makes strategic sense for both houses.')
-    )
-    
-    db.execute(
-        '''INSERT INTO merge_votes (merge_proposal_id, voter_id, vote, comments) 
-           VALUES (?, ?, ?, ?)''',
-        (merge_proposal_id, user_ids['mary_president'], True, 'Proposed by me, fully support this merger.')
-    )
+    cast_merge_vote(merge_proposal_id, user_ids['john_founder'], True,
+                    'Merge makes strategic sense for both houses.')
+    cast_merge_vote(merge_proposal_id, user_ids['mary_president'], True,
+                    'Proposed by me, fully support this merger.')
     
     # Create audit log entries
     audit_entries = [
@@ -328,13 +469,8 @@ def seed_gcd_data():
         {'event_type': 'merge_proposed', 'user_id': user_ids['mary_president'], 'house_id': house_id, 'target_type': 'merge_proposal', 'target_id': merge_proposal_id, 'new_values': 'Merge proposed with Smith Heritage'}
     ]
     
-    for entry in audit_entries:
-        db.execute(
-            '''INSERT INTO audit_log (event_type, user_id, house_id, target_type, target_id, new_values) 
-               VALUES (?, ?, ?, ?, ?, ?)''',
-            (entry['event_type'], entry['user_id'], entry['house_id'], 
-             entry['target_type'], entry['target_id'], entry['new_values'])
-        )
+    from gcd_audit import log_events
+    log_events(audit_entries)
     
     db.commit()
 
@@ -400,6 +536,21 @@ def get_pending_veto_proposals(house_id):
     ).fetchall()
 
 
+def get_pending_merge_proposals(house_id):
+    """Get all pending merge proposals in which a house is the source or target."""
+    db = get_db()
+    return db.execute(
+        '''SELECT mp.*, u.username as proposed_by_name,
+                  hs.name as source_house_name, ht.name as target_house_name
+           FROM merge_proposals mp
+           JOIN users u ON mp.proposed_by = u.id
+           JOIN houses hs ON mp.source_house_id = hs.id
+           JOIN houses ht ON mp.target_house_id = ht.id
+           WHERE (mp.source_house_id = ? OR mp.target_house_id = ?) AND mp.status = 'pending'
+           ORDER BY mp.created_at DESC''', (house_id, house_id)
+    ).fetchall()
+
+
 def get_house_members_by_role(house_id):
     """Get house members grouped by role."""
     db = get_db()
@@ -425,8 +576,9 @@ def calculate_net_time_value(house_id, daily_expense_estimate=200):
 
 
 __all__ = [
-    'get_db', 'init_db', 'init_app', 'seed_gcd_data',
+    'get_db', 'begin_immediate', 'init_db', 'init_app', 'seed_gcd_data',
     'get_house_net_worth', 'get_member_contribution_score', 
-    'get_pending_veto_proposals', 'get_house_members_by_role',
+    'get_pending_veto_proposals', 'get_pending_merge_proposals',
+    'get_house_members_by_role',
     'calculate_net_time_value'
 ]
@@ -0,0 +1,411 @@
+"""
+GCD governance helpers for veto and merge proposals.
+
+Vote counters on ``veto_proposals`` and ``merge_proposals`` are maintained
+incrementally as ballots are cast, so reading or resolving a proposal never
+has to recount its votes.
+"""
+
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+from flask import current_app
+
+from gcd_audit import log_events
+from gcd_database import begin_immediate, get_db
+
+
+# A veto passes once quorum is reached, the weighted majority is in favour and
+# the founder has consented (when the proposal requires it).
+VETO_APPROVED = '''votes_received >= votes_required
+    AND votes_for > votes_against
+    AND (NOT founder_approval_required OR founder_approved)'''
+
+VETO_REJECTED = '''votes_received >= votes_required
+    AND votes_against >= votes_for'''
+
+# A merge needs quorum, a weighted majority and founder approval in both houses.
+MERGE_APPROVED = '''votes_received_source >= votes_required_source
+    AND votes_received_target >= votes_required_target
+    AND votes_for_source * 2 > votes_received_source
+    AND votes_for_target * 2 > votes_received_target
+    AND founder_approval_source AND founder_approval_target'''
+
+MERGE_REJECTED = '''(votes_received_source >= votes_required_source
+        AND votes_for_source * 2 <= votes_received_source)
+    OR (votes_received_target >= votes_required_target
+        AND votes_for_target * 2 <= votes_received_target)'''
+
+
+def _vote_deltas(previous, vote, weight):
+    """Return the (for, against) weight deltas for replacing ``previous`` with ``vote``."""
+    for_delta = weight if vote else 0.0
+    against_delta = 0.0 if vote else weight
+    if previous is not None:
+        previous_weight = previous['weight'] if previous['weight'] is not None else 1.0
+        if previous['vote']:
+            for_delta -= previous_weight
+        else:
+            against_delta -= previous_weight
+    return for_delta, against_delta
+
+
+def cast_veto_vote(proposal_id, voter_id, vote, comments=None, weight=1.0):
+    """Record or change a vote on a pending veto proposal.
+
+    The ballot is upserted and its weight applied to the proposal counters in
+    the same transaction. Returns the updated proposal, or None if the
+    proposal does not exist or is no longer pending.
+    """
+    db = get_db()
+    vote = bool(vote)
+
+    with db:
+        begin_immediate(db)
+        proposal = db.execute(
+            "SELECT id FROM veto_proposals WHERE id = ? AND status = 'pending'",
+            (proposal_id,)
+        ).fetchone()
+        if proposal is None:
+            return None
+
+        previous = db.execute(
+            'SELECT vote, weight FROM veto_votes WHERE proposal_id = ? AND voter_id = ?',
+            (proposal_id, voter_id)
+        ).fetchone()
+
+        db.execute(
+            '''INSERT INTO veto_votes (proposal_id, voter_id, vote, comments, weight)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(proposal_id, voter_id) DO UPDATE SET
+                   vote = excluded.vote,
+                   comments = excluded.comments,
+                   weight = excluded.weight,
+                   voted_at = CURRENT_TIMESTAMP''',
+            (proposal_id, voter_id, vote, comments, weight)
+        )
+
+        for_delta, against_delta = _vote_deltas(previous, vote, weight)
+        db.execute(
+            '''UPDATE veto_proposals
+               SET votes_for = votes_for + ?,
+                   votes_against = votes_against + ?,
+                   votes_received = votes_received + ?,
+                   founder_approved = CASE
+                       WHEN (SELECT founder_id FROM houses WHERE id = veto_proposals.house_id) = ?
+                       THEN ? ELSE founder_approved
+                   END
+               WHERE id = ?''',
+            (for_delta, against_delta, for_delta + against_delta, voter_id, vote, proposal_id)
+        )
+
+    return db.execute('SELECT * FROM veto_proposals WHERE id = ?', (proposal_id,)).fetchone()
+
+
+def cast_merge_vote(merge_proposal_id, voter_id, vote, comments=None, weight=1.0,
+                    voter_house_id=None):
+    """Record or change a vote on a pending merge proposal.
+
+    Votes are tallied per side of the merge. When ``voter_house_id`` is not
+    given it is taken from the voter's active membership in the source or
+    target house, preferring a house the voter founded. Returns the updated
+    proposal, or None if the proposal is not pending or the voter belongs to
+    neither house.
+    """
+    db = get_db()
+    vote = bool(vote)
+
+    with db:
+        begin_immediate(db)
+        proposal = db.execute(
+            '''SELECT id, source_house_id, target_house_id FROM merge_proposals
+               WHERE id = ? AND status = 'pending' ''',
+            (merge_proposal_id,)
+        ).fetchone()
+        if proposal is None:
+            return None
+
+        if voter_house_id is None:
+            membership = db.execute(
+                '''SELECT house_id FROM house_members
+                   WHERE user_id = ? AND house_id IN (?, ?) AND status = 'active'
+                   ORDER BY CASE role WHEN 'founder' THEN 0 ELSE 1 END,
+                            house_id = ? DESC
+                   LIMIT 1''',
+                (voter_id, proposal['source_house_id'], proposal['target_house_id'],
+                 proposal['source_house_id'])
+            ).fetchone()
+            if membership is None:
+                return None
+            voter_house_id = membership['house_id']
+        elif voter_house_id not in (proposal['source_house_id'], proposal['target_house_id']):
+            return None
+
+        previous = db.execute(
+            '''SELECT vote, weight, voter_house_id FROM merge_votes
+               WHERE merge_proposal_id = ? AND voter_id = ?''',
+            (merge_proposal_id, voter_id)
+        ).fetchone()
+
+        db.execute(
+            '''INSERT INTO merge_votes (merge_proposal_id, voter_id, voter_house_id, vote, comments, weight)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(merge_proposal_id, voter_id) DO UPDATE SET
+                   voter_house_id = excluded.voter_house_id,
+                   vote = excluded.vote,
+                   comments = excluded.comments,
+                   weight = excluded.weight,
+                   voted_at = CURRENT_TIMESTAMP''',
+            (merge_proposal_id, voter_id, voter_house_id, vote, comments, weight)
+        )
+
+        # Take the previous ballot off its side, then add the new one.
+        deltas = {'source': [0.0, 0.0], 'target': [0.0, 0.0]}  # [for, received]
+        if previous is not None:
+            side = 'source' if previous['voter_house_id'] == proposal['source_house_id'] else 'target'
+            previous_weight = previous['weight'] if previous['weight'] is not None else 1.0
+            deltas[side][1] -= previous_weight
+            if previous['vote']:
+                deltas[side][0] -= previous_weight
+        side = 'source' if voter_house_id == proposal['source_house_id'] else 'target'
+        deltas[side][1] += weight
+        if vote:
+            deltas[side][0] += weight
+
+        db.execute(
+            '''UPDATE merge_proposals
+               SET votes_for_source = votes_for_source + :for_source,
+                   votes_received_source = votes_received_source + :received_source,
+                   votes_for_target = votes_for_target + :for_target,
+                   votes_received_target = votes_received_target + :received_target,
+                   founder_approval_source = CASE
+                       WHEN (SELECT founder_id FROM houses WHERE id = merge_proposals.source_house_id) = :voter_id
+                       THEN :vote ELSE founder_approval_source
+                   END,
+                   founder_approval_target = CASE
+                       WHEN (SELECT founder_id FROM houses WHERE id = merge_proposals.target_house_id) = :voter_id
+                       THEN :vote ELSE founder_approval_target
+                   END
+               WHERE id = :id''',
+            {
+                'for_source': deltas['source'][0], 'received_source': deltas['source'][1],
+                'for_target': deltas['target'][0], 'received_target': deltas['target'][1],
+                'voter_id': voter_id, 'vote': vote, 'id': merge_proposal_id,
+            }
+        )
+
+    return db.execute('SELECT * FROM merge_proposals WHERE id = ?', (merge_proposal_id,)).fetchone()
+
+
+def resolve_pending_proposals(house_id=None):
+    """Resolve every pending veto and merge proposal whose outcome is decided.
+
+    Each proposal type is settled with a single set-based UPDATE over the
+    maintained counters; approved vetoes remove their target member. Pass
+    ``house_id`` to limit the pass to one house. Returns the number of
+    proposals moved to each status.
+    """
+    db = get_db()
+    veto_filter, veto_params = '', ()
+    merge_filter, merge_params = '', ()
+    if house_id is not None:
+        veto_filter, veto_params = 'AND house_id = ?', (house_id,)
+        merge_filter = 'AND (source_house_id = ? OR target_house_id = ?)'
+        merge_params = (house_id, house_id)
+
+    with db:
+        begin_immediate(db)
+        vetoes = db.execute(
+            f'''UPDATE veto_proposals
+                SET status = CASE WHEN {VETO_APPROVED} THEN 'approved' ELSE 'rejected' END,
+                    resolved_at = CURRENT_TIMESTAMP,
+                    final_decision_date = CURRENT_TIMESTAMP
+                WHERE status = 'pending' AND (({VETO_APPROVED}) OR ({VETO_REJECTED})) {veto_filter}
+                RETURNING id, house_id, target_member_id, status''',
+            veto_params
+        ).fetchall()
+
+        removed = [row['target_member_id'] for row in vetoes if row['status'] == 'approved']
+        if removed:
+            db.execute(
+                '''UPDATE house_members SET status = 'removed'
+                   WHERE id IN (SELECT value FROM json_each(?))''',
+                (json.dumps(removed),)
+            )
+
+        merges = db.execute(
+            f'''UPDATE merge_proposals
+                SET status = CASE WHEN {MERGE_APPROVED} THEN 'approved' ELSE 'rejected' END,
+                    resolved_at = CURRENT_TIMESTAMP
+                WHERE status = 'pending' AND (({MERGE_APPROVED}) OR ({MERGE_REJECTED})) {merge_filter}
+                RETURNING id, target_house_id, status''',
+            merge_params
+        ).fetchall()
+
+        log_events([
+            {'event_type': f"veto_{row['status']}", 'house_id': row['house_id'],
+             'target_type': 'veto_proposal', 'target_id': row['id'],
+             'new_values': {'status': row['status']}}
+            for row in vetoes
+        ] + [
+            {'event_type': f"merge_{row['status']}", 'house_id': row['target_house_id'],
+             'target_type': 'merge_proposal', 'target_id': row['id'],
+             'new_values': {'status': row['status']}}
+            for row in merges
+        ])
+
+    summary = {'veto_approved': 0, 'veto_rejected': 0, 'merge_approved': 0, 'merge_rejected': 0}
+    for row in vetoes:
+        summary[f"veto_{row['status']}"] += 1
+    for row in merges:
+        summary[f"merge_{row['status']}"] += 1
+    return summary
+
+
+def acquire_job_lock(name, ttl_seconds):
+    """Claim a named job for ``ttl_seconds`` across every worker sharing the database.
+
+    Returns True if this process now holds the lock. The lock is not released
+    early, so a periodic job guarded by it runs at most once per ``ttl_seconds``
+    no matter how many workers attempt it.
+    """
+    db = get_db()
+    owner = f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+    with db:
+        cursor = db.execute(
+            '''INSERT INTO job_locks (name, owner, acquired_at, expires_at)
+               VALUES (?, ?, CURRENT_TIMESTAMP, datetime('now', ?))
+               ON CONFLICT(name) DO UPDATE SET
+                   owner = excluded.owner,
+                   acquired_at = excluded.acquired_at,
+                   expires_at = excluded.expires_at
+               WHERE job_locks.expires_at <= datetime('now')''',
+            (name, owner, f'+{int(ttl_seconds)} seconds')
+        )
+    return cursor.rowcount == 1
+
+
+def expire_overdue_proposals():
+    """Expire every pending veto and merge proposal that has outlived its house policy.
+
+    A house's ``veto_expiry_days``/``merge_expiry_days`` override the
+    ``GCD_VETO_EXPIRY_DAYS``/``GCD_MERGE_EXPIRY_DAYS`` defaults; merge
+    proposals follow the target house. The shortest policy in force bounds a
+    ``(status, created_at)`` index range so only candidates are visited.
+    Returns the number of expired proposals of each kind.
+    """
+    db = get_db()
+    veto_default = current_app.config.get('GCD_VETO_EXPIRY_DAYS', 30)
+    merge_default = current_app.config.get('GCD_MERGE_EXPIRY_DAYS', 60)
+
+    with db:
+        begin_immediate(db)
+        shortest = db.execute(
+            '''SELECT MIN(COALESCE(veto_expiry_days, ?)) AS veto_days,
+                      MIN(COALESCE(merge_expiry_days, ?)) AS merge_days
+               FROM houses''',
+            (veto_default, merge_default)
+        ).fetchone()
+        veto_days = shortest['veto_days'] if shortest['veto_days'] is not None else veto_default
+        merge_days = shortest['merge_days'] if shortest['merge_days'] is not None else merge_default
+
+        vetoes = db.execute(
+            '''UPDATE veto_proposals
+               SET status = 'expired', resolved_at = CURRENT_TIMESTAMP
+               WHERE status = 'pending'
+                 AND created_at < datetime('now', ?)
+                 AND created_at < (
+                     SELECT datetime('now', '-' || COALESCE(h.veto_expiry_days, ?) || ' days')
+                     FROM houses h WHERE h.id = veto_proposals.house_id)
+               RETURNING id, house_id''',
+            (f'-{int(veto_days)} days', veto_default)
+        ).fetchall()
+
+        merges = db.execute(
+            '''UPDATE merge_proposals
+               SET status = 'expired', resolved_at = CURRENT_TIMESTAMP
+               WHERE status = 'pending'
+                 AND created_at < datetime('now', ?)
+                 AND created_at < (
+                     SELECT datetime('now', '-' || COALESCE(h.merge_expiry_days, ?) || ' days')
+                     FROM houses h WHERE h.id = merge_proposals.target_house_id)
+               RETURNING id, target_house_id''',
+            (f'-{int(merge_days)} days', merge_default)
+        ).fetchall()
+
+        log_events([
+            {'event_type': 'veto_expired', 'house_id': row['house_id'],
+             'target_type': 'veto_proposal', 'target_id': row['id'],
+             'new_values': {'status': 'expired'}}
+            for row in vetoes
+        ] + [
+            {'event_type': 'merge_expired', 'house_id': row['target_house_id'],
+             'target_type': 'merge_proposal', 'target_id': row['id'],
+             'new_values': {'status': 'expired'}}
+            for row in merges
+        ])
+
+    return {'veto_expired': len(vetoes), 'merge_expired': len(merges)}
+
+
+def sweep_expired_proposals(interval=None):
+    """Run the expiry pass if no other worker has run it within ``interval`` seconds.
+
+    Returns the expiry summary, or None when another worker holds the lock.
+    """
+    if interval is None:
+        interval = current_app.config.get('GCD_PROPOSAL_SWEEP_INTERVAL') or 3600
+    if not acquire_job_lock('expire_proposals', interval):
+        return None
+    return expire_overdue_proposals()
+
+
+_sweeper_lock = threading.Lock()
+_sweeper_pid = None
+
+
+def _run_sweeper(app, interval):
+    """Background loop for ``start_proposal_sweeper``."""
+    # Stagger workers that booted together so they do not all race for the lock.
+    time.sleep(random.uniform(0, min(interval, 60)))
+    while True:
+        with app.app_context():
+            try:
+                summary = sweep_expired_proposals(interval)
+                if summary and any(summary.values()):
+                    app.logger.info(f'Expired proposals: {summary}')
+            except Exception:
+                app.logger.exception('Proposal expiry sweep failed')
+        time.sleep(interval)
+
+
+def start_proposal_sweeper(app):
+    """Start the expiry sweeper thread for this worker process if it is not running.
+
+    Safe to call on every request: the thread is started once per process,
+    which keeps it working under pre-forking servers.
+    """
+    global _sweeper_pid
+    interval = app.config.get('GCD_PROPOSAL_SWEEP_INTERVAL')
+    if not interval or _sweeper_pid == os.getpid():
+        return
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid():
+            return
+        thread = threading.Thread(
+            target=_run_sweeper, args=(app, interval),
+            name='gcd-proposal-sweeper', daemon=True
+        )
+        thread.start()
+        _sweeper_pid = os.getpid()
+
+
+__all__ = [
+    'cast_veto_vote', 'cast_merge_vote', 'resolve_pending_proposals',
+    'acquire_job_lock', 'expire_overdue_proposals', 'sweep_expired_proposals',
+    'start_proposal_sweeper'
+]
@@ -0,0 +1,314 @@
+"""
+GCD house merge execution.
+
+A merge folds the source house into the target house with a fixed sequence
+of set-based statements, each touching every affected row at once. The same
+sequence runs against the live database inside one transaction, or against
+a copy of both houses in an attached in-memory database for a dry run.
+"""
+
+from gcd_audit import log_event
+from gcd_budgets import PERIOD_START
+from gcd_database import begin_immediate, get_db
+
+
+PREVIEW_SCHEMA = 'merge_preview'
+
+# Tables copied into the preview database, with the rows each one needs.
+PREVIEW_TABLES = [
+    ('houses', 'id IN (:source, :target)'),
+    ('house_members', 'house_id IN (:source, :target)'),
+    ('assets', 'owner_house_id IN (:source, :target)'),
+    ('accounts', 'house_id IN (:source, :target)'),
+    ('transactions', 'house_id IN (:source, :target)'),
+    ('transaction_entries',
+     'account_id IN (SELECT id FROM main.accounts WHERE house_id IN (:source, :target))'),
+    ('businesses', 'owner_house_id IN (:source, :target)'),
+    ('investment_portfolios', 'owner_house_id IN (:source, :target)'),
+    ('veto_proposals', 'house_id IN (:source, :target)'),
+    ('house_budgets', 'house_id IN (:source, :target)'),
+    ('account_spend',
+     'account_id IN (SELECT id FROM main.accounts WHERE house_id IN (:source, :target))'),
+    ('recurring_templates', 'house_id IN (:source, :target)'),
+    ('recurring_template_entries',
+     'template_id IN (SELECT id FROM main.recurring_templates WHERE house_id IN (:source, :target))'),
+    ('merge_proposals',
+     'source_house_id IN (:source, :target) OR target_house_id IN (:source, :target)'),
+    ('house_relationships', 'house_1_id IN (:source, :target) OR house_2_id IN (:source, :target)'),
+]
+
+# Ordered merge steps. ``{s}`` is the schema the merge runs against.
+MERGE_STEPS = [
+    # Users in both houses keep their target membership, folded with the source one.
+    ('merge_duplicate_members', '''
+        UPDATE {s}.house_members AS t
+        SET role = CASE
+                WHEN t.role = 'member' AND src.role IN ('founder', 'president') THEN 'president'
+                ELSE t.role
+            END,
+            contribution_score = MAX(t.contribution_score, src.contribution_score),
+            equity_stake = t.equity_stake + src.equity_stake,
+            warning_count = t.warning_count + src.warning_count
+        FROM {s}.house_members AS src
+        WHERE t.house_id = :target AND src.house_id = :source AND src.user_id = t.user_id'''),
+    ('retarget_vetoes_on_duplicates', '''
+        UPDATE {s}.veto_proposals AS vp
+        SET target_member_id = t.id
+        FROM {s}.house_members AS src
+        JOIN {s}.house_members AS t ON t.user_id = src.user_id AND t.house_id = :target
+        WHERE src.house_id = :source AND vp.target_member_id = src.id'''),
+    ('drop_duplicate_members', '''
+        DELETE FROM {s}.house_members
+        WHERE house_id = :source
+          AND user_id IN (SELECT user_id FROM {s}.house_members WHERE house_id = :target)'''),
+    # The target keeps its founder; the source founder joins as a president.
+    ('move_members', '''
+        UPDATE {s}.house_members
+        SET house_id = :target,
+            role = CASE role WHEN 'founder' THEN 'president' ELSE role END
+        WHERE house_id = :source'''),
+    ('move_veto_proposals', '''
+        UPDATE {s}.veto_proposals SET house_id = :target WHERE house_id = :source'''),
+    ('move_assets', '''
+        UPDATE {s}.assets SET owner_house_id = :target WHERE owner_house_id = :source'''),
+    # Accounts with the same name and type are combined into the target account.
+    ('repoint_entries', '''
+        UPDATE {s}.transaction_entries AS te
+        SET account_id = t.id
+        FROM {s}.accounts AS src
+        JOIN {s}.accounts AS t
+          ON t.house_id = :target AND t.name = src.name AND t.account_type = src.account_type
+        WHERE src.house_id = :source AND te.account_id = src.id'''),
+    ('repoint_template_entries', '''
+        UPDATE {s}.recurring_template_entries AS te
+        SET account_id = t.id
+        FROM {s}.accounts AS src
+        JOIN {s}.accounts AS t
+          ON t.house_id = :target AND t.name = src.name AND t.account_type = src.account_type
+        WHERE src.house_id = :source AND te.account_id = src.id'''),
+    # Where both accounts have a budget for a period, the target's budget stays.
+    ('drop_duplicate_budgets', '''
+        DELETE FROM {s}.house_budgets
+        WHERE house_id = :source
+          AND EXISTS (SELECT 1 FROM {s}.accounts AS src
+                      JOIN {s}.accounts AS t
+                        ON t.house_id = :target AND t.name = src.name
+                       AND t.account_type = src.account_type
+                      JOIN {s}.house_budgets AS tb
+                        ON tb.account_id = t.id AND tb.period = house_budgets.period
+                      WHERE src.id = house_budgets.account_id)'''),
+    ('repoint_budgets', '''
+        UPDATE {s}.house_budgets AS b
+        SET account_id = t.id
+        FROM {s}.accounts AS src
+        JOIN {s}.accounts AS t
+          ON t.house_id = :target AND t.name = src.name AND t.account_type = src.account_type
+        WHERE src.house_id = :source AND b.account_id = src.id'''),
+    ('drop_duplicate_account_spend', '''
+        DELETE FROM {s}.account_spend
+        WHERE account_id IN (
+            SELECT src.id FROM {s}.accounts AS src
+            JOIN {s}.accounts AS t
+              ON t.house_id = :target AND t.name = src.name AND t.account_type = src.account_type
+            WHERE src.house_id = :source)'''),
+    ('repoint_child_accounts', '''
+        UPDATE {s}.accounts AS child
+        SET parent_id = t.id
+        FROM {s}.accounts AS src
+        JOIN {s}.accounts AS t
+          ON t.house_id = :target AND t.name = src.name AND t.account_type = src.account_type
+        WHERE src.house_id = :source AND child.parent_id = src.id'''),
+    ('drop_duplicate_accounts', '''
+        DELETE FROM {s}.accounts
+        WHERE house_id = :source
+          AND EXISTS (SELECT 1 FROM {s}.accounts AS t
+                      WHERE t.house_id = :target
+                        AND t.name = accounts.name
+                        AND t.account_type = accounts.account_type)'''),
+    ('move_accounts', '''
+        UPDATE {s}.accounts SET house_id = :target WHERE house_id = :source'''),
+    ('move_budgets', '''
+        UPDATE {s}.house_budgets SET house_id = :target WHERE house_id = :source'''),
+    ('move_transactions', '''
+        UPDATE {s}.transactions SET house_id = :target WHERE house_id = :source'''),
+    ('move_recurring_templates', '''
+        UPDATE {s}.recurring_templates SET house_id = :target WHERE house_id = :source'''),
+    ('move_related_transactions', '''
+        UPDATE {s}.transactions SET related_house_id = :target WHERE related_house_id = :source'''),
+    ('move_businesses', '''
+        UPDATE {s}.businesses SET owner_house_id = :target WHERE owner_house_id = :source'''),
+    ('move_portfolios', '''
+        UPDATE {s}.investment_portfolios SET owner_house_id = :target WHERE owner_house_id = :source'''),
+    ('withdraw_other_merges', '''
+        UPDATE {s}.merge_proposals
+        SET status = 'withdrawn', resolved_at = CURRENT_TIMESTAMP
+        WHERE status = 'pending' AND id != :proposal
+          AND (source_house_id = :source OR target_house_id = :source)'''),
+    # Aggregates are recomputed once, after every row has moved.
+    ('recompute_balances', '''
+        UPDATE {s}.accounts
+        SET balance = COALESCE((
+                SELECT SUM(CASE WHEN te.entry_type = 'debit' THEN te.amount ELSE -te.amount END)
+                FROM {s}.transaction_entries AS te WHERE te.account_id = accounts.id), 0),
+            last_updated = CURRENT_TIMESTAMP
+        WHERE house_id = :target'''),
+    # The preview copy has no entry triggers, so spend is recomputed like the balances.
+    ('clear_account_spend', '''
+        DELETE FROM {s}.account_spend
+        WHERE account_id IN (SELECT id FROM {s}.accounts WHERE house_id = :target)'''),
+    ('recompute_account_spend', f'''
+        INSERT INTO {{s}}.account_spend (account_id, period, period_start, spent)
+        SELECT e.account_id, p.period,
+               {PERIOD_START.format(period='p.period', day='t.transaction_date')},
+               SUM(CASE WHEN e.entry_type = 'debit' THEN e.amount ELSE -e.amount END)
+        FROM {{s}}.transaction_entries AS e
+        JOIN {{s}}.accounts AS a
+          ON a.id = e.account_id AND a.house_id = :target AND a.account_type = 'expense'
+        JOIN {{s}}.transactions AS t ON t.id = e.transaction_id
+        JOIN (SELECT 'weekly' AS period UNION ALL SELECT 'monthly'
+              UNION ALL SELECT 'yearly') AS p
+        GROUP BY 1, 2, 3'''),
+    ('recompute_houses', '''
+        UPDATE {s}.houses
+        SET total_members = CASE WHEN id = :target THEN (
+                SELECT COUNT(*) FROM {s}.house_members
+                WHERE house_id = :target AND status = 'active') ELSE 0 END,
+            is_active = CASE WHEN id = :source THEN 0 ELSE is_active END,
+            net_worth = CASE WHEN id = :source THEN 0 ELSE net_worth END,
+            last_merge_date = CURRENT_TIMESTAMP
+        WHERE id IN (:source, :target)'''),
+    ('record_relationship', '''
+        INSERT INTO {s}.house_relationships (house_1_id, house_2_id, relationship_type)
+        VALUES (:source, :target, 'merged')
+        ON CONFLICT(house_1_id, house_2_id) DO UPDATE SET
+            relationship_type = 'merged',
+            last_updated = CURRENT_TIMESTAMP'''),
+    ('complete_proposal', '''
+        UPDATE {s}.merge_proposals
+        SET merge_completion_date = CURRENT_TIMESTAMP
+        WHERE id = :proposal'''),
+]
+
+
+def get_balance_sheet(house_id, schema='main'):
+    """Summarise a house's balance sheet from its account balances and holdings."""
+    db = get_db()
+    totals = {row['account_type']: row['balance'] or 0 for row in db.execute(
+        f'''SELECT account_type, SUM(balance) AS balance
+            FROM {schema}.accounts WHERE house_id = ?
+            GROUP BY account_type''', (house_id,)
+    )}
+    holdings = db.execute(
+        f'SELECT COALESCE(SUM(current_value), 0) AS total FROM {schema}.assets WHERE owner_house_id = ?',
+        (house_id,)
+    ).fetchone()['total']
+    members = db.execute(
+        f'''SELECT COUNT(*) AS count FROM {schema}.house_members
+            WHERE house_id = ? AND status = 'active' ''', (house_id,)
+    ).fetchone()['count']
+
+    # Balances are stored debit-positive, so credit-normal accounts are negated.
+    total_assets = totals.get('asset', 0) + holdings
+    total_liabilities = -totals.get('liability', 0)
+    return {
+        'house_id': house_id,
+        'asset_accounts': totals.get('asset', 0),
+        'asset_holdings': holdings,
+        'total_assets': total_assets,
+        'total_liabilities': total_liabilities,
+        'total_equity': -totals.get('equity', 0),
+        'revenue': -totals.get('revenue', 0),
+        'expenses': totals.get('expense', 0),
+        'net_worth': total_assets - total_liabilities,
+        'active_members': members,
+    }
+
+
+def _run_steps(db, schema, params, progress):
+    """Apply ``MERGE_STEPS`` to ``schema`` and report each step's row count."""
+    for name, sql in MERGE_STEPS:
+        cursor = db.execute(sql.format(s=schema), params)
+        if progress is not None:
+            progress(name, max(cursor.rowcount, 0))
+
+
+def _copy_to_preview(db, params):
+    """Create the preview schema from the live DDL and copy both houses into it."""
+    tables = [name for name, _ in PREVIEW_TABLES]
+    placeholders = ', '.join('?' for _ in tables)
+    for row in db.execute(
+        f"SELECT type, sql FROM main.sqlite_master WHERE tbl_name IN ({placeholders}) "
+        f"AND sql IS NOT NULL AND type IN ('table', 'index') ORDER BY type DESC",
+        tables
+    ).fetchall():
+        keyword = 'CREATE TABLE ' if row['type'] == 'table' else 'CREATE INDEX '
+        db.execute(row['sql'].replace(keyword, f'{keyword}{PREVIEW_SCHEMA}.', 1))
+
+    for table, condition in PREVIEW_TABLES:
+        db.execute(
+            f'INSERT INTO {PREVIEW_SCHEMA}.{table} SELECT * FROM main.{table} WHERE {condition}',
+            params
+        )
+
+
+def execute_merge(merge_proposal_id, dry_run=False, progress=None):
+    """Merge the source house of an approved proposal into its target house.
+
+    Every step runs inside a single transaction, so the merge is applied in
+    full or not at all. ``progress``, if given, is called with each step name
+    and the number of rows it touched. With ``dry_run`` the merge runs
+    against an in-memory copy of both houses (a pending proposal may be
+    previewed too) and the live database is left untouched.
+
+    Returns the post-merge balance sheet of the target house. Raises
+    ValueError if the proposal cannot be executed.
+    """
+    db = get_db()
+    proposal = db.execute(
+        'SELECT * FROM merge_proposals WHERE id = ?', (merge_proposal_id,)
+    ).fetchone()
+    if proposal is None:
+        raise ValueError(f'Merge proposal {merge_proposal_id} not found.')
+    if proposal['merge_completion_date'] is not None:
+        raise ValueError(f'Merge proposal {merge_proposal_id} has already been executed.')
+    allowed = ('approved', 'pending') if dry_run else ('approved',)
+    if proposal['status'] not in allowed:
+        raise ValueError(
+            f"Merge proposal {merge_proposal_id} is {proposal['status']}, not approved.")
+
+    params = {
+        'proposal': merge_proposal_id,
+        'source': proposal['source_house_id'],
+        'target': proposal['target_house_id'],
+    }
+
+    if dry_run:
+        db.execute(f"ATTACH DATABASE ':memory:' AS {PREVIEW_SCHEMA}")
+        try:
+            _copy_to_preview(db, params)
+            _run_steps(db, PREVIEW_SCHEMA, params, progress)
+            sheet = get_balance_sheet(params['target'], schema=PREVIEW_SCHEMA)
+        finally:
+            db.rollback()
+            db.execute(f'DETACH DATABASE {PREVIEW_SCHEMA}')
+        sheet['dry_run'] = True
+        return sheet
+
+    with db:
+        begin_immediate(db)
+        _run_steps(db, 'main', params, progress)
+        sheet = get_balance_sheet(params['target'])
+        db.execute(
+            'UPDATE houses SET net_worth = ? WHERE id = ?',
+            (sheet['net_worth'], params['target'])
+        )
+        log_event(
+            'merge_executed', user_id=proposal['proposed_by'], house_id=params['target'],
+            target_type='merge_proposal', target_id=merge_proposal_id,
+            new_values={'source_house_id': params['source'], **sheet}
+        )
+    sheet['dry_run'] = False
+    return sheet
+
+
+__all__ = ['execute_merge', 'get_balance_sheet']
@@ -13,7 +13,9 @@ CREATE TABLE IF NOT EXISTS houses (
     rules TEXT,
     last_merge_date TIMESTAMP,
     net_worth REAL DEFAULT 0,
-    total_members INTEGER DEFAULT 0
+    total_members INTEGER DEFAULT 0,
+    veto_expiry_days INTEGER, -- Days a veto proposal may stay pending (NULL uses the app default)
+    merge_expiry_days INTEGER -- Days a merge proposal may stay pending (NULL uses the app default)
 );
 
 -- Users table - All individuals in the system
@@ -129,9 +131,9 @@ CREATE TABLE IF NOT EXISTS veto_proposals (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     resolved_at TIMESTAMP,
     votes_required INTEGER NOT NULL,
-    votes_received INTEGER DEFAULT 0,
-    votes_for INTEGER DEFAULT 0,
-    votes_against INTEGER DEFAULT 0,
+    votes_received REAL DEFAULT 0, -- Weighted counters maintained as votes are cast
+    votes_for REAL DEFAULT 0,
+    votes_against REAL DEFAULT 0,
     founder_approval_required BOOLEAN DEFAULT 1,
     founder_approved BOOLEAN DEFAULT 0,
     veto_conditions_met TEXT, -- JSON array of which 9 conditions are met
@@ -167,10 +169,10 @@ CREATE TABLE IF NOT EXISTS merge_proposals (
     terms TEXT,
     votes_required_source INTEGER DEFAULT 3,
     votes_required_target INTEGER DEFAULT 3,
-    votes_received_source INTEGER DEFAULT 0,
-    votes_received_target INTEGER DEFAULT 0,
-    votes_for_source INTEGER DEFAULT 0,
-    votes_for_target INTEGER DEFAULT 0,
+    votes_received_source REAL DEFAULT 0, -- Weighted counters maintained as votes are cast
+    votes_received_target REAL DEFAULT 0,
+    votes_for_source REAL DEFAULT 0,
+    votes_for_target REAL DEFAULT 0,
     founder_approval_source BOOLEAN DEFAULT 0,
     founder_approval_target BOOLEAN DEFAULT 0,
     merge_completion_date TIMESTAMP,
@@ -188,6 +190,7 @@ CREATE TABLE IF NOT EXISTS merge_votes (
     vote BOOLEAN NOT NULL, -- TRUE for approve, FALSE for reject
     voted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     comments TEXT,
+    weight REAL DEFAULT 1.0, -- Vote weight based on member contribution
     FOREIGN KEY (merge_proposal_id) REFERENCES merge_proposals(id) ON DELETE CASCADE,
     FOREIGN KEY (voter_id) REFERENCES users(id),
     FOREIGN KEY (voter_house_id) REFERENCES houses(id),
@@ -315,6 +318,84 @@ CREATE TABLE IF NOT EXISTS investments (
     FOREIGN KEY (portfolio_id) REFERENCES investment_portfolios(id) ON DELETE CASCADE
 );
 
+-- Coordination for background jobs shared by several app workers
+CREATE TABLE IF NOT EXISTS job_locks (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    acquired_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Recurring double-entry transactions, posted nightly by materialize-recurring-templates
+CREATE TABLE IF NOT EXISTS recurring_templates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    house_id INTEGER NOT NULL,
+    created_by INTEGER NOT NULL,
+    approved_by INTEGER, -- postings of approved templates are completed on arrival
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    currency TEXT DEFAULT 'USD',
+    frequency TEXT NOT NULL DEFAULT 'monthly' CHECK (frequency IN ('daily', 'weekly', 'monthly', 'yearly')),
+    repeat_every INTEGER NOT NULL DEFAULT 1 CHECK (repeat_every >= 1),
+    start_date DATE NOT NULL,
+    end_date DATE,
+    next_occurrence INTEGER NOT NULL DEFAULT 0, -- index of the first occurrence not yet posted
+    next_run DATE, -- its date; NULL once the template has ended
+    is_active BOOLEAN DEFAULT 1,
+    last_posted_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (house_id) REFERENCES houses(id),
+    FOREIGN KEY (created_by) REFERENCES users(id),
+    FOREIGN KEY (approved_by) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS recurring_template_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    template_id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    entry_type TEXT NOT NULL CHECK (entry_type IN ('debit', 'credit')),
+    description TEXT,
+    FOREIGN KEY (template_id) REFERENCES recurring_templates(id) ON DELETE CASCADE,
+    FOREIGN KEY (account_id) REFERENCES accounts(id)
+);
+
+-- The transaction posted for each occurrence of a template
+CREATE TABLE IF NOT EXISTS recurring_postings (
+    template_id INTEGER NOT NULL,
+    occurrence INTEGER NOT NULL,
+    transaction_id INTEGER NOT NULL,
+    PRIMARY KEY (template_id, occurrence),
+    FOREIGN KEY (template_id) REFERENCES recurring_templates(id) ON DELETE CASCADE,
+    FOREIGN KEY (transaction_id) REFERENCES transactions(id) ON DELETE CASCADE
+);
+
+-- Spending limits on a house's expense accounts, per week, month or year
+CREATE TABLE IF NOT EXISTS house_budgets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    house_id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    period TEXT NOT NULL DEFAULT 'monthly' CHECK (period IN ('weekly', 'monthly', 'yearly')),
+    amount REAL NOT NULL CHECK (amount > 0),
+    alert_threshold REAL NOT NULL DEFAULT 0.8, -- share of the amount at which the budget warns
+    created_by INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (account_id, period),
+    FOREIGN KEY (house_id) REFERENCES houses(id),
+    FOREIGN KEY (account_id) REFERENCES accounts(id),
+    FOREIGN KEY (created_by) REFERENCES users(id)
+);
+
+-- Net debits to each expense account per period, kept by the entry triggers
+CREATE TABLE IF NOT EXISTS account_spend (
+    account_id INTEGER NOT NULL,
+    period TEXT NOT NULL,
+    period_start DATE NOT NULL,
+    spent REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (account_id, period, period_start),
+    FOREIGN KEY (account_id) REFERENCES accounts(id)
+);
+
 -- Create indexes for performance optimization
 CREATE INDEX idx_houses_founder ON houses(founder_id);
 CREATE INDEX idx_house_members_house ON house_members(house_id);
@@ -327,23 +408,50 @@ CREATE INDEX idx_transaction_entries_transaction ON transaction_entries(transact
 CREATE INDEX idx_transaction_entries_account ON transaction_entries(account_id);
 CREATE INDEX idx_accounts_house ON accounts(house_id);
 CREATE INDEX idx_veto_proposals_house ON veto_proposals(house_id);
+CREATE INDEX idx_veto_proposals_status_created ON veto_proposals(status, created_at);
 CREATE INDEX idx_veto_votes_proposal ON veto_votes(proposal_id);
 CREATE INDEX idx_merge_proposals_source ON merge_proposals(source_house_id);
 CREATE INDEX idx_merge_proposals_target ON merge_proposals(target_house_id);
-CREATE INDEX idx_audit_log_house ON audit_log(house_id);
-CREATE INDEX idx_audit_log_user ON audit_log(user_id);
+CREATE INDEX idx_merge_proposals_status_created ON merge_proposals(status, created_at);
+CREATE INDEX idx_audit_log_house ON audit_log(house_id, created_at);
+CREATE INDEX idx_audit_log_user ON audit_log(user_id, created_at);
+CREATE INDEX idx_audit_log_event ON audit_log(event_type, created_at);
+CREATE INDEX idx_audit_log_target ON audit_log(target_type, target_id, created_at);
+CREATE INDEX idx_audit_log_created ON audit_log(created_at);
 CREATE INDEX idx_house_metrics_house_date ON house_metrics(house_id, metric_date);
 CREATE INDEX idx_member_metrics_user_house ON member_metrics(user_id, house_id);
+CREATE INDEX idx_recurring_templates_due ON recurring_templates(is_active, next_run);
+CREATE INDEX idx_recurring_templates_house ON recurring_templates(house_id);
+CREATE INDEX idx_recurring_template_entries_template ON recurring_template_entries(template_id);
+CREATE INDEX idx_recurring_postings_transaction ON recurring_postings(transaction_id);
+CREATE INDEX idx_house_budgets_house ON house_budgets(house_id);
 
 -- Create triggers for automatic updates
-CREATE TRIGGER update_house_member_count 
-    AFTER INSERT OR DELETE OR UPDATE ON house_members
+-- Member counts are adjusted by deltas so bulk membership changes stay O(1) per row
+CREATE TRIGGER update_house_member_count_insert
+    AFTER INSERT ON house_members
+    BEGIN
+        UPDATE houses
+        SET total_members = total_members + (NEW.status = 'active')
+        WHERE id = NEW.house_id;
+    END;
+
+CREATE TRIGGER update_house_member_count_delete
+    AFTER DELETE ON house_members
+    BEGIN
+        UPDATE houses
+        SET total_members = total_members - (OLD.status = 'active')
+        WHERE id = OLD.house_id;
+    END;
+
+CREATE TRIGGER update_house_member_count_update
+    AFTER UPDATE OF house_id, status ON house_members
     BEGIN
-        UPDATE houses 
-        SET total_members = (
-            SELECT COUNT(*) FROM house_members 
-            WHERE house_id = NEW.house_id AND status = 'active'
-        )
+        UPDATE houses
+        SET total_members = total_members - (OLD.status = 'active')
+        WHERE id = OLD.house_id;
+        UPDATE houses
+        SET total_members = total_members + (NEW.status = 'active')
         WHERE id = NEW.house_id;
     END;
 
@@ -358,6 +466,109 @@ CREATE TRIGGER update_account_balance
         WHERE id = NEW.account_id;
     END;
 
+-- Budget counters follow every entry posted to, removed from or moved between expense accounts
+CREATE TRIGGER track_account_spend_insert
+    AFTER INSERT ON transaction_entries
+    BEGIN
+        INSERT INTO account_spend (account_id, period, period_start, spent)
+        SELECT a.id, p.period,
+               CASE p.period
+                   WHEN 'weekly' THEN date(t.transaction_date, '-6 days', 'weekday 1')
+                   WHEN 'monthly' THEN date(t.transaction_date, 'start of month')
+                   ELSE date(t.transaction_date, 'start of year')
+               END,
+               CASE WHEN NEW.entry_type = 'debit' THEN NEW.amount ELSE -NEW.amount END
+        FROM accounts AS a
+        JOIN transactions AS t ON t.id = NEW.transaction_id
+        JOIN (SELECT 'weekly' AS period UNION ALL SELECT 'monthly' UNION ALL SELECT 'yearly') AS p
+        WHERE a.id = NEW.account_id AND a.account_type = 'expense'
+        ON CONFLICT (account_id, period, period_start) DO UPDATE SET spent = spent + excluded.spent;
+    END;
+
+CREATE TRIGGER track_account_spend_delete
+    AFTER DELETE ON transaction_entries
+    BEGIN
+        INSERT INTO account_spend (account_id, period, period_start, spent)
+        SELECT a.id, p.period,
+               CASE p.period
+                   WHEN 'weekly' THEN date(t.transaction_date, '-6 days', 'weekday 1')
+                   WHEN 'monthly' THEN date(t.transaction_date, 'start of month')
+                   ELSE date(t.transaction_date, 'start of year')
+               END,
+               -CASE WHEN OLD.entry_type = 'debit' THEN OLD.amount ELSE -OLD.amount END
+        FROM accounts AS a
+        JOIN transactions AS t ON t.id = OLD.transaction_id
+        JOIN (SELECT 'weekly' AS period UNION ALL SELECT 'monthly' UNION ALL SELECT 'yearly') AS p
+        WHERE a.id = OLD.account_id AND a.account_type = 'expense'
+        ON CONFLICT (account_id, period, period_start) DO UPDATE SET spent = spent + excluded.spent;
+    END;
+
+CREATE TRIGGER track_account_spend_update
+    AFTER UPDATE OF account_id, amount, entry_type ON transaction_entries
+    BEGIN
+        INSERT INTO account_spend (account_id, period, period_start, spent)
+        SELECT a.id, p.period,
+               CASE p.period
+                   WHEN 'weekly' THEN date(t.transaction_date, '-6 days', 'weekday 1')
+                   WHEN 'monthly' THEN date(t.transaction_date, 'start of month')
+                   ELSE date(t.transaction_date, 'start of year')
+               END,
+               -CASE WHEN OLD.entry_type = 'debit' THEN OLD.amount ELSE -OLD.amount END
+        FROM accounts AS a
+        JOIN transactions AS t ON t.id = OLD.transaction_id
+        JOIN (SELECT 'weekly' AS period UNION ALL SELECT 'monthly' UNION ALL SELECT 'yearly') AS p
+        WHERE a.id = OLD.account_id AND a.account_type = 'expense'
+        ON CONFLICT (account_id, period, period_start) DO UPDATE SET spent = spent + excluded.spent;
+        INSERT INTO account_spend (account_id, period, period_start, spent)
+        SELECT a.id, p.period,
+               CASE p.period
+                   WHEN 'weekly' THEN date(t.transaction_date, '-6 days', 'weekday 1')
+                   WHEN 'monthly' THEN date(t.transaction_date, 'start of month')
+                   ELSE date(t.transaction_date, 'start of year')
+               END,
+               CASE WHEN NEW.entry_type = 'debit' THEN NEW.amount ELSE -NEW.amount END
+        FROM accounts AS a
+        JOIN transactions AS t ON t.id = NEW.transaction_id
+        JOIN (SELECT 'weekly' AS period UNION ALL SELECT 'monthly' UNION ALL SELECT 'yearly') AS p
+        WHERE a.id = NEW.account_id AND a.account_type = 'expense'
+        ON CONFLICT (account_id, period, period_start) DO UPDATE SET spent = spent + excluded.spent;
+    END;
+
+-- Redating a transaction moves its expense entries to the periods of the new date
+CREATE TRIGGER track_account_spend_redate
+    AFTER UPDATE OF transaction_date ON transactions
+    WHEN OLD.transaction_date IS NOT NEW.transaction_date
+    BEGIN
+        INSERT INTO account_spend (account_id, period, period_start, spent)
+        SELECT a.id, p.period,
+               CASE p.period
+                   WHEN 'weekly' THEN date(OLD.transaction_date, '-6 days', 'weekday 1')
+                   WHEN 'monthly' THEN date(OLD.transaction_date, 'start of month')
+                   ELSE date(OLD.transaction_date, 'start of year')
+               END,
+               -SUM(CASE WHEN e.entry_type = 'debit' THEN e.amount ELSE -e.amount END)
+        FROM transaction_entries AS e
+        JOIN accounts AS a ON a.id = e.account_id
+        JOIN (SELECT 'weekly' AS period UNION ALL SELECT 'monthly' UNION ALL SELECT 'yearly') AS p
+        WHERE e.transaction_id = NEW.id AND a.account_type = 'expense'
+        GROUP BY 1, 2, 3
+        ON CONFLICT (account_id, period, period_start) DO UPDATE SET spent = spent + excluded.spent;
+        INSERT INTO account_spend (account_id, period, period_start, spent)
+        SELECT a.id, p.period,
+               CASE p.period
+                   WHEN 'weekly' THEN date(NEW.transaction_date, '-6 days', 'weekday 1')
+                   WHEN 'monthly' THEN date(NEW.transaction_date, 'start of month')
+                   ELSE date(NEW.transaction_date, 'start of year')
+               END,
+               SUM(CASE WHEN e.entry_type = 'debit' THEN e.amount ELSE -e.amount END)
+        FROM transaction_entries AS e
+        JOIN accounts AS a ON a.id = e.account_id
+        JOIN (SELECT 'weekly' AS period UNION ALL SELECT 'monthly' UNION ALL SELECT 'yearly') AS p
+        WHERE e.transaction_id = NEW.id AND a.account_type = 'expense'
+        GROUP BY 1, 2, 3
+        ON CONFLICT (account_id, period, period_start) DO UPDATE SET spent = spent + excluded.spent;
+    END;
+
 CREATE TRIGGER update_asset_last_updated
     AFTER UPDATE ON assets
     BEGIN
@@ -0,0 +1,22 @@
+"""Gunicorn settings, read automatically from the working directory.
+
+GUNICORN_PRELOAD=1 loads the app once in the master and forks workers from
+it, so boots after the first are nearly free and workers share memory
+pages. ``app.utils.startup`` resets connection pools and the log thread in
+each forked worker.
+
+Each open event stream (``/api/v1/events``) holds a worker thread, so run
+with GUNICORN_WORKER_CLASS=gthread and enough GUNICORN_THREADS, or with
+gevent, when dashboards subscribe to it.
+"""
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0').lower() in ('1', 'true', 'yes')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+
+
+def when_ready(server):
+    if preload_app:
+        from app.utils.startup import warm_up
+        warm_up(server.app.wsgi())
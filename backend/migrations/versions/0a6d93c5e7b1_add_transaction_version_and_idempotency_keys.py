@@ -0,0 +1,40 @@
+"""Add transactions version and idempotency_keys
+
+Revision ID: 0a6d93c5e7b1
+Revises: f81c4b6d2e07
+Create Date: 2026-10-19 18:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6d93c5e7b1'
+down_revision = 'f81c4b6d2e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    op.create_table('idempotency_keys',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('response', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_id_key')
+    )
+    op.create_index(op.f('ix_idempotency_keys_created_at'), 'idempotency_keys', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_idempotency_keys_created_at'), table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,72 @@
+"""Add budgets and category_spend
+
+Revision ID: 9b4e1c7d3f26
+Revises: 5d2f8b7c1a93
+Create Date: 2026-10-19 22:10:00.000000
+
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4e1c7d3f26'
+down_revision = '5d2f8b7c1a93'
+branch_labels = None
+depends_on = None
+
+
+def _period_starts(day):
+    day = day.date() if hasattr(day, 'date') else day
+    return {'weekly': day - timedelta(days=day.weekday()),
+            'monthly': day.replace(day=1),
+            'yearly': day.replace(month=1, day=1)}
+
+
+def upgrade():
+    op.create_table('budgets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('period', sa.String(length=10), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('alert_threshold', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'category', 'period', name='uq_budgets_user_id_category_period')
+    )
+    category_spend = op.create_table('category_spend',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('period', sa.String(length=10), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('spent', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'category', 'period', 'period_start')
+    )
+
+    # Count the existing expenses into the counters.
+    spent = defaultdict(float)
+    transactions = sa.table('transactions', sa.column('user_id'), sa.column('category'),
+                            sa.column('date', sa.DateTime()), sa.column('amount'))
+    rows = op.get_bind().execute(
+        sa.select(transactions.c.user_id, transactions.c.category, transactions.c.date,
+                  transactions.c.amount).where(transactions.c.amount < 0))
+    for user_id, category, day, amount in rows:
+        for period, start in _period_starts(day).items():
+            spent[(user_id, category, period, start)] -= amount
+    if spent:
+        op.bulk_insert(category_spend, [
+            {'user_id': user_id, 'category': category, 'period': period,
+             'period_start': start, 'spent': total}
+            for (user_id, category, period, start), total in spent.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('category_spend')
+    op.drop_table('budgets')
@@ -0,0 +1,28 @@
+"""Add users ledger_version and ledger_updated_at
+
+Revision ID: e3b7d2a9c418
+Revises: c5a9e1f0b2d4
+Create Date: 2026-10-19 15:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7d2a9c418'
+down_revision = 'c5a9e1f0b2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ledger_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('ledger_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('ledger_updated_at')
+        batch_op.drop_column('ledger_version')
@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+# Logs, metrics and compiled templates of test runs stay out of the tree.
+_scratch = tempfile.mkdtemp(prefix='ledger-tests-')
+for name in ('LOG_DIR', 'METRICS_DIR', 'JINJA_BYTECODE_CACHE_DIR'):
+    os.environ.setdefault(name, os.path.join(_scratch, name.lower()))
+os.environ.setdefault('CACHE_SQLITE_PATH', os.path.join(_scratch, 'cache.db'))
+
+import pytest
+
+import config
+from app import create_app, db
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # A file database, so that tests can open a second connection to it.
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI',
+                        f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_user(app):
+    from app.models.user import User
+
+    def make_user(username='alice'):
+        with app.app_context():
+            user = User(username=username, email=f'{username}@example.com')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def login(app):
+    def login(user_id, client=None):
+        client = client or app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        return client
+    return login
+
+
+@pytest.fixture
+def client(make_user, login):
+    return login(make_user())
@@ -0,0 +1,107 @@
+from datetime import date
+
+from sqlalchemy import event, func, select
+
+from app import db
+from app.models.budget import CategorySpend
+from app.models.ledger_change import LedgerChange
+from app.models.transaction import Transaction
+
+
+def _items(count, amount=-1):
+    return [{'amount': amount, 'category': 'Shopping', 'date': '2026-10-01T00:00:00',
+             'description': f'item {index}'} for index in range(count)]
+
+
+def test_create_returns_rows_in_item_order(client):
+    response = client.post('/api/v1/transactions', json=_items(25))
+    assert response.status_code == 201
+    created = response.get_json()['transactions']
+    assert [row['description'] for row in created] == [f'item {i}' for i in range(25)]
+    assert len({row['id'] for row in created}) == 25
+    assert all(row['version'] == 1 for row in created)
+
+
+def test_create_ignores_rows_inserted_concurrently(app, client):
+    with app.app_context():
+        other = db.engine.connect()
+        transactions = Transaction.__table__
+
+        pending = [True]
+
+        # Another connection writes a row for the same user just before the batch.
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def insert_first(conn, cursor, statement, parameters, context, executemany):
+            if pending and conn is not other and statement.startswith('INSERT INTO transactions'):
+                pending.clear()
+                with other.begin():
+                    other.execute(transactions.insert().values(
+                        user_id=1, amount=-1000, category='Shopping', version=1,
+                        date=date(2026, 10, 1), description='concurrent'))
+
+        response = client.post('/api/v1/transactions', json=_items(5))
+        event.remove(db.engine, 'before_cursor_execute', insert_first)
+        other.close()
+
+    created = response.get_json()['transactions']
+    assert [row['description'] for row in created] == [f'item {i}' for i in range(5)]
+    with app.app_context():
+        logged = db.session.execute(select(func.count()).select_from(LedgerChange)).scalar()
+        assert logged == 5
+        spend = db.session.get(CategorySpend, (1, 'Shopping', 'monthly', date(2026, 10, 1)))
+        assert spend.spent == 5
+
+
+def test_update_applies_items_and_aggregates(app, client):
+    ids = [row['id'] for row in
+           client.post('/api/v1/transactions', json=_items(3)).get_json()['transactions']]
+    response = client.patch('/api/v1/transactions', json=[
+        {'id': ids[0], 'amount': -10},
+        {'id': ids[1], 'category': 'Travel'},
+        {'id': ids[0], 'description': 'edited'},
+    ])
+    assert response.status_code == 200
+    updated = {row['id']: row for row in response.get_json()['transactions']}
+    assert list(updated) == ids[:2]
+    assert (updated[ids[0]]['amount'], updated[ids[0]]['description']) == (-10, 'edited')
+    assert updated[ids[1]]['category'] == 'Travel'
+    assert all(row['version'] == 2 for row in updated.values())
+    with app.app_context():
+        spend = db.session.get(CategorySpend, (1, 'Shopping', 'monthly', date(2026, 10, 1)))
+        assert spend.spent == 11
+
+
+def test_update_of_unknown_ids_changes_nothing(app, client):
+    ids = [row['id'] for row in
+           client.post('/api/v1/transactions', json=_items(1)).get_json()['transactions']]
+    response = client.patch('/api/v1/transactions',
+                            json=[{'id': ids[0], 'amount': -5}, {'id': 999, 'amount': -5}])
+    assert response.status_code == 404
+    assert response.get_json()['ids'] == [999]
+    with app.app_context():
+        assert db.session.get(Transaction, ids[0]).amount == -1
+
+
+def test_bulk_requests_cost_a_fixed_number_of_statements(app, client):
+    def statements(send):
+        count = [0]
+
+        def counter(*args):
+            count[0] += 1
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', counter)
+        try:
+            send()
+        finally:
+            with app.app_context():
+                event.remove(db.engine, 'before_cursor_execute', counter)
+        return count[0]
+
+    small = [row['id'] for row in
+             client.post('/api/v1/transactions', json=_items(5)).get_json()['transactions']]
+    large = [row['id'] for row in
+             client.post('/api/v1/transactions', json=_items(50)).get_json()['transactions']]
+    assert (statements(lambda: client.patch('/api/v1/transactions',
+                                            json=[{'id': id_, 'amount': -2} for id_ in small]))
+            == statements(lambda: client.patch('/api/v1/transactions',
+                                               json=[{'id': id_, 'amount': -2} for id_ in large])))
@@ -0,0 +1,47 @@
+import logging
+import sqlite3
+
+import pytest
+
+from app.utils.cache_backend import SQLiteCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLiteCache(str(tmp_path / 'cache.db'), busy_timeout=0.05,
+                       logger=logging.getLogger('tests.cache'))
+
+
+def test_values_round_trip(cache):
+    assert cache.get('key') is None
+    assert cache.set('key', {'a': 1})
+    assert cache.get('key') == {'a': 1}
+    assert not cache.add('key', 'other')
+    assert cache.delete('key')
+    assert not cache.has('key')
+
+
+def test_locked_database_is_a_failed_write(cache, caplog):
+    cache.set('key', 'old')
+    other = sqlite3.connect(cache.path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    try:
+        with caplog.at_level(logging.WARNING, logger='tests.cache'):
+            assert cache.set('key', 'new') is False
+            assert cache.add('other', 'new') is False
+    finally:
+        other.execute('ROLLBACK')
+        other.close()
+    assert 'Cache set' in caplog.text
+    assert cache.get('key') == 'old'
+
+
+def test_broken_connection_is_a_miss(cache, caplog):
+    cache.set('key', 'value')
+    cache._db.close()
+    with caplog.at_level(logging.WARNING, logger='tests.cache'):
+        assert cache.get('key') is None
+        assert cache.has('key') is False
+        assert cache.delete('key') is False
+        assert cache.get_or_set('key', lambda: 'computed') == 'computed'
+    assert 'Cache get' in caplog.text
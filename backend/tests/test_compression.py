@@ -0,0 +1,55 @@
+import gzip
+
+from flask import jsonify, make_response, session
+
+
+def _page_routes(app):
+    @app.route('/_test/page')
+    def page():
+        response = make_response(f'<p>{session["token"]}</p>' + ' ' * 4096)
+        response.set_etag('page')
+        return response
+
+    @app.route('/_test/report')
+    def report():
+        response = jsonify(rows=['row'] * 1000)
+        response.set_etag('report')
+        return response
+
+
+def _client(app, token):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['token'] = token
+    return client
+
+
+def test_html_bodies_are_not_shared_between_sessions(app):
+    _page_routes(app)
+    for token in ('first', 'second'):
+        response = _client(app, token).get('/_test/page', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data).startswith(f'<p>{token}</p>'.encode())
+
+    with app.app_context():
+        assert app.extensions['compressor'].cache.get('compressed/gzip/page') is None
+
+
+def test_json_bodies_are_cached_by_etag(app):
+    _page_routes(app)
+    client = _client(app, 'first')
+    response = client.get('/_test/report', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == '"report-gzip"'
+
+    with app.app_context():
+        cached = app.extensions['compressor'].cache.get('compressed/gzip/report')
+    assert cached == response.data
+    assert client.get('/_test/report', headers={'Accept-Encoding': 'gzip'}).data == cached
+
+
+def test_encoded_etag_still_matches(client):
+    response = client.get('/api/v1/transactions', headers={'Accept-Encoding': 'gzip'})
+    response = client.get('/api/v1/transactions', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
@@ -0,0 +1,52 @@
+from werkzeug.http import http_date
+
+
+def test_matching_etag_is_answered_with_304(client):
+    response = client.get('/api/v1/transactions')
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert not weak
+
+    response = client.get('/api/v1/transactions', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+
+
+def test_write_changes_the_etag(client):
+    etag = client.get('/api/v1/transactions').headers['ETag']
+    response = client.post('/api/v1/transactions', json=[
+        {'amount': -5, 'category': 'Shopping', 'date': '2026-10-01T00:00:00'}])
+    assert response.status_code == 201
+
+    response = client.get('/api/v1/transactions', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_html_pages_get_a_weak_etag(client):
+    response = client.get('/dashboard')
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert weak
+
+    response = client.get('/dashboard', headers={'If-None-Match': f'W/"{etag}"'})
+    assert response.status_code == 304
+
+
+def test_if_modified_since_is_not_trusted(client):
+    response = client.get('/api/v1/transactions')
+    assert 'Last-Modified' not in response.headers
+
+    with client.session_transaction() as session:
+        session['currency'] = 'EUR'
+    response = client.get('/api/v1/transactions',
+                          headers={'If-Modified-Since': http_date(2**33)})
+    assert response.status_code == 200
+
+
+def test_other_currency_does_not_match(client):
+    etag = client.get('/api/v1/transactions').headers['ETag']
+    with client.session_transaction() as session:
+        session['currency'] = 'EUR'
+
+    response = client.get('/api/v1/transactions', headers={'If-None-Match': etag})
+    assert response.status_code == 200
@@ -0,0 +1,62 @@
+from app.utils.events import Subscription, get_hub, stream
+
+
+class _Hub:
+    def unsubscribe(self, subscription):
+        self.closed = subscription
+
+
+def test_slow_subscriber_gets_a_resync():
+    hub = _Hub()
+    subscription = Subscription(hub, ['user:1'], maxlen=2)
+    for index in range(5):
+        subscription.put({'event': 'ledger', 'id': f'ledger-{index}', 'data': {}})
+
+    events = stream(subscription, heartbeat=0, max_seconds=60)
+    assert next(events) == 'retry: 3000\n\n'
+    assert next(events) == 'event: resync\ndata: {"dropped": 3}\n\n'
+    assert next(events).startswith('id: ledger-3\nevent: ledger\n')
+    assert next(events).startswith('id: ledger-4\n')
+    assert next(events) == ': heartbeat\n\n'
+    events.close()
+    assert hub.closed is subscription
+
+
+def test_poll_publishes_ledger_changes_to_their_user(app, client, make_user, monkeypatch):
+    hub = get_hub(app)
+    # Polled by hand instead of by the hub's thread.
+    monkeypatch.setattr(hub, '_ensure_poller', lambda: None)
+    mine = hub.subscribe(['user:1'])
+    theirs = hub.subscribe([f'user:{make_user("bob")}'])
+    with app.app_context():
+        hub.poll()
+
+    response = client.post('/api/v1/transactions', json=[
+        {'amount': -5, 'category': 'Shopping', 'date': '2026-10-01T00:00:00'}])
+    created = response.get_json()['transactions'][0]
+    with app.app_context():
+        hub.poll()
+
+    events, dropped = mine.get(timeout=0)
+    assert dropped == 0
+    assert [event['data'] for event in events] == [
+        {'transaction_id': created['id'], 'operation': 'upsert', 'version': 1}]
+    assert theirs.get(timeout=0) == ([], 0)
+    mine.close()
+    theirs.close()
+
+
+def test_stream_is_not_compressed(app, client, monkeypatch):
+    app.config['EVENTS_MAX_STREAM_SECONDS'] = 0
+    monkeypatch.setattr(get_hub(app), '_ensure_poller', lambda: None)
+    response = client.get('/api/v1/events', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data(as_text=True) == 'retry: 3000\n\n'
+
+
+def test_other_houses_are_forbidden(client):
+    response = client.get('/api/v1/events?house=7')
+    assert response.status_code == 403
+    assert response.get_json()['houses'] == [7]
@@ -0,0 +1,42 @@
+import os
+import sqlite3
+
+import pytest
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gcd_schema.sql')
+
+
+@pytest.fixture
+def gcd():
+    db = sqlite3.connect(':memory:')
+    with open(SCHEMA) as schema:
+        db.executescript(schema.read())
+    db.execute('''INSERT INTO accounts (id, name, account_type, house_id)
+                  VALUES (1, 'Food', 'expense', 1), (2, 'Cash', 'asset', 1), (3, 'Rent', 'expense', 1)''')
+    db.execute('''INSERT INTO transactions (id, transaction_date, description, amount, created_by, house_id)
+                  VALUES (1, '2026-09-30 10:00:00', 'groceries and rent', 50, 1, 1)''')
+    db.executemany('''INSERT INTO transaction_entries (transaction_id, account_id, amount, entry_type)
+                      VALUES (1, ?, ?, ?)''', [(1, 30, 'debit'), (3, 20, 'debit'), (2, 50, 'credit')])
+    yield db
+    db.close()
+
+
+def _spend(db):
+    return {row[:3]: row[3] for row in db.execute('SELECT * FROM account_spend WHERE spent != 0')}
+
+
+def test_redated_transaction_moves_its_spend(gcd):
+    assert _spend(gcd)[(1, 'monthly', '2026-09-01')] == 30
+
+    gcd.execute("UPDATE transactions SET transaction_date = '2026-10-02' WHERE id = 1")
+    assert _spend(gcd) == {
+        (1, 'weekly', '2026-09-28'): 30, (1, 'monthly', '2026-10-01'): 30,
+        (1, 'yearly', '2026-01-01'): 30, (3, 'weekly', '2026-09-28'): 20,
+        (3, 'monthly', '2026-10-01'): 20, (3, 'yearly', '2026-01-01'): 20,
+    }
+
+
+def test_other_updates_leave_the_spend(gcd):
+    before = _spend(gcd)
+    gcd.execute("UPDATE transactions SET description = 'shopping' WHERE id = 1")
+    assert _spend(gcd) == before
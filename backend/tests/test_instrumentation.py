@@ -0,0 +1,14 @@
+import config
+
+
+def test_server_timing_is_off_in_production():
+    assert config.Config.PERF_SERVER_TIMING
+    assert not config.ProductionConfig.PERF_SERVER_TIMING
+    assert not config.PythonAnywhereConfig.PERF_SERVER_TIMING
+
+
+def test_server_timing_follows_the_setting(app, client):
+    assert client.get('/api/v1/transactions').headers['Server-Timing'].startswith('db;dur=')
+
+    app.config['PERF_SERVER_TIMING'] = False
+    assert 'Server-Timing' not in client.get('/api/v1/transactions').headers
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app import db
+from app.models.ledger_change import LedgerChange, compact_changes
+from app.models.user import User
+
+
+def _create(client, count):
+    response = client.post('/api/v1/transactions', json=[
+        {'amount': -1, 'category': 'Shopping', 'date': '2026-10-01T00:00:00'}] * count)
+    return [row['id'] for row in response.get_json()['transactions']]
+
+
+def test_compaction_keeps_the_latest_change_of_each_row(app, client, monkeypatch):
+    ids = _create(client, 3)
+    for amount in (-2, -3, -4):
+        client.patch('/api/v1/transactions', json=[{'id': id_, 'amount': amount} for id_ in ids])
+
+    with app.app_context():
+        commits = []
+        commit = db.session.commit
+        monkeypatch.setattr(db.session, 'commit', lambda: commits.append(1) or commit())
+        assert compact_changes(retention_days=30, batch_size=4) == (9, 0)
+        # Three batches of superseded changes, then the expired tombstones.
+        assert len(commits) == 4
+        latest = LedgerChange.query.order_by(LedgerChange.transaction_id).all()
+    assert [(change.transaction_id, change.version) for change in latest] == [
+        (id_, 4) for id_ in ids]
+
+
+def test_expired_tombstones_raise_the_floor(app, client):
+    ids = _create(client, 2)
+    client.delete('/api/v1/transactions', json={'ids': ids[:1]})
+
+    with app.app_context():
+        db.session.execute(update(LedgerChange.__table__)
+                           .values(changed_at=datetime.utcnow() - timedelta(days=60)))
+        db.session.commit()
+        assert compact_changes(retention_days=30) == (1, 1)
+        assert db.session.get(User, 1).ledger_floor_version == 2
+        assert [change.transaction_id for change in LedgerChange.query] == ids[1:]
@@ -0,0 +1,44 @@
+from app import db
+from app.models.user import User
+from app.utils.metrics import get_metrics
+
+
+def test_production_refuses_metrics_without_a_token(app, make_user, login):
+    app.config['METRICS_REQUIRE_TOKEN'] = True
+    assert app.test_client().get('/api/v1/metrics').status_code == 403
+    assert login(make_user()).get('/api/v1/metrics').status_code == 403
+
+    admin = make_user('root')
+    with app.app_context():
+        db.session.get(User, admin).is_admin = True
+        db.session.commit()
+    assert login(admin).get('/api/v1/metrics').status_code == 200
+
+
+def test_metrics_token_is_checked(app):
+    app.config['METRICS_TOKEN'] = 'secret'
+    client = app.test_client()
+    assert client.get('/api/v1/metrics.json').status_code == 401
+    response = client.get('/api/v1/metrics.json', headers={'Authorization': 'Bearer wrong'})
+    assert response.status_code == 401
+    response = client.get('/api/v1/metrics.json', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+
+
+def test_queue_depth_covers_events_and_recurring(app, client, monkeypatch):
+    hub = app.extensions['event_hub']
+    monkeypatch.setattr(hub, '_ensure_poller', lambda: None)
+    subscription = hub.subscribe(['user:1'])
+    subscription.put({'event': 'ledger', 'id': 'ledger-1', 'data': {}})
+    response = client.post('/api/v1/recurring', json={
+        'amount': -20, 'category': 'Shopping', 'start_date': '2026-01-01'})
+    assert response.status_code == 201
+
+    with app.app_context():
+        get_metrics().flush(force=True)
+    body = client.get('/api/v1/metrics').get_data(as_text=True)
+    depths = {line.split('queue="')[1].split('"')[0]: float(line.rsplit(' ', 1)[1])
+              for line in body.splitlines() if line.startswith('background_queue_depth{')}
+    assert depths['events'] == 1
+    assert depths['recurring'] == 1
+    subscription.close()
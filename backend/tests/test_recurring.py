@@ -0,0 +1,45 @@
+from datetime import date
+
+from app.models.recurring_transaction import materialize_due
+
+
+def _schedule(client, **values):
+    response = client.post('/api/v1/recurring', json={
+        'amount': -20, 'category': 'Shopping', 'start_date': '2026-09-01', **values})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def _patch(client, schedule, **values):
+    response = client.patch(f"/api/v1/recurring/{schedule['id']}", json=values)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_moving_the_end_revives_an_ended_schedule(app, client):
+    schedule = _schedule(client, end_date='2026-09-15')
+    with app.app_context():
+        assert materialize_due(today=date(2026, 10, 19)) == (1, 1)
+    assert client.get('/api/v1/recurring').get_json()['recurring'][0]['is_active'] is False
+
+    schedule = _patch(client, schedule, end_date='2026-12-31')
+    assert schedule['is_active'] is True
+    assert schedule['next_run'] == '2026-10-01'
+
+    schedule = _patch(client, schedule, end_date='2026-09-30')
+    assert schedule['is_active'] is False
+    assert schedule['next_run'] is None
+
+
+def test_moving_the_end_does_not_resume_a_paused_schedule(client):
+    schedule = _patch(client, _schedule(client), is_active=False)
+    schedule = _patch(client, schedule, end_date='2027-12-31')
+    assert schedule['is_active'] is False
+    assert schedule['next_run'] == '2026-09-01'
+
+
+def test_explicit_is_active_wins(client):
+    schedule = _schedule(client, end_date='2026-12-31')
+    schedule = _patch(client, schedule, end_date='2026-08-31', is_active=True)
+    assert schedule['is_active'] is True
+    assert schedule['next_run'] is None
@@ -0,0 +1,43 @@
+def _create(key, **extra):
+    return {'key': key, 'op': 'create', **extra,
+            'data': {'amount': -5, 'category': 'Shopping', 'date': '2026-10-01T00:00:00'}}
+
+
+def _upload(client, *operations, **options):
+    response = client.post('/api/v1/sync', json={'operations': list(operations), **options})
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+def test_later_operations_use_the_ref_of_a_create(client):
+    results = _upload(client, _create('a', ref='new'),
+                      {'key': 'b', 'op': 'update', 'ref': 'new', 'data': {'description': 'lunch'}})
+    assert [result['status'] for result in results] == ['created', 'updated']
+    assert results[1]['transaction']['description'] == 'lunch'
+
+
+def test_unhashable_refs_are_invalid(client):
+    results = _upload(client, _create('a', ref=['new']),
+                      {'key': 'b', 'op': 'delete', 'ref': {'id': 1}},
+                      _create('c', ref=True))
+    assert [result['status'] for result in results] == ['invalid'] * 3
+    assert results[0]['error'] == 'ref must be a string or an integer'
+    assert client.get('/api/v1/transactions').get_json()['transactions'] == []
+
+
+def test_resent_batch_is_replayed(client):
+    first = _upload(client, _create('a'))
+    again = _upload(client, _create('a'))
+    assert again[0]['replayed']
+    assert again[0]['transaction']['id'] == first[0]['transaction']['id']
+
+
+def test_stale_base_version_conflicts(client):
+    created = _upload(client, _create('a'))[0]['transaction']
+    _upload(client, {'key': 'b', 'op': 'update', 'id': created['id'], 'data': {'amount': -6}})
+
+    update = {'key': 'c', 'op': 'update', 'id': created['id'],
+              'base_version': created['version'], 'data': {'amount': -7}}
+    assert _upload(client, update)[0]['status'] == 'conflict'
+    update['key'] = 'd'
+    assert _upload(client, update, on_conflict='overwrite')[0]['status'] == 'updated'
@@ -1,5 +1,6 @@
 from flask import Flask, render_template
 import os
+import click
 from pathlib import Path
 from .extensions import db, login_manager, mail, migrate, csrf, limiter, cache, babel
 
@@ -28,10 +29,43 @@ def create_app(config_name='default'):
     init_logger(app)
     app.logger.info(f'Starting application with {config_name} config.')
 
+    # Per-request timings, Server-Timing headers and query budgets
+    from .utils.instrumentation import init_app as init_instrumentation
+    init_instrumentation(app)
+
+    # Metrics registry shared by all workers through METRICS_DIR
+    from .utils.metrics import init_app as init_metrics
+    init_metrics(app)
+
+    # Read-only connection pool for concurrent dashboard queries
+    from .utils.read_pool import init_app as init_read_pool
+    init_read_pool(app)
+
+    # Pub/sub hub behind the Server-Sent Events stream
+    from .utils.events import init_app as init_events
+    init_events(app)
+
+    # Due recurring schedules, reported with the background queues
+    from .models.recurring_transaction import DueSchedules
+    app.extensions.setdefault('background_queues', {})['recurring'] = DueSchedules(app)
+
+    # Babel-backed formatting filters (currency, date, number, ...)
+    from .utils.context_processors import register_template_filters
+    register_template_filters(app)
+
+    # Shared Jinja bytecode cache and the {% fragment %} row cache
+    from .utils.templating import init_app as init_templating
+    init_templating(app)
+
+    # gzip, Brotli or zstd response compression with cached encoded bodies
+    from .utils.compression import init_app as init_compression
+    init_compression(app)
+
     # Register blueprints
     from .routes.main import main_bp
     from .routes.auth import auth_bp
     from .routes.transactions import transactions_bp
+    from .routes.budgets import budgets_bp
     from .routes.api import api_bp
     from .routes.admin import admin_bp
     from .routes.errors import errors_bp
@@ -39,6 +73,7 @@ def create_app(config_name='default'):
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(transactions_bp, url_prefix='/transactions')
+    app.register_blueprint(budgets_bp, url_prefix='/budgets')
     app.register_blueprint(api_bp, url_prefix='/api/v1')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(errors_bp)
@@ -62,4 +97,50 @@ def create_app(config_name='default'):
         from .models.transaction import Transaction
         return {'db': db, 'User': User, 'Transaction': Transaction}
 
+    @app.cli.command('compact-ledger-changes')
+    @click.option('--retention-days', type=int, default=None,
+                  help='Days to keep tombstones (default LEDGER_CHANGES_RETENTION_DAYS).')
+    def compact_ledger_changes_command(retention_days):
+        """Drop superseded sync changes and expired tombstones."""
+        from .models.ledger_change import compact_changes
+        if retention_days is None:
+            retention_days = app.config.get('LEDGER_CHANGES_RETENTION_DAYS', 90)
+        superseded, expired = compact_changes(retention_days)
+        click.echo(f'Removed {superseded} superseded changes and {expired} expired tombstones.')
+
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys_command():
+        """Forget upload operation keys older than IDEMPOTENCY_KEY_TTL_HOURS."""
+        from .models.idempotency_key import IdempotencyKey
+        deleted = IdempotencyKey.purge(app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', 72))
+        click.echo(f'Removed {deleted} idempotency keys.')
+
+    @app.cli.command('rebuild-budget-spend')
+    def rebuild_budget_spend_command():
+        """Recompute the category spend counters behind budgets from the transactions."""
+        from .models.budget import rebuild_spend
+        click.echo(f'Rebuilt {rebuild_spend()} category spend counters.')
+
+    @app.cli.command('rebuild-category-sketches')
+    def rebuild_category_sketches_command():
+        """Recompute the category analytics sketches from the transactions."""
+        from .models.category_sketch import rebuild_sketches
+        click.echo(f'Rebuilt {rebuild_sketches()} category sketches.')
+
+    @app.cli.command('materialize-recurring')
+    @click.option('--date', 'today', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Post occurrences due by this date (default today, UTC).')
+    def materialize_recurring_command(today):
+        """Post every due occurrence of recurring transactions; run nightly."""
+        from .models.recurring_transaction import materialize_due
+        schedules, postings = materialize_due(
+            today.date() if today else None,
+            batch_size=app.config.get('RECURRING_BATCH_SIZE', 500),
+            max_catch_up=app.config.get('RECURRING_MAX_CATCH_UP', 366))
+        click.echo(f'Posted {postings} transactions from {schedules} recurring schedules.')
+
+    # Fork safety for workers forked from a preloaded app
+    from .utils.startup import init_app as init_startup
+    init_startup(app)
+
     return app
@@ -1,22 +1,66 @@
+import importlib
+import threading
+
+import click
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_mail import Mail
-from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 from flask_caching import Cache
-from flask_babel import Babel
+
+class LazyExtension:
+    """Stand-in for an extension that is imported and set up on first use.
+
+    ``init_app`` only records the app. The first attribute access imports
+    the extension, creates it and initialises every recorded app with it;
+    from then on the stand-in forwards to the real object.
+    """
+
+    def __init__(self, module, name):
+        self._module = module
+        self._name = name
+        self._extension = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app, *args, **kwargs):
+        with self._lock:
+            if self._extension is None:
+                self._pending.append((app, args, kwargs))
+                return
+        self._extension.init_app(app, *args, **kwargs)
+
+    def resolve(self):
+        with self._lock:
+            if self._extension is None:
+                extension = getattr(importlib.import_module(self._module), self._name)()
+                for app, args, kwargs in self._pending:
+                    extension.init_app(app, *args, **kwargs)
+                self._pending = []
+                self._extension = extension
+        return self._extension
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+
+def _running_cli():
+    # The flask command creates the app inside a click context; gunicorn does not.
+    return click.get_current_context(silent=True) is not None
 
 # Initialize extensions for Flask 3.0 compatibility
 db = SQLAlchemy()
 login_manager = LoginManager()
-migrate = Migrate()
+mail = LazyExtension('flask_mail', 'Mail')
+migrate = LazyExtension('flask_migrate', 'Migrate')
 csrf = CSRFProtect()
-babel = Babel()
+cache = Cache()
+babel = LazyExtension('flask_babel', 'Babel')
 
 # Make flask_limiter optional
 try:
     from flask_limiter import Limiter
     from flask_limiter.util import get_remote_address
+    from .utils import ratelimit_storage  # noqa: F401 - registers the sqlite:// limiter storage
     limiter = Limiter(key_func=get_remote_address, default_limits=["200 per day", "50 per hour"])
 except ImportError:
     # Create a dummy limiter if flask_limiter is not available
@@ -31,6 +75,9 @@ except ImportError:
             def decorator(f):
                 return f
             return decorator
+
+        def exempt(self, f):
+            return f
     
     limiter = DummyLimiter()
 
@@ -38,6 +85,19 @@ def init_extensions(app):
     """Initialize all extensions with the Flask app."""
     db.init_app(app)
     login_manager.init_app(app)
+    mail.init_app(app)
     migrate.init_app(app, db)
     csrf.init_app(app)
+    limiter.init_app(app)
+    cache.init_app(app)
     babel.init_app(app)
+
+    # Mail, Migrate (Alembic) and Babel are not used while serving requests,
+    # so LAZY_EXTENSIONS keeps their imports off the worker boot path.
+    # The flask CLI always loads Migrate for the "flask db" commands.
+    lazy = set(app.config.get('LAZY_EXTENSIONS', ()))
+    if _running_cli():
+        lazy.discard('migrate')
+    for name, extension in (('mail', mail), ('migrate', migrate), ('babel', babel)):
+        if name not in lazy:
+            extension.resolve()
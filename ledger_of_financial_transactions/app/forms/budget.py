@@ -0,0 +1,29 @@
+from flask_wtf import FlaskForm
+from wtforms import FloatField, IntegerField, SelectField, SubmitField
+from wtforms.validators import DataRequired, NumberRange
+
+from app.forms.transaction import CATEGORY_CHOICES
+
+PERIOD_CHOICES = [
+    ('weekly', 'Weekly'),
+    ('monthly', 'Monthly'),
+    ('yearly', 'Yearly')
+]
+
+class BudgetForm(FlaskForm):
+    category = SelectField('Category', choices=CATEGORY_CHOICES, validators=[DataRequired(message='Category is required')])
+    
+    period = SelectField('Period', choices=PERIOD_CHOICES, default='monthly',
+                         validators=[DataRequired(message='Period is required')])
+    
+    amount = FloatField('Limit', validators=[
+        DataRequired(message='Limit is required'),
+        NumberRange(min=0.01, message='Limit must be greater than 0')
+    ])
+    
+    alert_percent = IntegerField('Warn at (%)', default=80, validators=[
+        DataRequired(message='Warning level is required'),
+        NumberRange(min=1, max=100, message='Warning level must be between 1 and 100')
+    ])
+    
+    submit = SubmitField('Save Budget')
@@ -2,6 +2,18 @@ from flask_wtf import FlaskForm
 from wtforms import FloatField, TextAreaField, SelectField, DateField, SubmitField
 from wtforms.validators import DataRequired, NumberRange, Length, Optional
 
+CATEGORY_CHOICES = [
+    ('Food & Dining', 'Food & Dining'),
+    ('Transportation', 'Transportation'),
+    ('Shopping', 'Shopping'),
+    ('Entertainment', 'Entertainment'),
+    ('Bills & Utilities', 'Bills & Utilities'),
+    ('Healthcare', 'Healthcare'),
+    ('Education', 'Education'),
+    ('Travel', 'Travel'),
+    ('Other', 'Other')
+]
+
 class TransactionForm(FlaskForm):
     amount = FloatField('Amount', validators=[
         DataRequired(message='Amount is required'),
@@ -12,17 +24,7 @@ class TransactionForm(FlaskForm):
         Length(max=200, message='Description cannot exceed 200 characters')
     ])
     
-    category = SelectField('Category', choices=[
-        ('Food & Dining', 'Food & Dining'),
-        ('Transportation', 'Transportation'),
-        ('Shopping', 'Shopping'),
-        ('Entertainment', 'Entertainment'),
-        ('Bills & Utilities', 'Bills & Utilities'),
-        ('Healthcare', 'Healthcare'),
-        ('Education', 'Education'),
-        ('Travel', 'Travel'),
-        ('Other', 'Other')
-    ], validators=[DataRequired(message='Category is required')])
+    category = SelectField('Category', choices=CATEGORY_CHOICES, validators=[DataRequired(message='Category is required')])
     
     transaction_type = SelectField('Type', choices=[
         ('expense', 'Expense'),
@@ -34,18 +36,7 @@ class TransactionForm(FlaskForm):
     submit = SubmitField('Save Transaction')
 
 class TransactionFilterForm(FlaskForm):
-    category = SelectField('Category', choices=[
-        ('', 'All Categories'),
-        ('Food & Dining', 'Food & Dining'),
-        ('Transportation', 'Transportation'),
-        ('Shopping', 'Shopping'),
-        ('Entertainment', 'Entertainment'),
-        ('Bills & Utilities', 'Bills & Utilities'),
-        ('Healthcare', 'Healthcare'),
-        ('Education', 'Education'),
-        ('Travel', 'Travel'),
-        ('Other', 'Other')
-    ], validators=[Optional()])
+    category = SelectField('Category', choices=[('', 'All Categories')] + CATEGORY_CHOICES, validators=[Optional()])
     
     transaction_type = SelectField('Type', choices=[
         ('', 'All Types'),
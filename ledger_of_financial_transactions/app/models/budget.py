@@ -0,0 +1,153 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, delete, insert, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app import db
+
+PERIODS = ('weekly', 'monthly', 'yearly')
+
+def period_start(period, day):
+    """First day of the ``period`` containing ``day``; weeks start on Monday."""
+    if isinstance(day, datetime):
+        day = day.date()
+    if period == 'weekly':
+        return day - timedelta(days=day.weekday())
+    if period == 'monthly':
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+class CategorySpend(db.Model):
+    """Running total of a user's spending in one category and period.
+
+    Kept up to date by every write to the user's transactions, so that
+    budgets read one row instead of summing the period's transactions.
+    """
+    __tablename__ = 'category_spend'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    period = db.Column(db.String(10), primary_key=True)
+    period_start = db.Column(db.Date, primary_key=True)
+    spent = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CategorySpend {self.user_id} {self.category} {self.period} {self.period_start}: {self.spent}>'
+
+class Budget(db.Model):
+    """A spending limit for one of the user's categories per week, month or year."""
+    __tablename__ = 'budgets'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'category', 'period', name='uq_budgets_user_id_category_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    period = db.Column(db.String(10), nullable=False, default='monthly')
+    amount = db.Column(db.Float, nullable=False)
+    # Share of the amount at which the budget starts warning.
+    alert_threshold = db.Column(db.Float, nullable=False, default=0.8)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def state(self, spent):
+        """``over``, ``warning`` or ``ok`` for ``spent`` in the current period."""
+        if spent > self.amount:
+            return 'over'
+        if spent >= self.amount * self.alert_threshold:
+            return 'warning'
+        return 'ok'
+
+    def to_dict(self, spent=0.0, today=None):
+        return {
+            'id': self.id, 'category': self.category, 'period': self.period,
+            'amount': self.amount, 'alert_threshold': self.alert_threshold,
+            'period_start': period_start(self.period, today or datetime.utcnow().date()).isoformat(),
+            'spent': spent, 'remaining': self.amount - spent, 'state': self.state(spent),
+        }
+
+    @classmethod
+    def with_spend(cls, user_id, today=None, category=None):
+        """The user's budgets with their current period's spend, as ``(budget, spent)``.
+
+        One indexed lookup per budget, however many transactions the
+        period holds.
+        """
+        today = today or datetime.utcnow().date()
+        spend = CategorySpend.__table__
+        current_start = case({period: period_start(period, today) for period in PERIODS},
+                             value=cls.period)
+        query = (db.session.query(cls, spend.c.spent)
+                 .outerjoin(spend, and_(spend.c.user_id == cls.user_id,
+                                        spend.c.category == cls.category,
+                                        spend.c.period == cls.period,
+                                        spend.c.period_start == current_start))
+                 .filter(cls.user_id == user_id))
+        if category is not None:
+            query = query.filter(cls.category == category)
+        return [(budget, spent or 0.0) for budget, spent in query.order_by(cls.category, cls.period)]
+
+    def __repr__(self):
+        return f'<Budget {self.user_id} {self.category} {self.period}: {self.amount}>'
+
+def spend_deltas(rows, sign=1):
+    """Counter changes of adding (``sign=1``) or removing (``-1``) transactions.
+
+    ``rows`` start with ``(user_id, category, date, amount)``; only expenses count.
+    """
+    deltas = defaultdict(float)
+    for user_id, category, day, amount, *_ in rows:
+        if user_id is None or amount is None or amount >= 0:
+            continue
+        for period in PERIODS:
+            deltas[(user_id, category, period, period_start(period, day))] -= sign * amount
+    return deltas
+
+def _upsert(connection, table, rows):
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        module = sqlite if dialect == 'sqlite' else postgresql
+        statement = module.insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key],
+            set_={'spent': table.c.spent + statement.excluded.spent})
+        connection.execute(statement, rows)
+    elif dialect == 'mysql':
+        statement = mysql.insert(table)
+        connection.execute(statement.on_duplicate_key_update(
+            spent=table.c.spent + statement.inserted.spent), rows)
+    else:
+        for row in rows:
+            key = [table.c[name] == row[name] for name in ('user_id', 'category', 'period', 'period_start')]
+            updated = connection.execute(
+                update(table).where(*key).values(spent=table.c.spent + row['spent'])).rowcount
+            if not updated:
+                connection.execute(insert(table), row)
+
+def apply_spend_deltas(connection, deltas):
+    """Add ``spend_deltas`` to the counters in the current transaction."""
+    rows = [{'user_id': user_id, 'category': category, 'period': period,
+             'period_start': start, 'spent': delta}
+            # In key order, so concurrent writers lock counters in the same order.
+            for (user_id, category, period, start), delta in sorted(deltas.items()) if delta]
+    if rows:
+        _upsert(connection, CategorySpend.__table__, rows)
+
+def rebuild_spend(batch_size=10000):
+    """Recompute every counter from the transactions; returns the number of counters."""
+    transactions = db.Model.metadata.tables['transactions']
+    connection = db.session.connection()
+    connection.execute(delete(CategorySpend.__table__))
+    deltas = defaultdict(float)
+    result = connection.execute(
+        select(transactions.c.user_id, transactions.c.category, transactions.c.date,
+               transactions.c.amount)
+        .where(transactions.c.amount < 0)
+        .execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        for key, delta in spend_deltas(partition).items():
+            deltas[key] += delta
+    apply_spend_deltas(connection, deltas)
+    db.session.commit()
+    return len(deltas)
@@ -0,0 +1,201 @@
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import and_, bindparam, delete, insert, select, tuple_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app import db
+from app.utils.sketches import HLL_REGISTERS, HyperLogLog, QuantileSketch, merchant_key
+
+def month_start(day):
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.replace(day=1)
+
+class CategorySketch(db.Model):
+    """Sketches of a user's expenses in one category and month.
+
+    ``sizes`` is a quantile sketch of the expense amounts and ``merchants``
+    a HyperLogLog of their descriptions. Both merge, so any range of months
+    is summarised from one row per month instead of its transactions.
+    """
+    __tablename__ = 'category_sketches'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    sizes = db.Column(db.Text, nullable=False, default='{}')
+    merchants = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<CategorySketch {self.user_id} {self.category} {self.month}: {self.count}>'
+
+def _sketch_changes(added, removed):
+    """Expense sizes added and removed, and merchants seen, by (user, category, month)."""
+    changes = defaultdict(lambda: ([], [], set()))
+    for rows, position in ((added, 0), (removed, 1)):
+        for user_id, category, day, amount, description in rows:
+            if user_id is None or amount is None or amount >= 0:
+                continue
+            change = changes[(user_id, category, month_start(day))]
+            change[position].append(-amount)
+            if position == 0 and merchant_key(description):
+                change[2].add(merchant_key(description))
+    return changes
+
+def _insert_missing(connection, table, rows):
+    """Insert ``rows`` whose primary key is not taken yet."""
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        module = sqlite if dialect == 'sqlite' else postgresql
+        connection.execute(module.insert(table).on_conflict_do_nothing(), rows)
+    elif dialect == 'mysql':
+        connection.execute(mysql.insert(table).prefix_with('IGNORE'), rows)
+    else:
+        key = [table.c.user_id, table.c.category, table.c.month]
+        taken = set(connection.execute(
+            select(*key).where(tuple_(*key).in_([(row['user_id'], row['category'], row['month'])
+                                                 for row in rows]))).all())
+        missing = [row for row in rows if (row['user_id'], row['category'], row['month']) not in taken]
+        if missing:
+            connection.execute(insert(table), missing)
+
+def apply_sketch_changes(connection, added=(), removed=()):
+    """Fold transactions into and out of the sketches in the current transaction.
+
+    ``added`` and ``removed`` are ``(user_id, category, date, amount,
+    description)`` rows; only expenses count. Each touched month is read
+    under a row lock, updated and written back with one executemany.
+    """
+    changes = _sketch_changes(added, removed)
+    if not changes:
+        return
+    table = CategorySketch.__table__
+    # In key order, so concurrent writers lock sketches in the same order.
+    keys = sorted(changes)
+    _insert_missing(connection, table, [
+        {'user_id': user_id, 'category': category, 'month': month, 'count': 0, 'total': 0.0,
+         'sizes': '{}', 'merchants': bytes(HLL_REGISTERS)}
+        for user_id, category, month in keys
+    ])
+    rows = connection.execute(
+        select(table)
+        .where(tuple_(table.c.user_id, table.c.category, table.c.month).in_(keys))
+        .with_for_update()
+    ).all()
+
+    updates = []
+    for row in rows:
+        sizes_added, sizes_removed, merchants = changes[(row.user_id, row.category, row.month)]
+        sizes = QuantileSketch.from_json(row.sizes)
+        for size in sizes_added:
+            sizes.add(size)
+        for size in sizes_removed:
+            sizes.remove(size)
+        seen = HyperLogLog(row.merchants)
+        for merchant in merchants:
+            seen.add(merchant)
+        updates.append({
+            'b_user_id': row.user_id, 'b_category': row.category, 'b_month': row.month,
+            'b_count': row.count + len(sizes_added) - len(sizes_removed),
+            'b_total': row.total + sum(sizes_added) - sum(sizes_removed),
+            'b_sizes': sizes.to_json(), 'b_merchants': seen.to_bytes(),
+        })
+    connection.execute(
+        update(table)
+        .where(and_(table.c.user_id == bindparam('b_user_id'),
+                    table.c.category == bindparam('b_category'),
+                    table.c.month == bindparam('b_month')))
+        .values(count=bindparam('b_count'), total=bindparam('b_total'),
+                sizes=bindparam('b_sizes'), merchants=bindparam('b_merchants')),
+        updates,
+    )
+
+def _summary(sizes, merchants):
+    def rounded(value):
+        return round(value, 2) if value is not None else None
+    return {
+        'median': rounded(sizes.quantile(0.5)),
+        'p90': rounded(sizes.quantile(0.9)),
+        'max': rounded(sizes.quantile(1.0)),
+        'merchants': merchants.estimate(),
+    }
+
+def category_report(user_id, month=None):
+    """Expense statistics per category for ``month`` against the twelve months before it.
+
+    Each category has the month's count, total, median, p90 and max
+    transaction size and distinct merchants, the same for the trailing
+    twelve months with their average monthly total, and ``trend``: how far
+    the month's total is above (positive) or below that average, as a
+    fraction. Sizes are within 1% of the exact values; merchant counts are
+    estimates. Reads at most thirteen rows per category.
+    """
+    month = month_start(month or datetime.utcnow().date())
+    trailing_start = date(month.year - 1, month.month, 1)
+    rows = CategorySketch.query.filter(CategorySketch.user_id == user_id,
+                                       CategorySketch.month >= trailing_start,
+                                       CategorySketch.month <= month)
+    current, trailing = {}, {}
+    for row in rows:
+        target = current if row.month == month else trailing
+        sizes, merchants, count, total = target.setdefault(
+            row.category, (QuantileSketch(), HyperLogLog(), [0], [0.0]))
+        sizes.merge(QuantileSketch.from_json(row.sizes))
+        merchants.merge(HyperLogLog(row.merchants))
+        count[0] += row.count
+        total[0] += row.total
+
+    report = []
+    for category in sorted(set(current) | set(trailing)):
+        sizes, merchants, count, total = current.get(
+            category, (QuantileSketch(), HyperLogLog(), [0], [0.0]))
+        past_sizes, past_merchants, past_count, past_total = trailing.get(
+            category, (QuantileSketch(), HyperLogLog(), [0], [0.0]))
+        if not count[0] and not past_count[0]:
+            continue
+        average = past_total[0] / 12
+        report.append({
+            'category': category, 'count': count[0], 'total': round(total[0], 2),
+            **_summary(sizes, merchants),
+            'trailing': {'count': past_count[0], 'monthly_average': round(average, 2),
+                         **_summary(past_sizes, past_merchants)},
+            'trend': round(total[0] / average - 1, 4) if average else None,
+        })
+    report.sort(key=lambda entry: entry['total'], reverse=True)
+    return report
+
+def rebuild_sketches(batch_size=10000):
+    """Recompute every sketch from the transactions; returns the number of sketches.
+
+    Also makes merchant counts exact again after deletes.
+    """
+    transactions = db.Model.metadata.tables['transactions']
+    table = CategorySketch.__table__
+    connection = db.session.connection()
+    sketches = defaultdict(lambda: [QuantileSketch(), HyperLogLog(), 0, 0.0])
+    result = connection.execute(
+        select(transactions.c.user_id, transactions.c.category, transactions.c.date,
+               transactions.c.amount, transactions.c.description)
+        .where(transactions.c.amount < 0)
+        .execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        for key, (sizes, _, merchants) in _sketch_changes(partition, ()).items():
+            sketch = sketches[key]
+            for size in sizes:
+                sketch[0].add(size)
+            for merchant in merchants:
+                sketch[1].add(merchant)
+            sketch[2] += len(sizes)
+            sketch[3] += sum(sizes)
+    connection.execute(delete(table))
+    if sketches:
+        connection.execute(insert(table), [
+            {'user_id': user_id, 'category': category, 'month': month, 'count': count,
+             'total': total, 'sizes': sizes.to_json(), 'merchants': merchants.to_bytes()}
+            for (user_id, category, month), (sizes, merchants, count, total) in sketches.items()
+        ])
+    db.session.commit()
+    return len(sketches)
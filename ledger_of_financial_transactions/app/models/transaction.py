@@ -1,8 +1,21 @@
 from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
 from app import db
+from app.models.budget import apply_spend_deltas, spend_deltas
+from app.models.category_sketch import apply_sketch_changes
+from app.models.ledger_change import DELETE, UPSERT, record_changes
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # Per-user listings, newest first, and keyset pagination over them.
+        db.Index('ix_transactions_user_id_date', 'user_id', 'date', 'id'),
+        # One posting per occurrence of a recurring schedule.
+        db.Index('ix_transactions_recurring_id_date', 'recurring_id', 'date', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)
@@ -11,21 +24,89 @@ class Transaction(db.Model):
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Row version for optimistic locking: every UPDATE checks and bumps it,
+    # so a write based on a stale copy fails instead of losing an edit.
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # The schedule that posted the transaction, if any.
+    recurring_id = db.Column(db.Integer, db.ForeignKey('recurring_transactions.id', ondelete='SET NULL'))
+    
+    __mapper_args__ = {'version_id_col': version}
+    
+    SERIALIZED_FIELDS = ('id', 'amount', 'description', 'category', 'date',
+                         'user_id', 'created_at', 'updated_at', 'version', 'recurring_id')
+    
+    @classmethod
+    def filtered(cls, user_id, category=None, transaction_type=None, date_from=None, date_to=None):
+        """Query a user's transactions with the filters of ``TransactionFilterForm``."""
+        query = cls.query.filter_by(user_id=user_id)
+        if category:
+            query = query.filter_by(category=category)
+        if transaction_type == 'income':
+            query = query.filter(cls.amount > 0)
+        elif transaction_type:
+            query = query.filter(cls.amount < 0)
+        if date_from:
+            query = query.filter(cls.date >= date_from)
+        if date_to:
+            query = query.filter(cls.date <= date_to)
+        return query
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'amount': self.amount,
-            'description': self.description,
-            'category': self.category,
-            'date': self.date.isoformat(),
-            'user_id': self.user_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+    def to_dict(self, fields=None):
+        """Serialize the transaction, limited to ``fields`` when given."""
+        data = {}
+        for name in fields or self.SERIALIZED_FIELDS:
+            value = getattr(self, name)
+            data[name] = value.isoformat() if isinstance(value, datetime) else value
+        return data
     
     def __repr__(self):
         return f'<Transaction {self.id}: {self.category} - ${self.amount}>'
+
+AGGREGATE_FIELDS = ('user_id', 'category', 'date', 'amount', 'description')
+
+def _aggregate_row(obj, previous=False):
+    """``AGGREGATE_FIELDS`` of a transaction, as loaded or as it is now."""
+    if not previous:
+        return tuple(getattr(obj, name) for name in AGGREGATE_FIELDS)
+    attrs = inspect(obj).attrs
+    return tuple(attrs[name].history.deleted[0] if attrs[name].history.deleted
+                 else getattr(obj, name) for name in AGGREGATE_FIELDS)
+
+def apply_aggregates(connection, added=(), removed=()):
+    """Move transactions into and out of the spend counters and category sketches.
+
+    ``added`` and ``removed`` are rows of ``AGGREGATE_FIELDS``.
+    """
+    deltas = spend_deltas(added)
+    for key, delta in spend_deltas(removed, sign=-1).items():
+        deltas[key] += delta
+    apply_spend_deltas(connection, deltas)
+    apply_sketch_changes(connection, added, removed)
+
+@event.listens_for(Session, 'after_flush')
+def _record_ledger_changes(session, flush_context):
+    """Log the transactions this flush wrote, bump their owners' versions
+    and move them between the category spend counters and sketches."""
+    changes, added, removed = [], [], []
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            changes.append((obj.user_id, obj.id, UPSERT))
+            added.append(_aggregate_row(obj))
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and session.is_modified(obj):
+            # A row moved to another user disappears from its previous owner's ledger.
+            for previous_owner in inspect(obj).attrs.user_id.history.deleted:
+                changes.append((previous_owner, obj.id, DELETE))
+            changes.append((obj.user_id, obj.id, UPSERT))
+            removed.append(_aggregate_row(obj, previous=True))
+            added.append(_aggregate_row(obj))
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            changes.append((obj.user_id, obj.id, DELETE))
+            removed.append(_aggregate_row(obj))
+    if changes:
+        record_changes(session.connection(), changes)
+        apply_aggregates(session.connection(), added, removed)
@@ -1,5 +1,6 @@
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import update
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db, login_manager
 
@@ -16,6 +17,12 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     
+    # Bumped whenever the user's transactions change; validates cached reads
+    ledger_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    ledger_updated_at = db.Column(db.DateTime)
+    # Oldest version clients can sync from; raised when tombstones expire
+    ledger_floor_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     transactions = db.relationship('Transaction', backref='user', lazy=True)
     
@@ -28,6 +35,18 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+def bump_ledger_version(connection, user_ids):
+    """Increment the ledger version of ``user_ids`` in the current transaction."""
+    user_ids = [user_id for user_id in set(user_ids) if user_id is not None]
+    if not user_ids:
+        return
+    connection.execute(
+        update(User.__table__)
+        .where(User.__table__.c.id.in_(user_ids))
+        .values(ledger_version=User.__table__.c.ledger_version + 1,
+                ledger_updated_at=datetime.utcnow())
+    )
+
 @login_manager.user_loader
 def load_user(id):
     return User.query.get(int(id))
@@ -1,7 +1,786 @@
-from flask import Blueprint, jsonify
+import base64
+import hmac
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+from flask_login import current_user, login_required
+from sqlalchemy import bindparam, case, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.extensions import db, limiter
+from app.forms.transaction import CATEGORY_CHOICES
+from app.models.transaction import AGGREGATE_FIELDS, Transaction, apply_aggregates
+from app.models.budget import Budget
+from app.models.category_sketch import category_report
+from app.models.idempotency_key import IdempotencyKey
+from app.models.ledger_change import DELETE, UPSERT, LedgerChange, record_changes
+from app.models.recurring_transaction import FREQUENCIES, RecurringTransaction
+from app.models.user import User
+from app.utils.conditional import conditional
+from app.utils.events import get_hub, house_ids_for, stream
+from app.utils.metrics import get_metrics
+from app.utils.read_pool import get_read_pool
 
 api_bp = Blueprint('api', __name__)
 
 @api_bp.route('/')
 def index():
     return jsonify({"status": "API is running"})
+
+def _check_metrics_token():
+    """Require ``METRICS_TOKEN`` as a bearer token, or an admin's session.
+
+    Without a token configured the metrics are open, unless
+    ``METRICS_REQUIRE_TOKEN`` is set, as in production: then only admins
+    get them.
+    """
+    if current_user.is_authenticated and current_user.is_admin:
+        return
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        if current_app.config.get('METRICS_REQUIRE_TOKEN'):
+            abort(403)
+        return
+    supplied = request.headers.get('Authorization', '').replace('Bearer ', '', 1)
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        abort(401)
+
+@api_bp.route('/metrics')
+@limiter.exempt
+def metrics():
+    """Prometheus scrape endpoint, aggregated across workers."""
+    _check_metrics_token()
+    return Response(get_metrics().render_prometheus(),
+                    mimetype='text/plain; version=0.0.4')
+
+@api_bp.route('/metrics.json')
+@limiter.exempt
+def metrics_json():
+    """Latency, cache and per-worker figures as JSON."""
+    _check_metrics_token()
+    return jsonify(get_metrics().render_json())
+
+transactions = Transaction.__table__
+
+def _start_of_month():
+    return datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _balance_widget(connection, user_id):
+    total = connection.execute(
+        select(func.coalesce(func.sum(transactions.c.amount), 0))
+        .where(transactions.c.user_id == user_id)
+    ).scalar()
+    return {'balance': total}
+
+def _monthly_widget(connection, user_id):
+    amount = transactions.c.amount
+    row = connection.execute(
+        select(func.coalesce(func.sum(case((amount > 0, amount), else_=0)), 0),
+               func.coalesce(func.sum(case((amount < 0, -amount), else_=0)), 0))
+        .where(transactions.c.user_id == user_id, transactions.c.date >= _start_of_month())
+    ).one()
+    return {'income': row[0], 'expenses': row[1]}
+
+def _recent_widget(connection, user_id, limit=10):
+    rows = connection.execute(
+        select(transactions.c.id, transactions.c.date, transactions.c.description,
+               transactions.c.category, transactions.c.amount)
+        .where(transactions.c.user_id == user_id)
+        .order_by(transactions.c.date.desc())
+        .limit(limit)
+    ).mappings()
+    return [dict(row, date=row['date'].isoformat()) for row in rows]
+
+def _categories_widget(connection, user_id):
+    rows = connection.execute(
+        select(transactions.c.category, func.sum(transactions.c.amount), func.count())
+        .where(transactions.c.user_id == user_id, transactions.c.date >= _start_of_month())
+        .group_by(transactions.c.category)
+        .order_by(func.sum(transactions.c.amount))
+    )
+    return [{'category': category, 'total': total, 'count': count}
+            for category, total, count in rows]
+
+DASHBOARD_WIDGETS = {
+    'balance': _balance_widget,
+    'monthly': _monthly_widget,
+    'recent': _recent_widget,
+    'categories': _categories_widget,
+}
+
+@api_bp.route('/dashboard')
+@login_required
+@conditional(_start_of_month)
+async def dashboard_widgets():
+    """Data for the dashboard widgets, fetched side by side.
+
+    ``?widgets=balance,recent`` limits the response to some widgets; by
+    default all of them are returned. Each widget query runs on the
+    read-only pool, so the response takes as long as the slowest one.
+    """
+    names = request.args.get('widgets')
+    names = names.split(',') if names else list(DASHBOARD_WIDGETS)
+    unknown = [name for name in names if name not in DASHBOARD_WIDGETS]
+    if unknown:
+        return jsonify({'error': f"Unknown widgets: {', '.join(unknown)}"}), 400
+
+    user_id = current_user.id
+    results = await get_read_pool().gather(
+        {name: (DASHBOARD_WIDGETS[name], user_id) for name in names})
+    return jsonify(results)
+
+CATEGORIES = {value for value, _ in CATEGORY_CHOICES}
+WRITABLE_FIELDS = ('amount', 'description', 'category', 'date')
+MAX_PAGE_SIZE = 500
+
+class ApiError(Exception):
+    """Abort an API view with a JSON error body."""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+@api_bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': str(error), **error.details}), error.status
+
+def _encode_cursor(transaction):
+    payload = json.dumps([transaction.date.isoformat(), transaction.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        date, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(date), int(id_)
+    except (ValueError, TypeError):
+        raise ApiError('Invalid cursor')
+
+def _requested_fields():
+    """Fields named in ``?fields=``, or None for all of them."""
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    fields = [name for name in fields.split(',') if name]
+    unknown = [name for name in fields if name not in Transaction.SERIALIZED_FIELDS]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def _load_only(query, fields, *required):
+    if fields is None:
+        return query
+    columns = dict.fromkeys(required + tuple(fields))
+    return query.options(load_only(*(getattr(Transaction, name) for name in columns)))
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ApiError(f'{name} must be a YYYY-MM-DD date')
+
+def _parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError('must be an ISO 8601 date')
+
+def _validate(item, partial=False):
+    """Return the writable values of one payload item, or raise ValueError."""
+    if not isinstance(item, dict):
+        raise ValueError('each item must be an object')
+    missing = [name for name in ('amount', 'category', 'date') if name not in item]
+    if missing and not partial:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    values = {}
+    for name in WRITABLE_FIELDS:
+        if name not in item:
+            continue
+        value = item[name]
+        if name == 'amount':
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value == 0:
+                raise ValueError('amount must be a non-zero number')
+            value = float(value)
+        elif name == 'category' and value not in CATEGORIES:
+            raise ValueError(f'unknown category {value!r}')
+        elif name == 'description':
+            if value is not None and (not isinstance(value, str) or len(value) > 200):
+                raise ValueError('description must be text of at most 200 characters')
+        elif name == 'date':
+            value = _parse_datetime(value)
+        values[name] = value
+    return values
+
+def _bulk_items(key):
+    """The list of items of a bulk request, as a list or ``{key: [...]}``."""
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict) and key in payload:
+        payload = payload[key]
+    if not isinstance(payload, list):
+        raise ApiError(f'Expected a JSON list or an object with a {key!r} list')
+    limit = current_app.config.get('API_MAX_BULK_ITEMS', 1000)
+    if len(payload) > limit:
+        raise ApiError(f'At most {limit} items per request', status=413)
+    return payload
+
+def _validate_all(items, partial=False):
+    """Validate every item first, so a bad batch changes nothing."""
+    validated, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            values = _validate(item, partial=partial)
+            if partial:
+                if not isinstance(item.get('id'), int):
+                    raise ValueError('id must be an integer')
+                values['id'] = item['id']
+            validated.append(values)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    if errors:
+        raise ApiError('Validation failed', errors=errors)
+    return validated
+
+@api_bp.route('/transactions', methods=['GET'])
+@login_required
+@conditional()
+def list_transactions():
+    """The user's transactions, newest first, one keyset page at a time.
+
+    Filters mirror ``TransactionFilterForm``: ``category``,
+    ``transaction_type`` (income or expense), ``date_from`` and ``date_to``.
+    Pass ``next_cursor`` back as ``?cursor=`` for the following page.
+    """
+    fields = _requested_fields()
+    limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_PAGE_SIZE)
+    query = Transaction.filtered(current_user.id,
+                                 category=request.args.get('category'),
+                                 transaction_type=request.args.get('transaction_type'),
+                                 date_from=_date_arg('date_from'),
+                                 date_to=_date_arg('date_to'))
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(tuple_(Transaction.date, Transaction.id) < _decode_cursor(cursor))
+    query = _load_only(query, fields, 'id', 'date')
+    rows = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1).all()
+
+    page = rows[:limit]
+    return jsonify({
+        'transactions': [transaction.to_dict(fields) for transaction in page],
+        'next_cursor': _encode_cursor(page[-1]) if len(rows) > limit else None,
+    })
+
+@api_bp.route('/transactions/<int:id>', methods=['GET'])
+@login_required
+@conditional()
+def get_transaction(id):
+    fields = _requested_fields()
+    query = _load_only(Transaction.query.filter_by(id=id, user_id=current_user.id), fields, 'id')
+    transaction = query.first()
+    if transaction is None:
+        raise ApiError('Transaction not found', status=404)
+    return jsonify(transaction.to_dict(fields))
+
+def _row_dict(row):
+    """A ``transactions`` row serialized like ``Transaction.to_dict``."""
+    data = {}
+    for name in Transaction.SERIALIZED_FIELDS:
+        value = row._mapping[name]
+        data[name] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+def _aggregate_rows(rows):
+    return [tuple(row._mapping[name] for name in AGGREGATE_FIELDS) for row in rows]
+
+@api_bp.route('/transactions', methods=['POST'])
+@login_required
+def create_transactions():
+    """Create one transaction per item, all in one database transaction.
+
+    The batch is written with one executemany that returns the new rows in
+    item order, so no query has to find them again.
+    """
+    items = _validate_all(_bulk_items('transactions'))
+    connection = db.session.connection()
+    now = datetime.utcnow()
+    values = [{'description': None, **item, 'user_id': current_user.id,
+               'created_at': now, 'updated_at': now, 'version': 1} for item in items]
+    if connection.dialect.insert_executemany_returning_sort_by_parameter_order:
+        rows = connection.execute(
+            insert(transactions).returning(transactions, sort_by_parameter_order=True), values
+        ).all()
+    else:
+        # Without RETURNING (MySQL) the rows are read back by id. Under the
+        # owner's row lock no other write of theirs can commit, so the rows
+        # past their highest id are this batch's, in item order.
+        users = User.__table__
+        connection.execute(select(users.c.id).where(users.c.id == current_user.id).with_for_update())
+        last_id = connection.execute(
+            select(func.coalesce(func.max(transactions.c.id), 0))
+            .where(transactions.c.user_id == current_user.id)
+        ).scalar()
+        connection.execute(insert(transactions), values)
+        rows = connection.execute(
+            select(transactions)
+            .where(transactions.c.user_id == current_user.id, transactions.c.id > last_id)
+            .order_by(transactions.c.id)
+        ).all()
+    # Core writes skip the session's flush hooks.
+    record_changes(connection, [(current_user.id, row.id, UPSERT) for row in rows])
+    apply_aggregates(connection, _aggregate_rows(rows))
+    db.session.commit()
+    return jsonify({'transactions': [_row_dict(row) for row in rows]}), 201
+
+@api_bp.route('/transactions', methods=['PATCH'])
+@login_required
+def update_transactions():
+    """Apply partial updates, each item naming its ``id``; all or nothing.
+
+    Items setting the same fields share one executemany update, so a
+    batch costs a handful of statements however many items it has.
+    """
+    items = _validate_all(_bulk_items('transactions'), partial=True)
+    ids = list(dict.fromkeys(item['id'] for item in items))
+    connection = db.session.connection()
+    # Locked, so the previous values moved out of the aggregates stay current.
+    before = connection.execute(
+        select(transactions)
+        .where(transactions.c.user_id == current_user.id, transactions.c.id.in_(ids))
+        .with_for_update()
+    ).all()
+    found = {row.id for row in before}
+    missing = [id_ for id_ in ids if id_ not in found]
+    if missing:
+        raise ApiError('Transactions not found', status=404, ids=missing)
+
+    changes = {}
+    for item in items:
+        changes.setdefault(item.pop('id'), {}).update(item)
+    groups = {}
+    for id_, values in changes.items():
+        groups.setdefault(tuple(sorted(values)), []).append(
+            {'b_id': id_, **{f'b_{name}': value for name, value in values.items()}})
+    now = datetime.utcnow()
+    for names, params in groups.items():
+        connection.execute(
+            update(transactions)
+            .where(transactions.c.id == bindparam('b_id'))
+            .values(version=transactions.c.version + 1, updated_at=now,
+                    **{name: bindparam(f'b_{name}') for name in names}),
+            params,
+        )
+    after = {row.id: row for row in connection.execute(
+        select(transactions).where(transactions.c.id.in_(ids)))}
+    # Core writes skip the session's flush hooks.
+    record_changes(connection, [(current_user.id, id_, UPSERT) for id_ in ids])
+    apply_aggregates(connection, _aggregate_rows(after.values()), _aggregate_rows(before))
+    db.session.commit()
+    return jsonify({'transactions': [_row_dict(after[id_]) for id_ in ids]})
+
+@api_bp.route('/transactions', methods=['DELETE'])
+@login_required
+def delete_transactions():
+    """Delete the transactions listed in ``{"ids": [...]}`` or ``?ids=1,2``; all or nothing."""
+    if request.args.get('ids'):
+        try:
+            ids = [int(id_) for id_ in request.args['ids'].split(',')]
+        except ValueError:
+            raise ApiError('ids must be integers')
+    else:
+        ids = _bulk_items('ids')
+        if not all(isinstance(id_, int) and not isinstance(id_, bool) for id_ in ids):
+            raise ApiError('ids must be integers')
+    ids = list(dict.fromkeys(ids))
+
+    query = Transaction.query.filter(Transaction.user_id == current_user.id,
+                                     Transaction.id.in_(ids))
+    found = {row.id: row for row in query.with_entities(
+        Transaction.id, *(getattr(Transaction, name) for name in AGGREGATE_FIELDS))}
+    missing = [id_ for id_ in ids if id_ not in found]
+    if missing:
+        raise ApiError('Transactions not found', status=404, ids=missing)
+    deleted = query.delete(synchronize_session=False)
+    # Bulk deletes skip the session's flush hooks.
+    connection = db.session.connection()
+    record_changes(connection, [(current_user.id, id_, DELETE) for id_ in ids])
+    apply_aggregates(connection, removed=[tuple(row)[1:] for row in found.values()])
+    db.session.commit()
+    return jsonify({'deleted': deleted})
+
+@api_bp.route('/events')
+@login_required
+def events():
+    """Server-Sent Events for the user's ledger and, with ``?house=<id>``, GCD houses.
+
+    ``ledger`` events name the transaction that changed; clients fetch it
+    with ``/sync``. House streams carry new transactions and entries and
+    changes of status. A ``resync`` event means the client fell behind and
+    missed events.
+    """
+    topics = {f'user:{current_user.id}'}
+    houses = request.args.getlist('house', type=int)
+    if houses:
+        member_of = house_ids_for(current_user.email)
+        denied = [house for house in houses if house not in member_of]
+        if denied:
+            raise ApiError('Not a member of these houses', status=403, houses=denied)
+        topics.update(f'house:{house}' for house in houses)
+
+    config = current_app.config
+    subscription = get_hub().subscribe(topics)
+    # Streamed outside the request context, so no database connection is held.
+    response = Response(stream(subscription, config.get('EVENTS_HEARTBEAT', 15),
+                               config.get('EVENTS_MAX_STREAM_SECONDS', 300)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _encode_sync_cursor(version, change_id, floor):
+    return f'{version}.{change_id}.{floor}'
+
+def _decode_sync_cursor(cursor):
+    """``(version, change_id, floor)`` of a sync cursor, or None without one.
+
+    The floor is the user's floor version when the cursor was issued: a
+    client that started over under the current floor has seen no expired
+    tombstone, even while it catches up on older changes.
+    """
+    if not cursor:
+        return None
+    try:
+        version, change_id, floor = cursor.split('.')
+        return int(version), int(change_id), int(floor)
+    except ValueError:
+        raise ApiError('Invalid cursor')
+
+@api_bp.route('/sync')
+@login_required
+@conditional(lambda: current_user.ledger_floor_version)
+def sync():
+    """Changes to the user's transactions since ``?since=<cursor>``.
+
+    Returns the current state of every transaction created or updated
+    since the cursor in ``upserts``, the ids of deleted ones in
+    ``deletes``, and the ``cursor`` to pass next time. While ``has_more``
+    is true, call again right away. Without a cursor, or with one older
+    than the compacted log, ``reset`` is true: the client drops its local
+    copy and the changes rebuild it from scratch.
+    """
+    fields = _requested_fields()
+    limit = min(max(request.args.get('limit', 500, type=int), 1), MAX_PAGE_SIZE)
+    floor = current_user.ledger_floor_version
+    since = _decode_sync_cursor(request.args.get('since'))
+    reset = since is None or (since[0] < floor and since[2] < floor)
+    position = (0, 0) if reset else since[:2]
+
+    changes = (LedgerChange.query
+               .filter(LedgerChange.user_id == current_user.id,
+                       tuple_(LedgerChange.version, LedgerChange.id) > position)
+               .order_by(LedgerChange.version, LedgerChange.id)
+               .limit(limit + 1)
+               .all())
+    page = changes[:limit]
+    operations = {change.transaction_id: change.operation for change in page}
+
+    upserts = []
+    upsert_ids = [id_ for id_, operation in operations.items() if operation == UPSERT]
+    if upsert_ids:
+        query = Transaction.query.filter(Transaction.user_id == current_user.id,
+                                         Transaction.id.in_(upsert_ids))
+        # A row deleted since then is missing here; its tombstone follows.
+        upserts = [transaction.to_dict(fields) for transaction in
+                   _load_only(query, fields, 'id').order_by(Transaction.id)]
+
+    if page:
+        position = (page[-1].version, page[-1].id)
+    return jsonify({
+        'upserts': upserts,
+        'deletes': [id_ for id_, operation in operations.items() if operation == DELETE],
+        'cursor': _encode_sync_cursor(*position, floor),
+        'has_more': len(changes) > limit,
+        'reset': reset,
+    })
+
+UPLOAD_OPERATIONS = ('create', 'update', 'delete')
+APPLIED = ('created', 'updated', 'deleted')
+
+def _upload_ref(item):
+    """The batch ``ref`` of an operation: a string or an integer."""
+    ref = item['ref']
+    if not isinstance(ref, (str, int)) or isinstance(ref, bool):
+        raise ValueError('ref must be a string or an integer')
+    return ref
+
+def _upload_target(item, rows, refs):
+    """The transaction an update or delete refers to, by ``id`` or batch ``ref``."""
+    if 'ref' in item:
+        return refs.get(_upload_ref(item))
+    if not isinstance(item.get('id'), int) or isinstance(item['id'], bool):
+        raise ValueError('id must be an integer')
+    return rows.get(item['id'])
+
+def _apply_operation(item, rows, refs, overwrite):
+    """Stage one uploaded operation; returns its status and transaction."""
+    operation = item.get('op')
+    if operation not in UPLOAD_OPERATIONS:
+        raise ValueError(f"op must be one of {', '.join(UPLOAD_OPERATIONS)}")
+    if operation == 'create':
+        ref = _upload_ref(item) if item.get('ref') is not None else None
+        transaction = Transaction(user_id=current_user.id, **_validate(item.get('data')))
+        db.session.add(transaction)
+        if ref is not None:
+            refs[ref] = transaction
+        return 'created', transaction
+
+    transaction = _upload_target(item, rows, refs)
+    if transaction is None:
+        return 'not_found', None
+    base_version = item.get('base_version')
+    # Rows created earlier in the batch have no version to conflict with yet.
+    if (transaction.id is not None and base_version is not None and not overwrite
+            and base_version != transaction.version):
+        return 'conflict', transaction
+
+    if operation == 'update':
+        for name, value in _validate(item.get('data'), partial=True).items():
+            setattr(transaction, name, value)
+        return 'updated', transaction
+    if transaction.id is None:
+        db.session.expunge(transaction)
+    else:
+        db.session.delete(transaction)
+        rows.pop(transaction.id, None)
+    return 'deleted', transaction
+
+@api_bp.route('/sync', methods=['POST'])
+@login_required
+def upload():
+    """Apply a queue of offline writes in one database transaction.
+
+    The body is ``{"operations": [...], "on_conflict": "reject"}``. Each
+    operation has a client-generated ``key`` and an ``op``:
+
+    * ``create`` with ``data``, and an optional ``ref`` that later
+      operations of the batch can use instead of the unknown ``id``;
+    * ``update`` with ``id`` (or ``ref``) and partial ``data``;
+    * ``delete`` with ``id`` (or ``ref``).
+
+    Updates and deletes carrying the ``base_version`` the client edited
+    are rejected as ``conflict``, with the server's copy, when the row has
+    changed since, unless ``on_conflict`` is ``overwrite``. Every
+    operation gets its own result; invalid or conflicting ones do not stop
+    the others. Results of applied operations are stored under their key,
+    so re-sending a batch after a lost response applies nothing twice.
+    """
+    items = _bulk_items('operations')
+    payload = request.get_json(silent=True)
+    on_conflict = payload.get('on_conflict', 'reject') if isinstance(payload, dict) else 'reject'
+    if on_conflict not in ('reject', 'overwrite'):
+        raise ApiError('on_conflict must be reject or overwrite')
+
+    keys = [item.get('key') for item in items if isinstance(item, dict)]
+    replays = IdempotencyKey.lookup(current_user.id, [key for key in keys if isinstance(key, str)])
+    ids = {item.get('id') for item in items if isinstance(item, dict)}
+    ids = [id_ for id_ in ids if isinstance(id_, int) and not isinstance(id_, bool)]
+    rows = {}
+    if ids:
+        rows = {transaction.id: transaction for transaction in
+                Transaction.query.filter(Transaction.user_id == current_user.id,
+                                         Transaction.id.in_(ids))}
+
+    refs, staged = {}, []
+    for index, item in enumerate(items):
+        key = item.get('key') if isinstance(item, dict) else None
+        if not isinstance(key, str) or not 0 < len(key) <= 64:
+            staged.append((index, key, 'invalid', 'key must be a string of 1 to 64 characters'))
+            continue
+        if key in replays:
+            staged.append((index, key, 'replayed', replays[key]))
+            continue
+        try:
+            status, transaction = _apply_operation(item, rows, refs, on_conflict == 'overwrite')
+        except ValueError as e:
+            staged.append((index, key, 'invalid', str(e)))
+            continue
+        staged.append((index, key, status, transaction))
+        if status in APPLIED:
+            # A key repeated later in the batch replays this result.
+            replays[key] = None
+
+    try:
+        db.session.flush()
+    except StaleDataError:
+        db.session.rollback()
+        raise ApiError('A transaction changed during the upload; send the batch again', status=409)
+
+    results, stored = [], {}
+    for index, key, status, value in staged:
+        if status == 'replayed':
+            outcome = value if value is not None else stored[key]
+            results.append({'index': index, 'key': key, **outcome, 'replayed': True})
+            continue
+        outcome = {'status': status}
+        if status == 'invalid':
+            outcome['error'] = value
+        elif status == 'deleted':
+            outcome['id'] = value.id
+        elif value is not None:
+            outcome['transaction'] = value.to_dict()
+        if status in APPLIED:
+            stored[key] = outcome
+        results.append({'index': index, 'key': key, **outcome})
+
+    db.session.add_all(IdempotencyKey(user_id=current_user.id, key=key, response=json.dumps(response))
+                       for key, response in stored.items())
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise ApiError('The same operations are being uploaded concurrently', status=409)
+    return jsonify({'results': results})
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError('must be a YYYY-MM-DD date')
+
+def _validate_schedule(item, partial=False):
+    """Return the writable values of a recurring schedule, or raise ValueError."""
+    if not isinstance(item, dict):
+        raise ValueError('the schedule must be an object')
+    values = _validate({name: item[name] for name in ('amount', 'category', 'description')
+                        if name in item}, partial=True)
+    missing = [name for name in ('amount', 'category', 'start_date') if name not in item]
+    if missing and not partial:
+        raise ValueError(f"missing {', '.join(missing)}")
+    if 'frequency' in item:
+        if item['frequency'] not in FREQUENCIES:
+            raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+        values['frequency'] = item['frequency']
+    if 'repeat_every' in item:
+        repeat_every = item['repeat_every']
+        if isinstance(repeat_every, bool) or not isinstance(repeat_every, int) or repeat_every < 1:
+            raise ValueError('repeat_every must be a positive integer')
+        values['repeat_every'] = repeat_every
+    for name in ('start_date', 'end_date'):
+        if name in item:
+            values[name] = None if item[name] is None and name == 'end_date' else _parse_date(item[name])
+    if 'is_active' in item:
+        if not isinstance(item['is_active'], bool):
+            raise ValueError('is_active must be a boolean')
+        values['is_active'] = item['is_active']
+    return values
+
+def _schedule_or_404(id):
+    schedule = RecurringTransaction.query.filter_by(id=id, user_id=current_user.id).first()
+    if schedule is None:
+        raise ApiError('Recurring transaction not found', status=404)
+    return schedule
+
+@api_bp.route('/recurring', methods=['GET'])
+@login_required
+def list_recurring():
+    schedules = (RecurringTransaction.query.filter_by(user_id=current_user.id)
+                 .order_by(RecurringTransaction.id))
+    return jsonify({'recurring': [schedule.to_dict() for schedule in schedules]})
+
+@api_bp.route('/recurring', methods=['POST'])
+@login_required
+def create_recurring():
+    """Schedule a transaction posted every ``repeat_every`` days, weeks, months or years.
+
+    Occurrences from ``start_date`` up to today are posted by the next run
+    of ``flask materialize-recurring``.
+    """
+    try:
+        values = _validate_schedule(request.get_json(silent=True))
+    except ValueError as e:
+        raise ApiError(str(e))
+    schedule = RecurringTransaction(user_id=current_user.id, **values)
+    schedule.schedule()
+    db.session.add(schedule)
+    db.session.commit()
+    return jsonify(schedule.to_dict()), 201
+
+@api_bp.route('/recurring/<int:id>', methods=['PATCH'])
+@login_required
+def update_recurring(id):
+    """Change a schedule; new rules apply from the next occurrence on."""
+    schedule = _schedule_or_404(id)
+    try:
+        values = _validate_schedule(request.get_json(silent=True), partial=True)
+    except ValueError as e:
+        raise ApiError(str(e))
+    # Ended schedules have no next run; paused ones keep theirs.
+    ended = schedule.next_run is None
+    for name, value in values.items():
+        setattr(schedule, name, value)
+    if {'frequency', 'repeat_every', 'start_date'} & values.keys():
+        # Occurrences already posted stay; the new rule starts after today.
+        schedule.schedule()
+        today = datetime.utcnow().date()
+        while schedule.next_run is not None and schedule.next_run <= today:
+            schedule.next_occurrence += 1
+            schedule.next_run = schedule.occurrence(schedule.next_occurrence)
+    elif 'end_date' in values:
+        schedule.next_run = schedule.occurrence(schedule.next_occurrence)
+    if ({'frequency', 'repeat_every', 'start_date', 'end_date'} & values.keys()
+            and 'is_active' not in values):
+        # Moving the end ends or revives the schedule, but does not resume a paused one.
+        if schedule.next_run is None:
+            schedule.is_active = False
+        elif ended:
+            schedule.is_active = True
+    db.session.commit()
+    return jsonify(schedule.to_dict())
+
+@api_bp.route('/recurring/<int:id>', methods=['DELETE'])
+@login_required
+def delete_recurring(id):
+    """Delete a schedule; the transactions it already posted are kept."""
+    schedule = _schedule_or_404(id)
+    posted = Transaction.query.filter_by(recurring_id=schedule.id)
+    ids = [id_ for (id_,) in posted.with_entities(Transaction.id)]
+    if ids:
+        posted.update({'recurring_id': None}, synchronize_session=False)
+        # Bulk updates skip the session's flush hooks.
+        record_changes(db.session.connection(), [(current_user.id, id_, UPSERT) for id_ in ids])
+    db.session.delete(schedule)
+    db.session.commit()
+    return '', 204
+
+@api_bp.route('/budgets')
+@login_required
+def budgets():
+    """The user's budgets with the current period's spend and alert ``state``."""
+    today = datetime.utcnow().date()
+    return jsonify({'budgets': [budget.to_dict(spent, today)
+                                for budget, spent in Budget.with_spend(current_user.id, today)]})
+
+@api_bp.route('/analytics/categories')
+@login_required
+@conditional(_start_of_month)
+def category_analytics():
+    """Expense statistics per category for ``?month=YYYY-MM`` (default: this month).
+
+    Median, p90 and max transaction sizes and distinct merchants of the
+    month and of the twelve months before it, with the month's ``trend``
+    against their average. Computed from per-month sketches, so sizes are
+    within 1% and merchant counts are estimates.
+    """
+    month = request.args.get('month')
+    try:
+        month = datetime.strptime(month, '%Y-%m').date() if month else None
+    except ValueError:
+        raise ApiError('month must be YYYY-MM')
+    month = month or _start_of_month().date()
+    return jsonify({'month': month.strftime('%Y-%m'),
+                    'categories': category_report(current_user.id, month)})
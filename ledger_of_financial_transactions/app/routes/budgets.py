@@ -0,0 +1,54 @@
+from flask import Blueprint, render_template, redirect, url_for, flash
+from flask_login import login_required, current_user
+from app import db
+from app.models.budget import Budget
+from app.forms.budget import BudgetForm
+
+budgets_bp = Blueprint('budgets', __name__)
+
+def flash_budget_alerts(user_id, category):
+    """Warn about the budgets of ``category`` that are close to or over their limit."""
+    for budget, spent in Budget.with_spend(user_id, category=category):
+        state = budget.state(spent)
+        if state == 'over':
+            flash(f'{budget.period.title()} {budget.category} budget exceeded: '
+                  f'${spent:,.2f} of ${budget.amount:,.2f} spent.', 'danger')
+        elif state == 'warning':
+            flash(f'{budget.period.title()} {budget.category} budget nearly used: '
+                  f'${spent:,.2f} of ${budget.amount:,.2f} spent.', 'warning')
+
+@budgets_bp.route('/', methods=['GET', 'POST'])
+@login_required
+def list_budgets():
+    form = BudgetForm()
+    
+    if form.validate_on_submit():
+        # One budget per category and period; saving again changes its limit.
+        budget = Budget.query.filter_by(user_id=current_user.id,
+                                        category=form.category.data,
+                                        period=form.period.data).first()
+        if budget is None:
+            budget = Budget(user_id=current_user.id, category=form.category.data,
+                            period=form.period.data)
+            db.session.add(budget)
+        budget.amount = form.amount.data
+        budget.alert_threshold = form.alert_percent.data / 100
+        db.session.commit()
+        
+        flash('Budget saved successfully!', 'success')
+        return redirect(url_for('budgets.list_budgets'))
+    
+    budgets = [(budget, spent, budget.state(spent))
+               for budget, spent in Budget.with_spend(current_user.id)]
+    return render_template('budgets/list.html', form=form, budgets=budgets)
+
+@budgets_bp.route('/delete/<int:id>', methods=['POST'])
+@login_required
+def delete_budget(id):
+    budget = Budget.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+    
+    db.session.delete(budget)
+    db.session.commit()
+    
+    flash('Budget deleted successfully!', 'success')
+    return redirect(url_for('budgets.list_budgets'))
@@ -3,6 +3,7 @@ from flask_login import current_user, login_required
 from datetime import datetime, timedelta
 from app.models.transaction import Transaction
 from app.models.user import User
+from app.utils.conditional import conditional, today
 
 main_bp = Blueprint('main', __name__)
 
@@ -14,6 +15,7 @@ def index():
 
 @main_bp.route('/dashboard')
 @login_required
+@conditional(today, html=True)
 def dashboard():
     # Calculate financial data
     now = datetime.utcnow()
@@ -1,14 +1,18 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from datetime import datetime
+from datetime import datetime, timedelta
 from app import db
 from app.models.transaction import Transaction
+from app.models.category_sketch import category_report
 from app.forms.transaction import TransactionForm, TransactionFilterForm
+from app.routes.budgets import flash_budget_alerts
+from app.utils.conditional import conditional, today
 
 transactions_bp = Blueprint('transactions', __name__)
 
 @transactions_bp.route('/')
 @login_required
+@conditional(today, html=True)
 def list_transactions():
     page = request.args.get('page', 1, type=int)
     per_page = 10
@@ -19,26 +23,15 @@ def list_transactions():
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     
-    # Base query
-    query = Transaction.query.filter_by(user_id=current_user.id)
-    
-    # Apply filters
-    if category and category != '':
-        query = query.filter_by(category=category)
-    
-    if transaction_type and transaction_type != '':
-        if transaction_type == 'income':
-            query = query.filter(Transaction.amount > 0)
-        else:
-            query = query.filter(Transaction.amount < 0)
-    
     if date_from:
         date_from = datetime.strptime(date_from, '%Y-%m-%d')
-        query = query.filter(Transaction.date >= date_from)
     
     if date_to:
         date_to = datetime.strptime(date_to, '%Y-%m-%d')
-        query = query.filter(Transaction.date <= date_to)
+    
+    query = Transaction.filtered(current_user.id, category=category,
+                                 transaction_type=transaction_type,
+                                 date_from=date_from, date_to=date_to)
     
     # Order by date (newest first)
     query = query.order_by(Transaction.date.desc())
@@ -49,7 +42,7 @@ def list_transactions():
     )
     
     # Create filter form
-    filter_form = TransactionFilterForm(data=request.args)
+    filter_form = TransactionFilterForm(formdata=request.args)
     
     return render_template('transactions/list.html', 
                          transactions=transactions, 
@@ -78,6 +71,7 @@ def add_transaction():
         db.session.commit()
         
         flash('Transaction added successfully!', 'success')
+        flash_budget_alerts(current_user.id, transaction.category)
         return redirect(url_for('transactions.list_transactions'))
     
     # Set default date to today
@@ -121,6 +115,7 @@ def edit_transaction(id):
         db.session.commit()
 
         flash('Transaction updated successfully!', 'success')
+        flash_budget_alerts(current_user.id, transaction.category)
         return redirect(url_for('transactions.list_transactions'))
 
     return render_template('transactions/edit.html', form=form, transaction=transaction)
@@ -138,6 +133,21 @@ def delete_transaction(id):
 
 @transactions_bp.route('/view/<int:id>')
 @login_required
+@conditional(today, html=True)
 def view_transaction(id):
     transaction = Transaction.query.filter_by(id=id, user_id=current_user.id).first_or_404()
     return render_template('transactions/view.html', transaction=transaction)
+
+@transactions_bp.route('/analytics')
+@login_required
+@conditional(today, html=True)
+def category_analytics():
+    try:
+        month = datetime.strptime(request.args.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        month = datetime.utcnow().date().replace(day=1)
+    previous_month = (month.replace(day=1) - timedelta(days=1)).replace(day=1)
+    next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return render_template('transactions/analytics.html', month=month,
+                           previous_month=previous_month, next_month=next_month,
+                           categories=category_report(current_user.id, month))
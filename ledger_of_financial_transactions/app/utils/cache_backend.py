@@ -0,0 +1,325 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from cachelib.serializers import SimpleSerializer
+from flask_caching.backends.base import BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL, -- 0 never expires
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries(accessed_at);
+
+CREATE TABLE IF NOT EXISTS cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO cache_stats (name) VALUES ('bytes'), ('hits'), ('misses'), ('evictions');
+
+-- Running byte total, so the budget check never has to sum the table.
+CREATE TRIGGER IF NOT EXISTS cache_entries_bytes_insert AFTER INSERT ON cache_entries
+BEGIN
+    UPDATE cache_stats SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_bytes_delete AFTER DELETE ON cache_entries
+BEGIN
+    UPDATE cache_stats SET value = value - OLD.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_bytes_update AFTER UPDATE OF size ON cache_entries
+BEGIN
+    UPDATE cache_stats SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+END;
+
+CREATE TABLE IF NOT EXISTS cache_leases (
+    key TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+'''
+
+UPSERT_SQL = '''
+INSERT INTO cache_entries (key, value, size, expires_at, accessed_at)
+VALUES (:key, :value, :size, :expires_at, :now)
+ON CONFLICT(key) DO UPDATE SET
+    value = excluded.value,
+    size = excluded.size,
+    expires_at = excluded.expires_at,
+    accessed_at = excluded.accessed_at
+'''
+
+
+class SQLiteCache(BaseCache):
+    """Cache shared by every worker on a host, stored in a SQLite WAL database.
+
+    The cache holds at most ``max_bytes`` of serialized values. Past that,
+    expired entries are removed first, then the least recently used ones.
+    Reads only refresh an entry's access time once per ``touch_interval``
+    seconds, so the recency order is approximate and most hits do not write.
+
+    Hit and miss counts are batched per worker into the ``cache_stats``
+    table; ``stats()`` reports them with the eviction count and byte total.
+
+    A cache is an optimisation: when the database fails (locked past
+    ``busy_timeout``, disk full, corrupt), reads are logged and answered as
+    misses and writes as not stored, instead of failing the request.
+
+    Enable with ``CACHE_TYPE = 'app.utils.cache_backend.SQLiteCache'``.
+    """
+
+    serializer = SimpleSerializer()
+
+    def __init__(self, path, default_timeout=300, max_bytes=64 * 1024 * 1024,
+                 touch_interval=30.0, lease_timeout=10.0, busy_timeout=5.0, stats_every=100,
+                 logger=None):
+        super().__init__(default_timeout)
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.touch_interval = float(touch_interval)
+        self.lease_timeout = float(lease_timeout)
+        self.busy_timeout = float(busy_timeout)
+        self.stats_every = int(stats_every)
+        self.logger = logger
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._pending = {'hits': 0, 'misses': 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(SCHEMA)
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        path = config.get('CACHE_SQLITE_PATH') or os.path.join(app.instance_path, 'cache.db')
+        kwargs.setdefault('max_bytes', config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        kwargs.setdefault('logger', app.logger)
+        return cls(path, *args, **kwargs)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                     isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @property
+    def _db(self):
+        # One connection per thread, reopened in forked workers.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _expiry(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._pending[name] += 1
+            if sum(self._pending.values()) < self.stats_every:
+                return
+            pending, self._pending = self._pending, {'hits': 0, 'misses': 0}
+        self._flush_stats(pending)
+
+    def _flush_stats(self, pending):
+        try:
+            self._db.executemany(
+                'UPDATE cache_stats SET value = value + ? WHERE name = ?',
+                [(count, name) for name, count in pending.items() if count]
+            )
+        except sqlite3.OperationalError:
+            # Counters are advisory; never fail a cache read over them.
+            pass
+
+    def _evict(self, db, now, keep):
+        """Bring the cache back under ``max_bytes``; called inside a write transaction."""
+        used = db.execute("SELECT value FROM cache_stats WHERE name = 'bytes'").fetchone()[0]
+        if used <= self.max_bytes:
+            return
+        db.execute('DELETE FROM cache_entries WHERE expires_at != 0 AND expires_at <= ?', (now,))
+        evicted = 0
+        while db.execute("SELECT value FROM cache_stats WHERE name = 'bytes'").fetchone()[0] > self.max_bytes:
+            cursor = db.execute(
+                '''DELETE FROM cache_entries WHERE key IN (
+                       SELECT key FROM cache_entries WHERE key != ?
+                       ORDER BY accessed_at LIMIT 32)''', (keep,))
+            if cursor.rowcount <= 0:
+                break
+            evicted += cursor.rowcount
+        if evicted:
+            db.execute("UPDATE cache_stats SET value = value + ? WHERE name = 'evictions'", (evicted,))
+
+    def _write(self, callback):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = callback(db, time.time())
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return result
+
+    def _failed(self, operation, key, error):
+        if self.logger is not None:
+            self.logger.warning(f'Cache {operation} of {key!r} failed: {error}')
+
+    def get(self, key):
+        now = time.time()
+        try:
+            row = self._db.execute(
+                'SELECT value, expires_at, accessed_at FROM cache_entries WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._failed('get', key, e)
+            return None
+        if row is None or (row[1] and row[1] <= now):
+            self._count('misses')
+            return None
+        if now - row[2] > self.touch_interval:
+            try:
+                self._db.execute('UPDATE cache_entries SET accessed_at = ? WHERE key = ?', (now, key))
+            except sqlite3.OperationalError:
+                pass
+        self._count('hits')
+        return self.serializer.loads(row[0])
+
+    def set(self, key, value, timeout=None):
+        data = self.serializer.dumps(value)
+        size = len(data) + len(key)
+        if size > self.max_bytes:
+            return False
+
+        def apply(db, now):
+            db.execute(UPSERT_SQL, {'key': key, 'value': data, 'size': size,
+                                    'expires_at': self._expiry(timeout), 'now': now})
+            self._evict(db, now, key)
+            return True
+        try:
+            return self._write(apply)
+        except sqlite3.Error as e:
+            self._failed('set', key, e)
+            return False
+
+    def add(self, key, value, timeout=None):
+        data = self.serializer.dumps(value)
+        size = len(data) + len(key)
+        if size > self.max_bytes:
+            return False
+
+        def apply(db, now):
+            cursor = db.execute(
+                UPSERT_SQL + ' WHERE cache_entries.expires_at != 0 AND cache_entries.expires_at <= :now',
+                {'key': key, 'value': data, 'size': size,
+                 'expires_at': self._expiry(timeout), 'now': now})
+            if cursor.rowcount <= 0:
+                return False
+            self._evict(db, now, key)
+            return True
+        try:
+            return self._write(apply)
+        except sqlite3.Error as e:
+            self._failed('add', key, e)
+            return False
+
+    def delete(self, key):
+        try:
+            return self._db.execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount > 0
+        except sqlite3.Error as e:
+            self._failed('delete', key, e)
+            return False
+
+    def has(self, key):
+        try:
+            return self._db.execute(
+                'SELECT 1 FROM cache_entries WHERE key = ? AND (expires_at = 0 OR expires_at > ?)',
+                (key, time.time())
+            ).fetchone() is not None
+        except sqlite3.Error as e:
+            self._failed('has', key, e)
+            return False
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache_entries')
+        return True
+
+    def inc(self, key, delta=1):
+        def apply(db, now):
+            row = db.execute(
+                'SELECT value FROM cache_entries WHERE key = ? AND (expires_at = 0 OR expires_at > ?)',
+                (key, now)
+            ).fetchone()
+            value = (self.serializer.loads(row[0]) if row else 0) + delta
+            data = self.serializer.dumps(value)
+            db.execute(UPSERT_SQL, {'key': key, 'value': data, 'size': len(data) + len(key),
+                                    'expires_at': self._expiry(None), 'now': now})
+            return value
+        return self._write(apply)
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+    def _acquire_lease(self, key, lease_timeout):
+        def apply(db, now):
+            cursor = db.execute(
+                '''INSERT INTO cache_leases (key, expires_at) VALUES (?, ?)
+                   ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at
+                   WHERE cache_leases.expires_at <= ?''',
+                (key, now + lease_timeout, now)
+            )
+            return cursor.rowcount == 1
+        return self._write(apply)
+
+    def get_or_set(self, key, callback, timeout=None, lease_timeout=None):
+        """Return the cached value, computing it with ``callback`` on a miss.
+
+        Only one worker recomputes a missing key at a time. The others poll
+        for its result for up to ``lease_timeout`` seconds, then compute the
+        value themselves.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        lease_timeout = self.lease_timeout if lease_timeout is None else lease_timeout
+        try:
+            leased = self._acquire_lease(key, lease_timeout)
+        except sqlite3.Error as e:
+            self._failed('lease', key, e)
+            return callback()
+        if leased:
+            try:
+                value = callback()
+                self.set(key, value, timeout)
+            finally:
+                try:
+                    self._db.execute('DELETE FROM cache_leases WHERE key = ?', (key,))
+                except sqlite3.Error as e:
+                    # The lease expires on its own after lease_timeout.
+                    self._failed('lease release', key, e)
+            return value
+
+        deadline = time.monotonic() + lease_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            if self.has(key):
+                value = self.get(key)
+                if value is not None:
+                    return value
+        return callback()
+
+    def stats(self):
+        """Shared hit, miss and eviction counters with the current footprint."""
+        with self._stats_lock:
+            pending, self._pending = self._pending, {'hits': 0, 'misses': 0}
+        self._flush_stats(pending)
+        stats = dict(self._db.execute('SELECT name, value FROM cache_stats').fetchall())
+        stats['entries'] = self._db.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else None
+        return stats
@@ -0,0 +1,201 @@
+import re
+import zlib
+
+from flask import g, request
+
+# Brotli and zstd are optional; without them responses fall back to gzip.
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ENCODED_ETAG = re.compile(r'-(br|zstd|gzip)(?="|$)')
+
+
+def _gzip(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _brotli(level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.flush, compressor.finish
+
+
+def _zstd(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return (compressor.compress,
+            lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush)
+
+
+def available_encodings():
+    """Supported content codings, most effective first."""
+    encodings = []
+    if brotli is not None:
+        encodings.append('br')
+    if zstandard is not None:
+        encodings.append('zstd')
+    encodings.append('gzip')
+    return encodings
+
+
+class Compressor:
+    """Negotiate, compress and cache response bodies.
+
+    Responses of a compressible mimetype and at least ``COMPRESS_MIN_SIZE``
+    bytes are encoded with the best coding the client accepts. Streamed
+    responses are encoded as they are produced and flushed every
+    ``COMPRESS_STREAM_FLUSH_SIZE`` bytes of input, so the client receives
+    them progressively without small chunks ruining the ratio.
+
+    A response with a strong ETag identifies its body, so its compressed
+    bytes are kept in the app cache under the ETag and the coding; the next
+    identical response skips the compression. HTML is never cached: pages
+    embed session state such as the CSRF token, which their tag may not
+    cover, and a cached body would hand one session's token to another. The coding is appended to the
+    ETag (``"tag-gzip"``) and stripped again from ``If-None-Match``, so
+    conditional requests keep matching the view's own tag.
+    """
+
+    FACTORIES = {'gzip': _gzip, 'br': _brotli, 'zstd': _zstd}
+
+    def __init__(self, app):
+        config = app.config
+        available = available_encodings()
+        self.encodings = [encoding for encoding in config.get('COMPRESS_ALGORITHMS', available)
+                          if encoding in available]
+        self.levels = {'gzip': 6, 'br': 4, 'zstd': 3, **config.get('COMPRESS_LEVELS', {})}
+        self.min_size = config.get('COMPRESS_MIN_SIZE', 1024)
+        self.mimetypes = set(config.get('COMPRESS_MIMETYPES', ()))
+        self.cache_timeout = config.get('COMPRESS_CACHE_TIMEOUT', 3600)
+        self.cache_max_size = config.get('COMPRESS_CACHE_MAX_SIZE', 4 * 1024 * 1024)
+        self.stream_flush_size = config.get('COMPRESS_STREAM_FLUSH_SIZE', 16 * 1024)
+        self.cache = None
+        if config.get('COMPRESS_CACHE', True):
+            from app.extensions import cache
+            self.cache = cache
+
+    def negotiate(self):
+        if not self.encodings:
+            return None
+        return request.accept_encodings.best_match(self.encodings)
+
+    def strip_etag_encoding(self):
+        """Match ``If-None-Match`` tags we encoded against the view's own tags."""
+        header = request.environ.get('HTTP_IF_NONE_MATCH')
+        if header and ENCODED_ETAG.search(header):
+            request.environ['HTTP_IF_NONE_MATCH'] = ENCODED_ETAG.sub('', header)
+            g._etag_encoding = self.negotiate()
+
+    def _cache_key(self, etag, encoding):
+        return f'compressed/{encoding}/{etag}'
+
+    def _cacheable_etag(self, response):
+        etag, weak = response.get_etag()
+        if (self.cache is None or not etag or weak or response.cache_control.no_store
+                or response.mimetype == 'text/html'):
+            return None
+        return etag
+
+    def _should_compress(self, response):
+        return (response.status_code == 200
+                and request.method != 'HEAD'
+                and response.mimetype in self.mimetypes
+                and 'Content-Encoding' not in response.headers
+                and not response.cache_control.no_transform
+                and (response.content_length is None or response.content_length >= self.min_size))
+
+    def _encode_etag(self, response, encoding):
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+
+    def compress(self, response):
+        if response.status_code == 304:
+            encoding = g.pop('_etag_encoding', None)
+            if encoding:
+                self._encode_etag(response, encoding)
+            return response
+        if response.mimetype in self.mimetypes:
+            response.vary.add('Accept-Encoding')
+        if not self._should_compress(response):
+            return response
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        etag = self._cacheable_etag(response)
+        key = self._cache_key(etag, encoding) if etag else None
+        # The backend itself, since streamed bodies finish outside the app context.
+        store = self.cache.cache if key else None
+        body = store.get(key) if key else None
+        if body is not None:
+            response.close()
+            response.direct_passthrough = False
+            response.set_data(body)
+        elif response.is_streamed:
+            response.direct_passthrough = False
+            response.response = self._stream(response.response, encoding, store, key)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            compress, _, finish = self.FACTORIES[encoding](self.levels[encoding])
+            body = compress(data) + finish()
+            if key and len(body) <= self.cache_max_size:
+                store.set(key, body, timeout=self.cache_timeout)
+            response.set_data(body)
+
+        response.headers['Content-Encoding'] = encoding
+        self._encode_etag(response, encoding)
+        return response
+
+    def _stream(self, chunks, encoding, store, key):
+        compress, flush, finish = self.FACTORIES[encoding](self.levels[encoding])
+        # Keep the output for the cache unless it grows past the size limit.
+        kept, size, pending = ([] if key else None), 0, 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                output = compress(chunk)
+                pending += len(chunk)
+                if pending >= self.stream_flush_size:
+                    output += flush()
+                    pending = 0
+                if not output:
+                    continue
+                if kept is not None:
+                    size += len(output)
+                    if size > self.cache_max_size:
+                        kept = None
+                    else:
+                        kept.append(output)
+                yield output
+            output = finish()
+            yield output
+            if kept is not None:
+                store.set(key, b''.join(kept) + output, timeout=self.cache_timeout)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+
+def init_app(app):
+    """Compress responses for clients that accept gzip, Brotli or zstd."""
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+    compressor = Compressor(app)
+    app.extensions['compressor'] = compressor
+    app.before_request(compressor.strip_etag_encoding)
+    app.after_request(compressor.compress)
@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import closing
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app.extensions import db
+from .performance import _gcd_connection
+
+POLL_BATCH = 1000
+# How long EventSource clients wait before reconnecting to an ended stream.
+RECONNECT_DELAY_MS = 3000
+
+
+class Subscription:
+    """A subscriber's bounded buffer of events.
+
+    When a slow client lets ``maxlen`` events pile up, the oldest are
+    dropped and the stream tells the client to resynchronise instead.
+    """
+
+    def __init__(self, hub, topics, maxlen):
+        self.hub = hub
+        self.topics = frozenset(topics)
+        self.events = deque(maxlen=maxlen)
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def put(self, event):
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self.condition.notify()
+
+    def get(self, timeout):
+        """Wait up to ``timeout`` seconds; returns ``(events, dropped)``."""
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """In-process pub/sub of ledger and house events for open streams.
+
+    One poller thread per worker reads new rows of the ledger change log
+    and, when ``GCD_DATABASE`` is set, new GCD transactions, their entries
+    and the audit events of their approval or dispute, then publishes them to the ``user:<id>`` and ``house:<id>``
+    topics. Writes made by any worker reach every worker's subscribers for
+    a few queries per interval, however many streams are open.
+
+    Only standard threading primitives are used, so the hub works under
+    gthread workers as well as gevent workers with monkey patching.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config.get('EVENTS_POLL_INTERVAL', 1.0)
+        self.buffer_size = app.config.get('EVENTS_BUFFER_SIZE', 100)
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._pid = None
+        self._positions = {}
+
+    def subscribe(self, topics):
+        subscription = Subscription(self, topics, self.buffer_size)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+        self._ensure_poller()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    @property
+    def depth(self):
+        """Events buffered for subscribers and not yet sent to their clients."""
+        with self._lock:
+            subscriptions = set().union(*self._subscribers.values())
+        return sum(len(subscription.events) for subscription in subscriptions)
+
+    def publish(self, topic, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def _ensure_poller(self):
+        # Threads do not survive a fork; each worker starts its own.
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._positions = {}
+        threading.Thread(target=self._run, name='event-hub', daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            if self._subscribers:
+                try:
+                    with self.app.app_context():
+                        self.poll()
+                except Exception as e:
+                    self.app.logger.warning(f'Event hub poll failed: {e}')
+            time.sleep(self.interval)
+
+    def poll(self):
+        """Publish rows added since the last poll; the first poll only records where to start."""
+        self._poll_ledger()
+        connection = _gcd_connection()
+        if connection is not None:
+            with closing(connection):
+                for name, source in GCD_SOURCES.items():
+                    self._poll_gcd(connection, name, *source)
+
+    def _poll_ledger(self):
+        from app.models.ledger_change import LedgerChange
+        changes = LedgerChange.__table__
+        position = self._positions.get('ledger')
+        if position is None:
+            self._positions['ledger'] = db.session.execute(select(func.max(changes.c.id))).scalar() or 0
+            return
+        rows = db.session.execute(
+            select(changes.c.id, changes.c.user_id, changes.c.transaction_id,
+                   changes.c.operation, changes.c.version)
+            .where(changes.c.id > position)
+            .order_by(changes.c.id)
+            .limit(POLL_BATCH)
+        ).all()
+        if rows:
+            self._positions['ledger'] = rows[-1].id
+        for row in rows:
+            self.publish(f'user:{row.user_id}', {
+                'event': 'ledger', 'id': f'ledger-{row.id}',
+                'data': {'transaction_id': row.transaction_id, 'operation': row.operation,
+                         'version': row.version},
+            })
+
+    def _poll_gcd(self, connection, name, table, query, match=None):
+        position = self._positions.get(name)
+        if position is None:
+            self._positions[name] = connection.execute(
+                f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+            return
+        rows = connection.execute(query, (position, POLL_BATCH)).fetchall()
+        if rows:
+            self._positions[name] = rows[-1]['id']
+        for row in rows:
+            if match is None or match(row):
+                self.publish(f"house:{row['house_id']}", {
+                    'event': name, 'id': f"{name}-{row['id']}", 'data': dict(row),
+                })
+
+
+# GCD tables polled for house events: (table, query, optional row filter).
+GCD_SOURCES = {
+    'house_transaction': (
+        'transactions',
+        '''SELECT id, house_id, description, amount, currency, status, transaction_type,
+                  created_by, transaction_date
+           FROM transactions WHERE id > ? ORDER BY id LIMIT ?''',
+    ),
+    'house_entry': (
+        'transaction_entries',
+        '''SELECT e.id, t.house_id, e.transaction_id, e.account_id, e.amount,
+                  e.entry_type, e.description, e.created_at
+           FROM transaction_entries AS e JOIN transactions AS t ON t.id = e.transaction_id
+           WHERE e.id > ? ORDER BY e.id LIMIT ?''',
+    ),
+    # Approvals, rejections and disputes of existing transactions.
+    'house_transaction_update': (
+        'audit_log',
+        '''SELECT id, event_type, house_id, user_id, target_type, target_id AS transaction_id,
+                  new_values, created_at
+           FROM audit_log WHERE id > ? ORDER BY id LIMIT ?''',
+        lambda row: (row['house_id'] is not None and row['target_type'] == 'transaction'
+                     and row['event_type'] != 'transaction_created'),
+    ),
+}
+
+
+def format_event(event):
+    """Serialise an event in the ``text/event-stream`` format."""
+    data = json.dumps(event['data'], default=str)
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+def stream(subscription, heartbeat, max_seconds):
+    """Yield a subscription's events until the client leaves or ``max_seconds`` pass.
+
+    A comment line goes out every ``heartbeat`` seconds without events, so
+    proxies keep the connection open and a vanished client is noticed on
+    the next write. Clients reconnect on their own when the stream ends.
+    """
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f'retry: {RECONNECT_DELAY_MS}\n\n'
+        while time.monotonic() < deadline:
+            events, dropped = subscription.get(heartbeat)
+            if dropped:
+                yield f'event: resync\ndata: {json.dumps({"dropped": dropped})}\n\n'
+            for event in events:
+                yield format_event(event)
+            if not events and not dropped:
+                yield ': heartbeat\n\n'
+    finally:
+        subscription.close()
+
+
+def house_ids_for(email):
+    """Ids of the GCD houses the user with ``email`` is an active member of."""
+    connection = _gcd_connection()
+    if connection is None or not email:
+        return set()
+    with closing(connection):
+        return {row[0] for row in connection.execute(
+            '''SELECT m.house_id FROM house_members AS m JOIN users AS u ON u.id = m.user_id
+               WHERE u.email = ? AND m.status = 'active' ''', (email,)
+        )}
+
+
+def get_hub(app=None):
+    app = app or current_app
+    return app.extensions['event_hub']
+
+
+def init_app(app):
+    hub = app.extensions['event_hub'] = EventHub(app)
+    app.extensions.setdefault('background_queues', {})['events'] = hub
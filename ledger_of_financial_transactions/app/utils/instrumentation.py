@@ -0,0 +1,212 @@
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_WHITESPACE = re.compile(r'\s+')
+_engine_hooks_installed = False
+
+
+class RequestStats:
+    """Timings collected while serving one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_time = 0.0
+        self.statements = Counter()
+        self.template_count = 0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._template_starts = []
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Render the stats as a ``Server-Timing`` header value."""
+        return ', '.join([
+            f'db;dur={self.query_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f};desc="{self.template_count} templates"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'total;dur={self.elapsed * 1000:.1f}',
+        ])
+
+
+class QueryLog:
+    """Per-process totals for each distinct SQL statement, for the admin console.
+
+    Only the statement text is kept, never its parameters. Once ``limit``
+    statements are tracked, the one with the least total time is dropped to
+    make room.
+    """
+
+    def __init__(self, limit=200):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, statement, duration):
+        query_id = hashlib.sha1(statement.encode('utf-8')).hexdigest()[:12]
+        with self._lock:
+            entry = self._entries.get(query_id)
+            if entry is None:
+                if len(self._entries) >= self.limit:
+                    cheapest = min(self._entries, key=lambda key: self._entries[key]['total'])
+                    del self._entries[cheapest]
+                entry = self._entries[query_id] = {
+                    'id': query_id, 'statement': statement, 'count': 0, 'total': 0.0, 'max': 0.0}
+            entry['count'] += 1
+            entry['total'] += duration
+            entry['max'] = max(entry['max'], duration)
+
+    def get(self, query_id):
+        with self._lock:
+            entry = self._entries.get(query_id)
+            return dict(entry) if entry else None
+
+    def slowest(self, limit=20):
+        """Statements ordered by total time spent in them."""
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        entries.sort(key=lambda entry: entry['total'], reverse=True)
+        return entries[:limit]
+
+
+query_log = QueryLog()
+
+
+def get_request_stats():
+    """Return the stats of the current request, or None if it is not being measured."""
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_starts', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['_query_starts'].pop()
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    query_log.record(statement, duration)
+    stats = get_request_stats()
+    if stats is not None:
+        stats.query_count += 1
+        stats.query_time += duration
+        stats.statements[statement] += 1
+
+
+def _handle_error(context):
+    # after_cursor_execute does not fire for a failed statement.
+    if context.connection is not None and context.connection.info.get('_query_starts'):
+        context.connection.info['_query_starts'].pop()
+
+
+def _install_engine_hooks():
+    """Listen on every engine once per process, whichever app created it."""
+    global _engine_hooks_installed
+    if not _engine_hooks_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _engine_hooks_installed = True
+
+
+def _template_started(app, template, context, **extra):
+    stats = get_request_stats()
+    if stats is not None:
+        stats._template_starts.append(time.perf_counter())
+
+
+def _template_finished(app, template, context, **extra):
+    stats = get_request_stats()
+    if stats is not None and stats._template_starts:
+        stats.template_count += 1
+        stats.template_time += time.perf_counter() - stats._template_starts.pop()
+
+
+def _instrument_cache(app):
+    """Count hits and misses on the Flask-Caching backends of ``app``."""
+    for backend in app.extensions.get('cache', {}).values():
+        if getattr(backend, '_instrumented', False):
+            continue
+        lookup = backend.get
+
+        def counted_get(key, _lookup=lookup):
+            value = _lookup(key)
+            stats = get_request_stats()
+            if stats is not None:
+                if value is None:
+                    stats.cache_misses += 1
+                else:
+                    stats.cache_hits += 1
+            return value
+
+        backend.get = counted_get
+        backend._instrumented = True
+
+
+def init_app(app):
+    """Measure every request and report it in a ``Server-Timing`` header.
+
+    The header goes out only with ``PERF_SERVER_TIMING``, which production
+    leaves off: it tells anyone how many queries a page ran.
+
+    Requests issuing more than ``PERF_QUERY_BUDGET`` queries, repeating one
+    statement ``PERF_N_PLUS_ONE_THRESHOLD`` times or taking longer than
+    ``PERF_SLOW_REQUEST_MS`` are logged as warnings.
+    """
+    if not app.config.get('PERF_INSTRUMENTATION', True):
+        return
+
+    query_log.limit = app.config.get('PERF_QUERY_LOG_SIZE', 200)
+    _install_engine_hooks()
+    _instrument_cache(app)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+    query_budget = app.config.get('PERF_QUERY_BUDGET', 20)
+    repeat_threshold = app.config.get('PERF_N_PLUS_ONE_THRESHOLD', 5)
+    slow_ms = app.config.get('PERF_SLOW_REQUEST_MS', 500)
+
+    @app.before_request
+    def start_request_stats():
+        g._request_stats = RequestStats()
+
+    @app.after_request
+    def report_request_stats(response):
+        stats = get_request_stats()
+        if stats is None:
+            return response
+        if app.config.get('PERF_SERVER_TIMING', True):
+            response.headers['Server-Timing'] = stats.server_timing()
+
+        endpoint = request.endpoint or request.path
+        if stats.query_count > query_budget:
+            app.logger.warning(
+                f'{endpoint} issued {stats.query_count} queries (budget {query_budget})',
+                extra={'endpoint': endpoint, 'query_count': stats.query_count}
+            )
+        for statement, count in stats.statements.most_common():
+            if count < repeat_threshold:
+                break
+            app.logger.warning(
+                f'Possible N+1 in {endpoint}: statement ran {count} times: {statement[:200]}',
+                extra={'endpoint': endpoint, 'repeat_count': count}
+            )
+        elapsed_ms = stats.elapsed * 1000
+        if elapsed_ms > slow_ms:
+            app.logger.warning(
+                f'{endpoint} took {elapsed_ms:.0f}ms',
+                extra={'endpoint': endpoint, 'duration_ms': round(elapsed_ms, 1)}
+            )
+        return response
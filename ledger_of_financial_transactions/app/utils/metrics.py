@@ -0,0 +1,329 @@
+import atexit
+import glob
+import json
+import os
+import resource
+import threading
+import time
+
+from flask import current_app, request
+
+from .instrumentation import get_request_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests served, by endpoint, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.'),
+    'db_queries_total': ('counter', 'SQL statements executed while serving requests.'),
+    'db_query_seconds_total': ('counter', 'Time spent in SQL while serving requests.'),
+    'cache_requests_total': ('counter', 'Cache lookups by result.'),
+    'db_pool_checked_out': ('gauge', 'Connections currently checked out of the pool.'),
+    'db_pool_size': ('gauge', 'Configured size of the connection pool.'),
+    'background_queue_depth': ('gauge', 'Items waiting in background work queues.'),
+    'process_resident_memory_bytes': ('gauge', 'Resident memory of the worker.'),
+    'cache_bytes': ('gauge', 'Bytes held by the shared cache.'),
+    'cache_evictions': ('gauge', 'Entries evicted from the shared cache to stay in budget.'),
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _process_memory():
+    """Resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # ru_maxrss is the peak, in kilobytes, where /proc is unavailable.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms shared by every worker of a deployment.
+
+    Each worker keeps its own values in memory and periodically writes them
+    to ``metrics-<pid>.json`` in a shared directory. Collecting reads every
+    worker's file and sums the counters and histograms. Gauges are reported
+    per worker, and only for workers that are still running.
+    """
+
+    def __init__(self, directory, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauge_callbacks = []
+        self._last_flush = 0.0
+        self._pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _check_fork(self):
+        # A forked worker starts from its parent's values; count from zero.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._counters = {}
+            self._histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._check_fork()
+            key = (name, _labels_key(labels))
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        with self._lock:
+            self._check_fork()
+            key = (name, _labels_key(labels))
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = {
+                    'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(entry['buckets']):
+                if value <= bound:
+                    entry['counts'][i] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def register_gauge(self, name, callback):
+        """Read ``callback()`` at flush time; it returns ``[(labels, value), ...]``."""
+        self._gauge_callbacks.append((name, callback))
+
+    def _read_gauges(self):
+        gauges = []
+        for name, callback in self._gauge_callbacks:
+            try:
+                samples = callback()
+            except Exception:
+                continue
+            for labels, value in samples:
+                if value is not None:
+                    gauges.append([name, dict(labels, pid=str(os.getpid())), value])
+        return gauges
+
+    def flush(self, force=False):
+        """Write this worker's snapshot if the flush interval has passed."""
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        with self._lock:
+            self._check_fork()
+            snapshot = {
+                'pid': self._pid,
+                'written_at': time.time(),
+                'counters': [[name, dict(labels), value]
+                             for (name, labels), value in self._counters.items()],
+                'histograms': [[name, dict(labels), entry]
+                               for (name, labels), entry in self._histograms.items()],
+            }
+            self._last_flush = now
+        snapshot['gauges'] = self._read_gauges()
+
+        path = os.path.join(self.directory, f'metrics-{snapshot["pid"]}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump(snapshot, handle)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Merge the snapshots of every worker into one view."""
+        self.flush(force=True)
+        counters, histograms, gauges = {}, {}, []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in snapshot['counters']:
+                key = (name, _labels_key(labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, entry in snapshot['histograms']:
+                key = (name, _labels_key(labels))
+                merged = histograms.setdefault(key, {
+                    'buckets': entry['buckets'], 'counts': [0] * len(entry['buckets']),
+                    'sum': 0.0, 'count': 0})
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], entry['counts'])]
+                merged['sum'] += entry['sum']
+                merged['count'] += entry['count']
+            if _pid_alive(snapshot['pid']):
+                gauges.extend(snapshot['gauges'])
+        return counters, histograms, gauges
+
+    def render_prometheus(self):
+        """Collected metrics in the Prometheus text exposition format."""
+        counters, histograms, gauges = self.collect()
+
+        def fmt(labels):
+            if not labels:
+                return ''
+            pairs = ','.join(
+                '{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+                for k, v in labels)
+            return '{' + pairs + '}'
+
+        families = {}
+        for (name, labels), value in sorted(counters.items()):
+            families.setdefault(name, []).append(f'{name}{fmt(labels)} {value}')
+        for (name, labels), entry in sorted(histograms.items()):
+            lines = families.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(entry['buckets'], entry['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{fmt(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{fmt(labels + (("le", "+Inf"),))} {entry["count"]}')
+            lines.append(f'{name}_sum{fmt(labels)} {entry["sum"]}')
+            lines.append(f'{name}_count{fmt(labels)} {entry["count"]}')
+        for name, labels, value in gauges:
+            families.setdefault(name, []).append(f'{name}{fmt(_labels_key(labels))} {value}')
+
+        output = []
+        for name in sorted(families):
+            kind, description = HELP.get(name, ('untyped', name))
+            output.append(f'# HELP {name} {description}')
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(families[name])
+        return '\n'.join(output) + '\n'
+
+    def render_json(self):
+        """Collected metrics summarised for dashboards and capacity planning."""
+        counters, histograms, gauges = self.collect()
+        endpoints = {}
+        for (name, labels), entry in histograms.items():
+            if name != 'http_request_duration_seconds':
+                continue
+            endpoint = dict(labels).get('endpoint')
+            endpoints[endpoint] = {
+                'requests': entry['count'],
+                'mean_seconds': entry['sum'] / entry['count'] if entry['count'] else 0.0,
+                'p95_seconds': _histogram_quantile(entry, 0.95),
+            }
+        for (name, labels), value in counters.items():
+            endpoint = dict(labels).get('endpoint')
+            if endpoint in endpoints and name in ('db_queries_total', 'db_query_seconds_total'):
+                endpoints[endpoint][name] = value
+
+        hits = sum(v for (n, l), v in counters.items()
+                   if n == 'cache_requests_total' and dict(l).get('result') == 'hit')
+        misses = sum(v for (n, l), v in counters.items()
+                     if n == 'cache_requests_total' and dict(l).get('result') == 'miss')
+        workers = {}
+        for name, labels, value in gauges:
+            worker = workers.setdefault(labels['pid'], {})
+            extra = {k: v for k, v in labels.items() if k != 'pid'}
+            key = name if not extra else f"{name}:{','.join(str(v) for v in extra.values())}"
+            worker[key] = value
+        return {
+            'endpoints': endpoints,
+            'cache': {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': hits / (hits + misses) if hits + misses else None,
+            },
+            'workers': workers,
+        }
+
+
+def _histogram_quantile(entry, quantile):
+    """Upper bucket bound below which ``quantile`` of observations fall."""
+    if not entry['count']:
+        return None
+    target = quantile * entry['count']
+    cumulative = 0
+    for bound, count in zip(entry['buckets'], entry['counts']):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float('inf')
+
+
+def get_metrics(app=None):
+    """Return the registry of ``app`` (the current app by default)."""
+    app = app or current_app
+    return app.extensions['metrics']
+
+
+def _pool_gauges(app, name):
+    def read():
+        from app.extensions import db
+        with app.app_context():
+            pool = db.engine.pool
+        method = getattr(pool, 'checkedout' if name == 'db_pool_checked_out' else 'size', None)
+        return [({}, method())] if method else []
+    return read
+
+
+def _queue_gauges(app):
+    def read():
+        samples = []
+        listener = app.extensions.get('log_listener')
+        if listener is not None:
+            samples.append(({'queue': 'logging'}, listener.queue.qsize()))
+        for name, worker in app.extensions.get('background_queues', {}).items():
+            samples.append(({'queue': name}, worker.depth))
+        return samples
+    return read
+
+
+def _cache_gauges(app, field):
+    def read():
+        return [({}, backend.stats()[field])
+                for backend in app.extensions.get('cache', {}).values()
+                if hasattr(backend, 'stats')]
+    return read
+
+
+def init_app(app):
+    """Create the registry and record every request into it.
+
+    Request figures come from the instrumentation stats, so this must run
+    after ``instrumentation.init_app``. Snapshots go to ``METRICS_DIR``
+    (default ``<instance>/metrics``), which must be shared by all workers of
+    one deployment and cleared on deploy. Background workers can report
+    their queue depth by adding an object with a ``depth`` attribute to
+    ``app.extensions['background_queues']``.
+    """
+    directory = app.config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+    registry = MetricsRegistry(directory, app.config.get('METRICS_FLUSH_INTERVAL', 5.0))
+    app.extensions['metrics'] = registry
+
+    registry.register_gauge('process_resident_memory_bytes', lambda: [({}, _process_memory())])
+    registry.register_gauge('db_pool_checked_out', _pool_gauges(app, 'db_pool_checked_out'))
+    registry.register_gauge('db_pool_size', _pool_gauges(app, 'db_pool_size'))
+    registry.register_gauge('background_queue_depth', _queue_gauges(app))
+    registry.register_gauge('cache_bytes', _cache_gauges(app, 'bytes'))
+    registry.register_gauge('cache_evictions', _cache_gauges(app, 'evictions'))
+    atexit.register(registry.flush, True)
+
+    @app.after_request
+    def record_request_metrics(response):
+        stats = get_request_stats()
+        if stats is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        registry.observe('http_request_duration_seconds', stats.elapsed, endpoint=endpoint)
+        registry.inc('http_requests_total', endpoint=endpoint, method=request.method,
+                     status=str(response.status_code))
+        if stats.query_count:
+            registry.inc('db_queries_total', stats.query_count, endpoint=endpoint)
+            registry.inc('db_query_seconds_total', stats.query_time, endpoint=endpoint)
+        if stats.cache_hits:
+            registry.inc('cache_requests_total', stats.cache_hits, result='hit')
+        if stats.cache_misses:
+            registry.inc('cache_requests_total', stats.cache_misses, result='miss')
+        registry.flush()
+        return response
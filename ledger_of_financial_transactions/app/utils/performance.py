@@ -0,0 +1,159 @@
+import re
+import sqlite3
+from contextlib import closing
+
+from flask import current_app
+
+from app.extensions import db
+from .instrumentation import query_log
+
+_NAMED_PARAM = {
+    'named': re.compile(r'(?<!:):(\w+)'),
+    'pyformat': re.compile(r'%\((\w+)\)s'),
+}
+
+
+def _rows(sql, **params):
+    return [dict(row._mapping) for row in db.session.execute(db.text(sql), params)]
+
+
+def table_stats():
+    """Row counts and sizes per table, from the database's own statistics.
+
+    SQLite figures come from ``sqlite_stat1`` (and ``dbstat`` when compiled
+    in), so they are only as fresh as the last ``ANALYZE``.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        tables = {name: {'table': name, 'rows': None, 'bytes': None} for (name,) in db.session.execute(
+            db.text("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"))}
+        try:
+            # The first figure of every sqlite_stat1 entry is the table's row count.
+            for row in _rows('SELECT tbl, stat FROM sqlite_stat1'):
+                if row['tbl'] in tables:
+                    tables[row['tbl']]['rows'] = int(row['stat'].split()[0])
+        except Exception:
+            db.session.rollback()
+        try:
+            for row in _rows('SELECT name, SUM(pgsize) AS size FROM dbstat GROUP BY name'):
+                if row['name'] in tables:
+                    tables[row['name']]['bytes'] = row['size']
+        except Exception:
+            db.session.rollback()
+        return sorted(tables.values(), key=lambda t: t['rows'] or 0, reverse=True)
+    if dialect == 'postgresql':
+        return _rows('''SELECT relname AS "table", n_live_tup AS rows,
+                               pg_total_relation_size(relid) AS bytes,
+                               seq_scan, idx_scan
+                        FROM pg_stat_user_tables ORDER BY bytes DESC''')
+    if dialect == 'mysql':
+        return _rows('''SELECT table_name AS `table`, table_rows AS `rows`,
+                               data_length + index_length AS bytes
+                        FROM information_schema.tables
+                        WHERE table_schema = DATABASE() ORDER BY bytes DESC''')
+    return []
+
+
+def index_stats():
+    """Per-index selectivity (SQLite) or scan counts (PostgreSQL)."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        try:
+            return _rows('''SELECT s.idx AS "index", s.tbl AS "table", s.stat
+                            FROM sqlite_stat1 AS s
+                            JOIN sqlite_master AS m ON m.type = 'index' AND m.name = s.idx
+                            ORDER BY s.tbl, s.idx''')
+        except Exception:
+            db.session.rollback()
+            return []
+    if dialect == 'postgresql':
+        return _rows('''SELECT indexrelname AS "index", relname AS "table", idx_scan,
+                               pg_relation_size(indexrelid) AS bytes
+                        FROM pg_stat_user_indexes ORDER BY idx_scan ASC''')
+    return []
+
+
+def explain_query(query_id):
+    """Return the plan of a statement the app has recorded, or None if unknown.
+
+    Only SELECT statements from the query log are accepted, so the console
+    cannot be used to run arbitrary SQL. Parameters are bound as NULL; the
+    plan depends on the statement's shape, not its values.
+    """
+    entry = query_log.get(query_id)
+    if entry is None or not entry['statement'].lstrip().upper().startswith('SELECT'):
+        return None
+
+    dialect = db.engine.dialect
+    statement = entry['statement']
+    if dialect.paramstyle in _NAMED_PARAM:
+        params = {name: None for name in _NAMED_PARAM[dialect.paramstyle].findall(statement)}
+    elif dialect.paramstyle == 'qmark':
+        params = (None,) * statement.count('?')
+    else:
+        params = (None,) * statement.count('%s')
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+
+    result = db.session.connection().exec_driver_sql(prefix + statement, params)
+    plan = {'columns': list(result.keys()), 'rows': [tuple(row) for row in result]}
+    db.session.rollback()
+    return dict(entry, plan=plan)
+
+
+def cache_backend_stats():
+    """Counters of the shared cache backend, or None for backends without them."""
+    for backend in current_app.extensions.get('cache', {}).values():
+        if hasattr(backend, 'stats'):
+            return backend.stats()
+    return None
+
+
+def _gcd_connection():
+    path = current_app.config.get('GCD_DATABASE')
+    if not path:
+        return None
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def top_houses(limit=10):
+    """GCD houses ranked by the rows they own, when ``GCD_DATABASE`` is set."""
+    connection = _gcd_connection()
+    if connection is None:
+        return []
+    with closing(connection):
+        return [dict(row) for row in connection.execute(
+            '''SELECT h.id, h.name,
+                      (SELECT COUNT(*) FROM house_members WHERE house_id = h.id) AS members,
+                      (SELECT COUNT(*) FROM accounts WHERE house_id = h.id) AS accounts,
+                      (SELECT COUNT(*) FROM transactions WHERE house_id = h.id) AS transactions,
+                      (SELECT COUNT(*) FROM assets WHERE owner_house_id = h.id) AS assets,
+                      (SELECT COUNT(*) FROM audit_log WHERE house_id = h.id) AS audit_events
+               FROM houses AS h
+               ORDER BY members + accounts + transactions + assets + audit_events DESC
+               LIMIT ?''', (limit,)
+        )]
+
+
+def background_jobs():
+    """Queue depths in this worker plus the GCD job locks, if configured."""
+    app = current_app._get_current_object()
+    jobs = []
+    listener = app.extensions.get('log_listener')
+    if listener is not None:
+        from .logger import NonBlockingQueueHandler
+        jobs.append({'name': 'logging', 'depth': listener.queue.qsize(),
+                     'detail': f'{NonBlockingQueueHandler.dropped} records dropped'})
+    for name, worker in app.extensions.get('background_queues', {}).items():
+        jobs.append({'name': name, 'depth': worker.depth, 'detail': ''})
+
+    connection = _gcd_connection()
+    if connection is not None:
+        with closing(connection):
+            for row in connection.execute(
+                    'SELECT name, owner, acquired_at, expires_at FROM job_locks ORDER BY name'):
+                jobs.append({'name': row['name'], 'depth': None,
+                             'detail': f"last run {row['acquired_at']} by {row['owner']}, "
+                                       f"next after {row['expires_at']}"})
+    return jobs
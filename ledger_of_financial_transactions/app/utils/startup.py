@@ -0,0 +1,58 @@
+import importlib
+import os
+import weakref
+
+from app.extensions import db
+from .logger import restart_listener
+
+# Modules the request path imports lazily; preloading them before the fork
+# lets every worker share the pages.
+DEFERRED_IMPORTS = ('babel.core', 'babel.dates', 'babel.numbers', 'pytz')
+
+_apps = weakref.WeakSet()
+_fork_hook_registered = False
+
+
+def reset_after_fork(app):
+    """Drop state a forked worker must not share with its parent.
+
+    Pooled database connections belong to the parent process, and the log
+    listener thread did not survive the fork. The SQLite cache, rate limit
+    storage and metrics registry reopen their handles by pid on their own.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        read_pool = app.extensions.get('read_pool')
+        if read_pool is not None:
+            read_pool.reset()
+    restart_listener(app)
+
+
+def _after_fork_in_child():
+    for app in list(_apps):
+        reset_after_fork(app)
+
+
+def warm_up(app):
+    """Import deferred modules and compile every template.
+
+    Call this in the parent process when workers are forked from a preloaded
+    app (``gunicorn --preload``), so that the work is done once.
+    """
+    for module in DEFERRED_IMPORTS:
+        importlib.import_module(module)
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+        except Exception as e:
+            app.logger.warning(f'Template {name} failed to compile: {e}')
+
+
+def init_app(app):
+    """Reset per-process state in workers forked from this app."""
+    global _fork_hook_registered
+    _apps.add(app)
+    if not _fork_hook_registered and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_after_fork_in_child)
+        _fork_hook_registered = True
@@ -36,6 +36,100 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD', '')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@example.com')
 
+    # Rate limiting, shared by every worker on the host through a SQLite WAL file
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI') or \
+        f'sqlite:///{(basedir / "instance" / "ratelimit.db").as_posix()}'
+    RATELIMIT_STRATEGY = 'sliding-window-counter'
+    RATELIMIT_STORAGE_OPTIONS = {'max_keys': 100000}
+
+    # Extensions imported and initialised on first use instead of at boot
+    LAZY_EXTENSIONS = ['mail', 'migrate', 'babel']
+
+    # JSON API: read-only pool for dashboard widgets (defaults to the main
+    # database) and the size limit of bulk transaction requests
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('READ_DATABASE_URL')
+    READ_POOL_WORKERS = int(os.environ.get('READ_POOL_WORKERS', '4'))
+    API_MAX_BULK_ITEMS = 1000
+
+    # Conditional GET: ETags from each user's ledger version; change
+    # ETAG_SALT on deploys that change the markup of cached pages
+    CONDITIONAL_GET = True
+    ETAG_SALT = os.environ.get('ETAG_SALT', '')
+
+    # Delta sync: days tombstones stay in the change log before
+    # `flask compact-ledger-changes` drops them
+    LEDGER_CHANGES_RETENTION_DAYS = int(os.environ.get('LEDGER_CHANGES_RETENTION_DAYS', '90'))
+    # Hours an offline upload's operation keys are remembered, so that
+    # re-sent batches are not applied twice
+    IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', '72'))
+
+    # Recurring transactions: schedules posted per database transaction by
+    # `flask materialize-recurring`, and occurrences caught up per schedule
+    # and run after missed nights
+    RECURRING_BATCH_SIZE = int(os.environ.get('RECURRING_BATCH_SIZE', '500'))
+    RECURRING_MAX_CATCH_UP = int(os.environ.get('RECURRING_MAX_CATCH_UP', '366'))
+
+    # Event streams: seconds between change-log polls, events buffered per
+    # client, heartbeat interval and how long one stream stays open
+    EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', '1.0'))
+    EVENTS_BUFFER_SIZE = 100
+    EVENTS_HEARTBEAT = 15
+    EVENTS_MAX_STREAM_SECONDS = 300
+
+    # Caching, shared by every worker on the host through a SQLite WAL file
+    CACHE_TYPE = 'app.utils.cache_backend.SQLiteCache'
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH')
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    CACHE_DEFAULT_TIMEOUT = 300
+
+    # Templates: compiled bytecode shared by workers, cached transaction rows
+    JINJA_BYTECODE_CACHE = True
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+    FRAGMENT_CACHE = True
+    FRAGMENT_CACHE_TIMEOUT = 3600
+
+    # Response compression: the best of COMPRESS_ALGORITHMS the client
+    # accepts (Brotli and zstd when installed), with encoded bodies of
+    # ETagged responses kept in the cache
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_MIMETYPES = ['text/html', 'text/css', 'text/plain', 'text/csv', 'text/xml',
+                          'text/javascript', 'application/javascript', 'application/json',
+                          'application/xml', 'image/svg+xml']
+    COMPRESS_ALGORITHMS = ['br', 'zstd', 'gzip']
+    COMPRESS_LEVELS = {'gzip': 6, 'br': 4, 'zstd': 3}
+    COMPRESS_CACHE = True
+    COMPRESS_CACHE_TIMEOUT = 3600
+    COMPRESS_CACHE_MAX_SIZE = 4 * 1024 * 1024
+    COMPRESS_STREAM_FLUSH_SIZE = 16 * 1024
+
+    # Logging: size rotation by default, or LOG_ROTATION=time for daily files
+    LOG_DIR = os.environ.get('LOG_DIR')
+    LOG_ROTATION = os.environ.get('LOG_ROTATION', 'size')
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', '10'))
+    LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN', 'midnight')
+    LOG_QUEUE_SIZE = 10000
+    LOG_SAMPLE_RATES = {'DEBUG': float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0'))}
+
+    # Request instrumentation (Server-Timing headers and query budgets)
+    PERF_INSTRUMENTATION = True
+    PERF_QUERY_BUDGET = int(os.environ.get('PERF_QUERY_BUDGET', '20'))
+    PERF_N_PLUS_ONE_THRESHOLD = 5
+    PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS', '500'))
+    PERF_QUERY_LOG_SIZE = 200
+    PERF_SERVER_TIMING = True
+
+    # Metrics; METRICS_DIR must be shared by every worker of a deployment
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Refuse metrics without METRICS_TOKEN to anyone but admins
+    METRICS_REQUIRE_TOKEN = False
+    METRICS_FLUSH_INTERVAL = 5.0
+
+    # Admin console: GCD sqlite database to report houses and job locks from
+    GCD_DATABASE = os.environ.get('GCD_DATABASE')
+
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_ECHO = True
@@ -46,12 +140,20 @@ class TestingConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATELIMIT_STORAGE_URI = 'memory://'
+    RATELIMIT_STORAGE_OPTIONS = {}
+    CACHE_TYPE = 'SimpleCache'
+    JINJA_BYTECODE_CACHE = False
 
 class ProductionConfig(Config):
-    pass
+    # Timings reveal query counts and cache hits; opt in with PERF_SERVER_TIMING=1
+    PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', '0').lower() in ['1', 'true', 'on']
+    METRICS_REQUIRE_TOKEN = True
 
 class PythonAnywhereConfig(Config):
     DEBUG = False
+    PERF_SERVER_TIMING = ProductionConfig.PERF_SERVER_TIMING
+    METRICS_REQUIRE_TOKEN = True
     # PythonAnywhere MySQL database
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'mysql+mysqlconnector://{username}:{password}@{hostname}/{databasename}'.format(
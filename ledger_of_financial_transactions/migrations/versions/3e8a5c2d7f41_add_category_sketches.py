@@ -0,0 +1,61 @@
+"""Add category_sketches
+
+Revision ID: 3e8a5c2d7f41
+Revises: 9b4e1c7d3f26
+Create Date: 2026-10-19 23:40:00.000000
+
+"""
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.sketches import HyperLogLog, QuantileSketch, merchant_key
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8a5c2d7f41'
+down_revision = '9b4e1c7d3f26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    category_sketches = op.create_table('category_sketches',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('sizes', sa.Text(), nullable=False),
+    sa.Column('merchants', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'category', 'month')
+    )
+
+    # Sketch the existing expenses.
+    sketches = defaultdict(lambda: [QuantileSketch(), HyperLogLog(), 0, 0.0])
+    transactions = sa.table('transactions', sa.column('user_id'), sa.column('category'),
+                            sa.column('date', sa.DateTime()), sa.column('amount'),
+                            sa.column('description'))
+    rows = op.get_bind().execute(
+        sa.select(transactions.c.user_id, transactions.c.category, transactions.c.date,
+                  transactions.c.amount, transactions.c.description)
+        .where(transactions.c.amount < 0))
+    for user_id, category, day, amount, description in rows:
+        sketch = sketches[(user_id, category, day.date().replace(day=1))]
+        sketch[0].add(-amount)
+        if merchant_key(description):
+            sketch[1].add(merchant_key(description))
+        sketch[2] += 1
+        sketch[3] -= amount
+    if sketches:
+        op.bulk_insert(category_sketches, [
+            {'user_id': user_id, 'category': category, 'month': month, 'count': count,
+             'total': total, 'sizes': sizes.to_json(), 'merchants': merchants.to_bytes()}
+            for (user_id, category, month), (sizes, merchants, count, total) in sketches.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('category_sketches')
@@ -0,0 +1,55 @@
+"""Add recurring_transactions
+
+Revision ID: 5d2f8b7c1a93
+Revises: 0a6d93c5e7b1
+Create Date: 2026-10-19 20:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2f8b7c1a93'
+down_revision = '0a6d93c5e7b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recurring_transactions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('description', sa.String(length=200), nullable=True),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('frequency', sa.String(length=10), nullable=False),
+    sa.Column('repeat_every', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=True),
+    sa.Column('next_occurrence', sa.Integer(), nullable=False),
+    sa.Column('next_run', sa.Date(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_recurring_transactions_user_id'), 'recurring_transactions', ['user_id'], unique=False)
+    op.create_index('ix_recurring_transactions_is_active_next_run', 'recurring_transactions', ['is_active', 'next_run'], unique=False)
+
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('recurring_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_transactions_recurring_id', 'recurring_transactions',
+                                    ['recurring_id'], ['id'], ondelete='SET NULL')
+        batch_op.create_index('ix_transactions_recurring_id_date', ['recurring_id', 'date'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactions_recurring_id_date')
+        batch_op.drop_constraint('fk_transactions_recurring_id', type_='foreignkey')
+        batch_op.drop_column('recurring_id')
+
+    op.drop_index('ix_recurring_transactions_is_active_next_run', table_name='recurring_transactions')
+    op.drop_index(op.f('ix_recurring_transactions_user_id'), table_name='recurring_transactions')
+    op.drop_table('recurring_transactions')
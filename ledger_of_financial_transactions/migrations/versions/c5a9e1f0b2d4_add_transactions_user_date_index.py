@@ -0,0 +1,24 @@
+"""Add transactions (user_id, date, id) index
+
+Revision ID: c5a9e1f0b2d4
+Revises: 74934d522e8f
+Create Date: 2026-10-19 13:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a9e1f0b2d4'
+down_revision = '74934d522e8f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_transactions_user_id_date', 'transactions', ['user_id', 'date', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_transactions_user_id_date', table_name='transactions')
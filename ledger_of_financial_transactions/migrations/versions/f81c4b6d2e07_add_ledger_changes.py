@@ -0,0 +1,49 @@
+"""Add ledger_changes and users ledger_floor_version
+
+Revision ID: f81c4b6d2e07
+Revises: e3b7d2a9c418
+Create Date: 2026-10-19 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f81c4b6d2e07'
+down_revision = 'e3b7d2a9c418'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ledger_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('transaction_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=10), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ledger_changes_user_id_version', 'ledger_changes', ['user_id', 'version', 'id'], unique=False)
+    op.create_index('ix_ledger_changes_user_id_transaction_id', 'ledger_changes', ['user_id', 'transaction_id'], unique=False)
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ledger_floor_version', sa.Integer(), server_default='0', nullable=False))
+
+    # Log every existing transaction once, at a new version of its owner's
+    # ledger, so that a first sync returns the whole ledger.
+    op.execute('UPDATE users SET ledger_version = ledger_version + 1 '
+               'WHERE id IN (SELECT DISTINCT user_id FROM transactions)')
+    op.execute("INSERT INTO ledger_changes (user_id, transaction_id, version, operation, changed_at) "
+               "SELECT t.user_id, t.id, u.ledger_version, 'upsert', CURRENT_TIMESTAMP "
+               "FROM transactions t JOIN users u ON u.id = t.user_id")
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('ledger_floor_version')
+    op.drop_index('ix_ledger_changes_user_id_transaction_id', table_name='ledger_changes')
+    op.drop_index('ix_ledger_changes_user_id_version', table_name='ledger_changes')
+    op.drop_table('ledger_changes')
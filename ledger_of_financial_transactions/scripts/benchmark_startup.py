@@ -0,0 +1,86 @@
+"""Measure how long a worker takes to boot: importing ``app`` plus ``create_app``.
+
+Every run uses a fresh interpreter. The script exits with status 1 when the
+median boot time is over budget, so it can run as a CI or deploy check:
+
+    python scripts/benchmark_startup.py --config production --runs 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app(sys.argv[1])
+created = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000,
+                  "create_ms": (created - imported) * 1000,
+                  "modules": len(sys.modules)}))
+'''
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def run_once(config_name, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', PROBE, config_name]
+    result = subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f'create_app({config_name!r}) failed:\n{result.stderr}')
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, count):
+    """Top-level imports ranked by cumulative time, from ``-X importtime`` output."""
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match and len(match.group(3)) <= 3:
+            imports.append((int(match.group(2)) / 1000, match.group(4)))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--config', default=os.environ.get('FLASK_CONFIG', 'production'))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get('STARTUP_BUDGET_MS', '1500')))
+    parser.add_argument('--slowest', type=int, default=10,
+                        help='list the N slowest imports of one extra run (0 to skip)')
+    args = parser.parse_args()
+
+    runs = [run_once(args.config)[0] for _ in range(args.runs)]
+    totals = [run['import_ms'] + run['create_ms'] for run in runs]
+    median = statistics.median(totals)
+    print(f'import   median {statistics.median(r["import_ms"] for r in runs):8.1f} ms')
+    print(f'create   median {statistics.median(r["create_ms"] for r in runs):8.1f} ms')
+    print(f'total    median {median:8.1f} ms  (min {min(totals):.1f}, max {max(totals):.1f}, '
+          f'{runs[-1]["modules"]} modules)')
+
+    if args.slowest:
+        _, stderr = run_once(args.config, importtime=True)
+        print('slowest imports:')
+        for elapsed, name in slowest_imports(stderr, args.slowest):
+            print(f'  {elapsed:8.1f} ms  {name}')
+
+    if median > args.budget_ms:
+        print(f'FAIL: startup {median:.1f} ms exceeds the {args.budget_ms:.0f} ms budget')
+        return 1
+    print(f'OK: startup within the {args.budget_ms:.0f} ms budget')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())